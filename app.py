@@ -1,16 +1,65 @@
 import os
-import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import threading
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from dotenv import load_dotenv
 
+# Load .env before the utils modules read their settings from the environment.
 load_dotenv()
 
+from utils.cache import get_case_cache, normalize_case_key
+from utils.search_log import get_search_log
+from utils import metrics, network
+from utils.jobs import CASE_FIELDS, JobManager
+from utils.tracking import CaseTracker
+
 DB_PATH = os.getenv("DB_PATH", "search_logs.db")
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "supersecret")
 
 
+def wants_refresh(value) -> bool:
+    """Interpret a force-refresh flag from JSON, form data or the query string."""
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def lookup_case(case_type, case_number, filing_year, force_refresh=False, mode=None):
+    """Look one case up through the shared cache; returns (details, ok)."""
+    details, cache_state = get_case_cache().get_or_fetch(
+        normalize_case_key(case_type, case_number, filing_year),
+        lambda: fetch_case_details(case_type, case_number, filing_year, mode=mode),
+        force_refresh=force_refresh,
+    )
+    details["cache"] = cache_state
+    return details, bool(details) and details.get("petitioner") not in ("Error", "Timeout")
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_jobs() -> JobManager:
+    """Start the job workers on first use; unfinished jobs from a previous run are resumed."""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = JobManager(lookup_case)
+        return _jobs
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker() -> CaseTracker:
+    """Tracked cases and their change history (refreshed by scheduler.py), in the search log database."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = CaseTracker(DB_PATH)
+        return _tracker
+
+
 # --- API route for frontend fetch() ---
 @app.route("/fetch-case", methods=["POST"])
 def fetch_case_api():
@@ -22,34 +71,94 @@ def fetch_case_api():
     if not case_type or not case_number or not filing_year:
         return jsonify({"error": "All fields are required."}), 400
 
+    force_refresh = wants_refresh(data.get("force_refresh", request.args.get("refresh", "")))
+    mode = data.get("mode") or request.args.get("mode") or None
+    if mode is not None and mode not in FETCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(FETCH_MODES)}."}), 400
+
     try:
-        details = fetch_case_details(case_type, case_number, filing_year)
-        if not details or details.get("petitioner") in ("Error", "Timeout"):
+        details, ok = lookup_case(case_type, case_number, filing_year, force_refresh, mode)
+        if not ok:
             return jsonify({"error": "No case found or invalid details."}), 404
         return jsonify(details)
     except Exception as e:
         return jsonify({"error": f"Error fetching data: {str(e)}"}), 500
 
 
+# --- Background jobs: submit now, stream results as each case finishes ---
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    data = request.get_json(force=True)
+    cases = data.get("cases") if isinstance(data.get("cases"), list) else [data]
+    for case in cases:
+        if not isinstance(case, dict) or not all(str(case.get(field, "")).strip() for field in CASE_FIELDS):
+            return jsonify({"error": "Every case needs case_type, case_number and filing_year."}), 400
+    mode = data.get("mode") or request.args.get("mode") or None
+    if mode is not None and mode not in FETCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(FETCH_MODES)}."}), 400
+    force_refresh = wants_refresh(data.get("force_refresh", request.args.get("refresh", "")))
+    try:
+        job_id = get_jobs().submit(cases, force_refresh=force_refresh, mode=mode)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "job_id": job_id,
+        "total": len(cases),
+        "status_url": url_for("job_status", job_id=job_id),
+        "events_url": url_for("job_events", job_id=job_id),
+    }), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    jobs = get_jobs()
+    if not jobs.exists(job_id):
+        return jsonify({"error": "Unknown job."}), 404
+    last_seq = request.headers.get("Last-Event-ID", request.args.get("after", "0"))
+    after_seq = int(last_seq) if str(last_seq).isdigit() else 0
+    return Response(
+        stream_with_context(jobs.events(job_id, after_seq)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/jobs/stats")
+def job_stats():
+    return jsonify(get_jobs().stats())
+
+
+# --- Tracked cases: refreshed by scheduler.py, changes read here ---
+@app.route("/tracked", methods=["POST"])
+def track_cases():
+    data = request.get_json(force=True)
+    cases = data.get("cases") if isinstance(data.get("cases"), list) else [data]
+    for case in cases:
+        if not isinstance(case, dict) or not all(str(case.get(field, "")).strip() for field in CASE_FIELDS):
+            return jsonify({"error": "Every case needs case_type, case_number and filing_year."}), 400
+    return jsonify({"added": get_tracker().track(cases), **get_tracker().stats()})
+
+
+@app.route("/tracked/changes")
+def tracked_changes():
+    since = request.args.get("since", "0")
+    key = None
+    if all(request.args.get(field) for field in CASE_FIELDS):
+        key = normalize_case_key(*(request.args[field] for field in CASE_FIELDS))
+    return jsonify(get_tracker().changes(int(since) if since.isdigit() else 0, key))
+
+
 def log_search(case_type, case_number, filing_year, raw_response):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS searches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            case_type TEXT,
-            case_number TEXT,
-            filing_year TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            raw_response TEXT
-        )
-    """)
-    c.execute("""
-        INSERT INTO searches (case_type, case_number, filing_year, raw_response)
-        VALUES (?, ?, ?, ?)
-    """, (case_type, case_number, filing_year, raw_response))
-    conn.commit()
-    conn.close()
+    """Queue a search for the background writer (see utils.search_log)."""
+    get_search_log(DB_PATH).log(case_type, case_number, filing_year, raw_response)
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -65,20 +174,28 @@ def index():
             flash("All fields are required.", "danger")
             return render_template("index.html", case_types=case_types)
 
-        try:
-            result = fetch_case_details(case_type, case_number, filing_year, return_html=True)
+        force_refresh = wants_refresh(request.form.get("force_refresh", request.args.get("refresh", "")))
 
+        def fetch():
+            # Also runs on a background thread when a stale entry is revalidated;
+            # every page actually scraped is logged here, cache hits log nothing.
+            result = fetch_case_details(case_type, case_number, filing_year, return_html=True)
             if isinstance(result, tuple):
                 details, raw_html = result
-            else:
-                details = result
-                raw_html = ""
+                if raw_html:
+                    log_search(case_type, case_number, filing_year, raw_html)
+                return details
+            return result
+
+        try:
+            details, _ = get_case_cache().get_or_fetch(
+                normalize_case_key(case_type, case_number, filing_year), fetch, force_refresh=force_refresh
+            )
 
             if not details:
                 flash("No case found or invalid details.", "warning")
                 return render_template("index.html", case_types=case_types)
 
-            log_search(case_type, case_number, filing_year, raw_html)
             return render_template("result.html", details=details)
 
         except Exception as e:
@@ -88,8 +205,24 @@ def index():
     return render_template("index.html", case_types=case_types)
 
 
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(get_case_cache().stats())
+
+
+@app.route("/network/stats")
+def network_stats():
+    return jsonify(network.stats())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Lookup and per-phase timings in the Prometheus text format."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 # --- Import scraper at the end to avoid circular imports ---
-from scraper import fetch_case_details
+from scraper import FETCH_MODES, fetch_case_details
 
 if __name__ == "__main__":
     app.run(debug=True)
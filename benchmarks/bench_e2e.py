@@ -0,0 +1,358 @@
+"""
+End-to-end benchmark against the local mock court (benchmarks/mock_court.py).
+
+Usage:
+    python -m benchmarks.bench_e2e [--targets scraper,fetcher,main,flask] [--concurrency 1,2,4]
+        [--cases 20] [--mode browser] [--pacing adaptive] [--latency 0.1] [--error-rate 0]
+        [--timeout-rate 0] [--session] [--save NAME] [--compare NAME] [--tolerance 0.2]
+
+Each target runs in its own subprocess, pointed at a fresh mock server:
+    scraper  scraper.fetch_case_details from a thread pool of `concurrency` threads
+    fetcher  fetcher.main() on a generated case file (sequential, so concurrency 1 only)
+    main     main.run_batch with an AsyncBrowserPool of `concurrency` browsers
+    flask    POST /fetch-case on app.py served by werkzeug, `concurrency` clients
+
+--session runs the scraper, fetcher and main targets through warm form
+sessions (utils.form_session): one per thread, --session or worker
+respectively. Compare a run with and without it to see the navigation cost
+saved per case.
+
+For every run it reports p50/p95/p99 lookup latency, throughput and outcomes.
+It also reports the peak RSS of the worker and its child processes, and the
+peak number of browser processes, both sampled from /proc. --save writes
+the results to benchmarks/baselines/NAME.json. --compare reads a saved
+baseline, prints the differences and exits with status 1 if p95 latency or
+throughput got worse by more than --tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.mock_court import CASE_TYPES, MockCourtServer
+from utils.stats import LatencyStats
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_DIR = Path(__file__).parent / "baselines"
+TARGETS = ("scraper", "fetcher", "main", "flask")
+SEQUENTIAL_TARGETS = ("fetcher",)
+BROWSER_NAMES = ("chrome", "chromium", "headless_shell", "firefox", "webkit")
+SAMPLE_SECONDS = 0.1
+
+
+def make_cases(count: int) -> List[Tuple[str, str, str]]:
+    """Distinct case tuples, so neither the cache nor request coalescing hides any lookup."""
+    return [(CASE_TYPES[i % len(CASE_TYPES)], str(1000 + i), "2023") for i in range(count)]
+
+
+def _ok(details: Dict) -> str:
+    return "error" if not details or details.get("petitioner") in ("Error", "Timeout") else "success"
+
+
+# --- workers (run inside the benchmark subprocess) ------------------------
+
+def _work_scraper(cases, concurrency: int, mode: str, session: bool, stats: LatencyStats):
+    from scraper import fetch_case_details, form_session
+
+    def one(case, form=None):
+        started = time.monotonic()
+        details = fetch_case_details(*case, mode=mode, session=form)
+        stats.record(time.monotonic() - started, _ok(details))
+
+    def chunk(part):
+        with form_session() as form:
+            for case in part:
+                one(case, form)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if session:
+            list(executor.map(chunk, [cases[i::concurrency] for i in range(concurrency)]))
+        else:
+            list(executor.map(one, cases))
+
+
+def _work_fetcher(cases, concurrency: int, mode: str, session: bool, stats: LatencyStats):
+    import fetcher
+
+    cases_file = Path("cases.txt")
+    cases_file.write_text("".join(f"{','.join(case)}\n" for case in cases), encoding="utf-8")
+    fetch_case = fetcher.fetch_case
+
+    def timed(case, **kwargs):
+        started = time.monotonic()
+        result = fetch_case(case, **kwargs)
+        stats.record(time.monotonic() - started, "success" if fetcher.succeeded(result) else "error")
+        return result
+
+    fetcher.fetch_case = timed
+    sys.argv = ["fetcher.py", str(cases_file), "--restart", f"--mode={mode}"] + (["--session"] if session else [])
+    fetcher.main()
+
+
+def _work_main(cases, concurrency: int, mode: str, session: bool, stats: LatencyStats):
+    import asyncio
+    import main
+    from playwright.async_api import async_playwright
+    from utils.browser_pool import AsyncBrowserPool
+
+    fetch_with_retries = main.fetch_with_retries
+
+    async def timed(pool, bucket, case_id, form=None):
+        started = time.monotonic()
+        result = await fetch_with_retries(pool, bucket, case_id, form)
+        stats.record(time.monotonic() - started, main._outcome(result))
+        return result
+
+    async def run():
+        async with async_playwright() as playwright, AsyncBrowserPool(playwright, size=concurrency) as pool:
+            await main.run_batch(pool, [",".join(case) for case in cases], concurrency=concurrency,
+                                 form_session=session)
+
+    main.fetch_with_retries = timed
+    asyncio.run(run())
+
+
+def _work_flask(cases, concurrency: int, mode: str, session: bool, stats: LatencyStats):
+    import http.client
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def one(case):
+        body = json.dumps({"case_type": case[0], "case_number": case[1], "filing_year": case[2], "mode": mode})
+        started = time.monotonic()
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=300)
+        try:
+            conn.request("POST", "/fetch-case", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            outcome = "success" if response.status == 200 else f"http_{response.status}"
+        except Exception as e:
+            outcome = type(e).__name__
+        finally:
+            conn.close()
+        stats.record(time.monotonic() - started, outcome)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, cases))
+    finally:
+        server.shutdown()
+
+
+WORKERS = {"scraper": _work_scraper, "fetcher": _work_fetcher, "main": _work_main, "flask": _work_flask}
+
+
+def worker(target: str, concurrency: int, mode: str, count: int, session: bool = False):
+    stats = LatencyStats()
+    # The scrapers print every result; keep stdout for the summary line.
+    with contextlib.redirect_stdout(io.StringIO()):
+        WORKERS[target](make_cases(count), concurrency, mode, session, stats)
+    print(json.dumps(stats.summary()))
+
+
+# --- process sampling -----------------------------------------------------
+
+def _process_tree(root: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are space-separated.
+        ppid = int(stat[stat.rfind(b")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def _sample(root: int) -> Tuple[int, int]:
+    """(resident bytes, browser processes) summed over `root` and its descendants."""
+    page = os.sysconf("SC_PAGE_SIZE")
+    rss = browsers = 0
+    for pid in _process_tree(root):
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * page
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                argv = f.read().split(b"\0")
+        except OSError:
+            continue
+        name = os.path.basename(argv[0].decode(errors="replace")).lower()
+        # Renderer, GPU and utility processes carry --type=; the browser process itself does not.
+        if any(browser in name for browser in BROWSER_NAMES) and not any(a.startswith(b"--type=") for a in argv):
+            browsers += 1
+    return rss, browsers
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, pid: int):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak_rss = 0
+        self.peak_browsers = 0
+        self.stopped = threading.Event()
+        self.available = os.path.isdir("/proc")
+
+    def run(self):
+        while self.available and not self.stopped.wait(SAMPLE_SECONDS):
+            rss, browsers = _sample(self.pid)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_browsers = max(self.peak_browsers, browsers)
+
+
+# --- driver ----------------------------------------------------------------
+
+def run_one(target: str, concurrency: int, args) -> Dict:
+    """Run one target at one concurrency level against a fresh mock server."""
+    server = MockCourtServer(latency=args.latency, jitter=args.latency / 2, error_rate=args.error_rate,
+                             timeout_rate=args.timeout_rate, timeout_seconds=args.timeout_seconds,
+                             js_options=args.js_options, seed=1)
+    with server, tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+            COURT_URL=server.url,
+            CASE_URL=f"{server.base_url}/case.asp",
+            FETCH_MODE=args.mode,
+            PACING_MODE=args.pacing,
+            CACHE_DB_PATH=":memory:",
+            DB_PATH=os.path.join(workdir, "search_logs.db"),
+            BROWSER_POOL_SIZE=str(concurrency),
+            CONCURRENCY=str(concurrency),
+            RATE_LIMIT_RPS="1000",
+            RATE_LIMIT_BURST=str(concurrency),
+        )
+        started = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_e2e", "--worker", target, str(concurrency), args.mode,
+             str(args.cases)] + (["--session"] if args.session else []),
+            cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        sampler = _Sampler(process.pid)
+        sampler.start()
+        out, err = process.communicate()
+        sampler.stopped.set()
+        sampler.join()
+        wall = time.monotonic() - started
+        if process.returncode != 0:
+            tail = (err or out).strip().splitlines()[-1:] or ["no output"]
+            return {"error": f"exit {process.returncode}: {tail[0]}"}
+        summary = json.loads(out.strip().splitlines()[-1])
+    summary.update({
+        "wall_s": round(wall, 2),
+        "peak_rss_mb": round(sampler.peak_rss / 2 ** 20, 1) if sampler.available else None,
+        "peak_browsers": sampler.peak_browsers if sampler.available else None,
+        "injected": {k: v for k, v in server.stats().items() if k in ("errors", "timeouts")},
+    })
+    return summary
+
+
+def _row(key: str, r: Dict) -> str:
+    if "error" in r:
+        return f"{key:<12} FAILED {r['error']}"
+    ok = r["outcomes"].get("success", 0)
+    rss = f"{r['peak_rss_mb']:8.1f}" if r["peak_rss_mb"] is not None else "       -"
+    return (
+        f"{key:<12} {r['completed']:>4} {ok:>4}  {r['p50_s']:7.3f} {r['p95_s']:7.3f} {r['p99_s']:7.3f}  "
+        f"{r['throughput_per_min']:8.1f}  {rss}  {r['peak_browsers'] if r['peak_browsers'] is not None else '-':>8}"
+    )
+
+
+def _load_settings(config: Dict) -> Dict:
+    """Runs are matched by target@concurrency, so only the load settings need to agree."""
+    return {k: v for k, v in config.items() if k not in ("targets", "concurrency")}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> bool:
+    """Print changes against a baseline; True if nothing regressed beyond tolerance."""
+    passed = True
+    print(f"\n{'run':<12} {'p95 then':>9} {'p95 now':>9} {'/min then':>10} {'/min now':>10}")
+    for key, now in results.items():
+        then = baseline.get(key)
+        if not then or "error" in then or "error" in now:
+            continue
+        slower = now["p95_s"] > then["p95_s"] * (1 + tolerance)
+        fewer = now["throughput_per_min"] < then["throughput_per_min"] * (1 - tolerance)
+        flag = "  REGRESSION" if slower or fewer else ""
+        passed = passed and not flag
+        print(f"{key:<12} {then['p95_s']:9.3f} {now['p95_s']:9.3f} "
+              f"{then['throughput_per_min']:10.1f} {now['throughput_per_min']:10.1f}{flag}")
+    return passed
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "--worker":
+        target, concurrency, mode, count = argv[1:5]
+        worker(target, int(concurrency), mode, int(count), session="--session" in argv[5:])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--concurrency", default="1,2,4")
+    parser.add_argument("--cases", type=int, default=20, help="lookups per run")
+    parser.add_argument("--mode", default="browser", choices=("auto", "http", "browser"))
+    parser.add_argument("--pacing", default="adaptive", choices=("adaptive", "fixed", "off"))
+    parser.add_argument("--latency", type=float, default=0.1, help="mock server latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--js-options", action="store_true", help="force the Playwright fallback in auto mode")
+    parser.add_argument("--session", action="store_true", help="submit browser lookups through warm form sessions")
+    parser.add_argument("--save", metavar="NAME", help="write results to benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare against benchmarks/baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    print(f"{'run':<12} {'n':>4} {'ok':>4}  {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}  "
+          f"{'per min':>8}  {'RSS MB':>8}  {'browsers':>8}")
+    results: Dict[str, Dict] = {}
+    for target in targets:
+        for concurrency in ([1] if target in SEQUENTIAL_TARGETS else levels):
+            key = f"{target}@{concurrency}"
+            results[key] = run_one(target, concurrency, args)
+            print(_row(key, results[key]), flush=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("save", "compare", "tolerance")}
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps({"config": config, "results": results}, indent=2), encoding="utf-8")
+        print(f"Baseline saved to {path}")
+    if args.compare:
+        saved = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text(encoding="utf-8"))
+        if _load_settings(saved["config"]) != _load_settings(config):
+            print(f"Note: baseline was recorded with {saved['config']}")
+        if not compare(results, saved["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: adaptive pacing vs. the old fixed delays.
+
+Usage:
+    python -m benchmarks.bench_pacing [lookups]            # offline simulation
+    python -m benchmarks.bench_pacing --live cases.txt     # real lookups via scraper.py
+
+The simulation feeds AdaptivePacer response times drawn around a typical
+server latency (with occasional slow or failed responses) and reports the
+deliberate idle time each policy adds per lookup. The live mode runs the
+browser path of scraper.fetch_case_details once per pacing mode (point
+COURT_URL at the mock server to avoid hitting the court site).
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from utils.pacing import LEGACY_DELAYS, AdaptivePacer
+from utils.stats import percentile
+
+MODES = ("fixed", "adaptive", "off")
+
+
+def simulate(mode: str, lookups: int, latency: float = 0.8, slow_rate: float = 0.05,
+             error_rate: float = 0.02, seed: int = 1) -> float:
+    """Average deliberate idle seconds per lookup under a synthetic response-time model."""
+    rng = random.Random(seed)
+    pacer = AdaptivePacer(mode=mode)
+    idle = 0.0
+    for _ in range(lookups):
+        idle += sum(pacer.pause(step) for step in LEGACY_DELAYS)
+        for _ in range(2):  # page load and form submission
+            roll = rng.random()
+            seconds = rng.lognormvariate(0, 0.3) * latency
+            if roll < slow_rate:
+                seconds *= 6
+            failed = slow_rate <= roll < slow_rate + error_rate
+            pacer.observe(seconds, ok=not failed)
+    return idle / lookups
+
+
+def _worker(cases_file: str):
+    from fetcher import read_case_numbers
+    from scraper import fetch_case_details
+
+    timings = []
+    for case in read_case_numbers(cases_file):
+        started = time.perf_counter()
+        fetch_case_details(case["case_type"], case["case_number"], case["filing_year"], mode="browser")
+        timings.append(time.perf_counter() - started)
+    print(json.dumps(timings))
+
+
+def live(cases_file: str):
+    for mode in MODES:
+        env = dict(os.environ, PACING_MODE=mode, CACHE_DB_PATH=":memory:")
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pacing", "--worker", cases_file],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        timings = sorted(json.loads(out.stdout.strip().splitlines()[-1]))
+        print(
+            f"{mode:<9} n={len(timings):<4} p50 {percentile(timings, 50):6.2f}s  "
+            f"p95 {percentile(timings, 95):6.2f}s  total {sum(timings):7.2f}s"
+        )
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--worker":
+        _worker(sys.argv[2])
+    elif len(sys.argv) > 2 and sys.argv[1] == "--live":
+        live(sys.argv[2])
+    else:
+        lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+        for mode in MODES:
+            print(f"{mode:<9} {simulate(mode, lookups):6.2f}s idle per lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: offline HTML parsing vs. per-field Playwright queries.
+
+Usage:
+    python -m benchmarks.bench_parser [fixture.html] [iterations]
+
+The Playwright half loads the fixture with page.set_content() and replays the
+old extraction (query_selector + evaluate per field); it is skipped when
+Playwright is not installed.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from utils.case_parser import parse_case_html
+from utils.stats import percentile
+
+FIXTURE = Path(__file__).parent / "fixtures" / "case_status.html"
+LABELS = ("Petitioner", "Respondent", "Filing Date", "Next Date")
+
+
+def _report(name: str, timings):
+    ordered = sorted(timings)
+    print(
+        f"{name:<22} n={len(ordered):<5} "
+        f"p50 {percentile(ordered, 50) * 1000:8.3f} ms  "
+        f"p95 {percentile(ordered, 95) * 1000:8.3f} ms  "
+        f"total {sum(ordered):7.3f} s"
+    )
+
+
+def bench_offline(html: str, iterations: int):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        parse_case_html(html)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _legacy_extract(frame):
+    details = {}
+    for label in LABELS:
+        elem = frame.query_selector(f"td:has-text('{label}')")
+        details[label] = elem.evaluate("el => el.nextElementSibling.innerText") if elem else "Not found"
+    pdf = frame.query_selector("a[href$='.pdf']")
+    details["pdf_url"] = pdf.get_attribute("href") if pdf else None
+    return details
+
+
+def bench_playwright(html: str, iterations: int):
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        print("playwright not installed; skipping per-field query benchmark")
+        return None, None
+    legacy, single = [], []
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_content(html)
+        frame = page.main_frame
+        for _ in range(iterations):
+            started = time.perf_counter()
+            _legacy_extract(frame)
+            legacy.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            parse_case_html(frame.content())
+            single.append(time.perf_counter() - started)
+        browser.close()
+    return legacy, single
+
+
+def main():
+    fixture = Path(sys.argv[1]) if len(sys.argv) > 1 else FIXTURE
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    html = fixture.read_text(encoding="utf-8")
+
+    _report("offline parse", bench_offline(html, iterations))
+    legacy, single = bench_playwright(html, min(iterations, 50))
+    if legacy is not None:
+        _report("per-field queries", legacy)
+        _report("content() + parse", single)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Local stand-in for the court's case-status page.
+
+Serves the search form (CaseType select, CaseNo/CaseYear inputs, submit)
+targeting the frmCaseStatus iframe. Submissions are answered with a results
+table in the layout utils.case_parser reads. Latency, HTTP errors and hung
+responses can be injected to exercise pacing, retries and timeouts.
+
+Usage:
+    python -m benchmarks.mock_court [--port 8765] [--latency 0.2] [--jitter 0.1]
+        [--error-rate 0.05] [--timeout-rate 0.01] [--timeout-seconds 30] [--js-options]
+        [--truncate-rate 0.1]
+
+Then point the scrapers at it:
+    COURT_URL=http://127.0.0.1:8765/app/get-case-type-status   (scraper.py, fetcher.py, app.py)
+    CASE_URL=http://127.0.0.1:8765/case.asp                     (main.py)
+
+Any GET path other than the result, static and PDF paths returns the search
+form. --js-options fills the CaseType options from a script, so the HTTP fast
+path has to fall back to Playwright. Order PDFs carry an ETag and honour
+Range requests; --truncate-rate cuts some of them off halfway.
+"""
+
+import argparse
+import html
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+CASE_TYPES = ("W.P.(C)", "Crl.M.C.", "FAO", "RSA", "CRL.A.", "CS(OS)")
+RESULT_PATH = "/app/case-status-result"
+# Page furniture the real site serves; sizes roughly match it so bandwidth numbers mean something.
+STATIC_ASSETS = {
+    "/static/site.css": ("text/css", 30_000),
+    "/static/logo.png": ("image/png", 40_000),
+    "/static/fonts/site.woff2": ("font/woff2", 50_000),
+}
+THIRD_PARTY_SCRIPT = "https://www.googletagmanager.com/gtag/js?id=MOCK"
+
+FORM_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>Case Status</title>
+<link rel="stylesheet" href="/static/site.css">
+<link rel="preload" href="/static/fonts/site.woff2" as="font" crossorigin>
+<script async src="{third_party}"></script>
+</head>
+<body>
+<img src="/static/logo.png" alt="logo">
+<form name="frmSearch" method="post" action="{result_path}" target="frmCaseStatus">
+  <input type="hidden" name="token" value="{token}">
+  <select name="CaseType">
+    <option value="">Select</option>
+{options}
+  </select>
+  <input type="text" name="CaseNo">
+  <input type="text" name="CaseYear">
+  <input type="submit" name="Submit" value="Submit">
+</form>
+{script}
+<iframe name="frmCaseStatus" src="about:blank" width="100%" height="600"></iframe>
+</body>
+</html>
+"""
+
+RESULT_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Case Status</title><link rel="stylesheet" href="/static/site.css"></head>
+<body>
+<table width="100%" border="1" cellpadding="4">
+  <tr><th colspan="2">Case Status : {case_type} {case_number}/{filing_year}</th></tr>
+  <tr><td><b>Petitioner</b></td><td>PETITIONER {case_number} &amp; ORS.<br>Advocate: MOCK COUNSEL</td></tr>
+  <tr><td><b>Respondent</b></td><td>RESPONDENT {case_number}</td></tr>
+  <tr><td>Filing Date</td><td>{filing_date}</td></tr>
+  <tr><td>Next Date</td><td>{next_hearing} (Court No. {court})</td></tr>
+  <tr><td>Status</td><td>PENDING</td></tr>
+  <tr><td>Court No.</td><td>{court}</td></tr>
+  <tr>
+    <td>Orders</td>
+    <td>
+      <table border="0">
+{orders}
+      </table>
+    </td>
+  </tr>
+</table>
+</body>
+</html>
+"""
+
+NOT_FOUND_PAGE = """<!DOCTYPE html>
+<html><body><table><tr><td>No record found.</td></tr></table></body></html>
+"""
+
+
+def case_page(case_type: str, case_number: str, filing_year: str) -> str:
+    """Deterministic results page for one case; the same case always renders the same HTML."""
+    rng = random.Random(f"{case_type}|{case_number}|{filing_year}")
+    hearing_year = int(filing_year) + 3
+    orders = "\n".join(
+        f'        <tr><td>{i}.</td><td><a href="/app/showlogo/order_{case_number}_{i}.pdf">'
+        f"Order dated {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{filing_year}</a></td></tr>"
+        for i in range(1, rng.randint(1, 4) + 1)
+    )
+    return RESULT_PAGE.format(
+        case_type=html.escape(case_type),
+        case_number=html.escape(case_number),
+        filing_year=html.escape(filing_year),
+        filing_date=f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{filing_year}",
+        next_hearing=f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{hearing_year}",
+        court=rng.randint(1, 40),
+        orders=orders,
+    )
+
+
+def pdf_bytes(path: str, size: int = 20_000) -> bytes:
+    """Deterministic PDF-like payload for an order link."""
+    rng = random.Random(path)
+    body = bytes(rng.getrandbits(8) for _ in range(size))
+    return b"%PDF-1.4\n" + body + b"\n%%EOF\n"
+
+
+class MockCourtServer:
+    """Threaded HTTP server with fault injection; use as a context manager or call start()/stop()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, timeout_rate: float = 0.0, timeout_seconds: float = 30.0,
+                 js_options: bool = False, seed: Optional[int] = None, truncate_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.js_options = js_options
+        self.truncate_rate = truncate_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"forms": 0, "results": 0, "static": 0, "pdfs": 0, "ranges": 0, "truncated": 0,
+                         "errors": 0, "timeouts": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        """Search page URL, for COURT_URL."""
+        return f"{self.base_url}/app/get-case-type-status"
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def fault(self) -> Optional[str]:
+        """Sleep for the configured latency and return "error", "timeout" or None."""
+        with self._lock:
+            roll = self._rng.random()
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        time.sleep(delay)
+        if roll < self.error_rate:
+            self.count("errors")
+            return "error"
+        if roll < self.error_rate + self.timeout_rate:
+            self.count("timeouts")
+            return "timeout"
+        return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "text/html; charset=utf-8",
+                      headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _faulted(self) -> bool:
+                fault = server.fault()
+                if fault == "error":
+                    self._send(503, b"<html><body>Service Unavailable</body></html>")
+                    return True
+                if fault == "timeout":
+                    time.sleep(server.timeout_seconds)
+                    self.close_connection = True
+                    return True
+                return False
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path in STATIC_ASSETS:
+                    server.count("static")
+                    content_type, size = STATIC_ASSETS[path]
+                    return self._send(200, b"x" * size, content_type)
+                if path.lower().endswith(".pdf"):
+                    server.count("pdfs")
+                    return self._pdf(path)
+                if path == RESULT_PATH:
+                    query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+                    return self._result(query)
+                server.count("forms")
+                if self._faulted():
+                    return
+                options = "\n".join(
+                    f'    <option value="{html.escape(t)}">{html.escape(t)}</option>' for t in CASE_TYPES
+                )
+                script = ""
+                if server.js_options:
+                    script = (
+                        "<script>var s = document.querySelector(\"select[name='CaseType']\");"
+                        f"{json.dumps(list(CASE_TYPES))}.forEach(function (t) {{"
+                        " var o = document.createElement('option'); o.value = t; o.text = t; s.add(o); });</script>"
+                    )
+                    options = ""
+                page = FORM_PAGE.format(
+                    third_party=THIRD_PARTY_SCRIPT, result_path=RESULT_PATH,
+                    token=random.getrandbits(32), options=options, script=script,
+                )
+                self._send(200, page.encode("utf-8"), headers={"Set-Cookie": "ASPSESSIONID=mock; Path=/"})
+
+            do_HEAD = do_GET
+
+            def _pdf(self, path: str):
+                """Serve an order PDF with ETag and byte-range support; may cut the body short."""
+                body = pdf_bytes(path)
+                etag = f'"{zlib.crc32(body):08x}"'
+                start = 0
+                match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+                if match and self.headers.get("If-Range", etag) == etag:
+                    start = int(match.group(1))
+                    if start >= len(body):
+                        return self._send(416, b"", "application/pdf",
+                                          headers={"Content-Range": f"bytes */{len(body)}"})
+                    server.count("ranges")
+                status = 206 if start else 200
+                headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+                if start:
+                    headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                with server._lock:
+                    truncate = server._rng.random() < server.truncate_rate
+                if not truncate:
+                    return self._send(status, body[start:], "application/pdf", headers)
+                # Promise the whole body, send half of it and drop the connection.
+                server.count("truncated")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body) - start))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body[start:start + (len(body) - start) // 2])
+                self.close_connection = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                fields = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+                if urlsplit(self.path).path != RESULT_PATH:
+                    return self._send(404, b"Not found")
+                self._result(fields)
+
+            def _result(self, fields: Dict[str, str]):
+                server.count("results")
+                if self._faulted():
+                    return
+                case_type = fields.get("CaseType", "")
+                case_number = fields.get("CaseNo", "")
+                filing_year = fields.get("CaseYear", "")
+                if case_type not in CASE_TYPES or not case_number.isdigit() or not filing_year.isdigit():
+                    return self._send(200, NOT_FOUND_PAGE.encode("utf-8"))
+                self._send(200, case_page(case_type, case_number, filing_year).encode("utf-8"))
+
+        return Handler
+
+    def start(self) -> "MockCourtServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-court", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to form and result responses")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform jitter on the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses that return 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of responses that hang")
+    parser.add_argument("--timeout-seconds", type=float, default=30.0, help="how long a hung response hangs")
+    parser.add_argument("--js-options", action="store_true", help="fill CaseType options from a script")
+    parser.add_argument("--truncate-rate", type=float, default=0.0,
+                        help="fraction of PDF responses cut off halfway (exercises resumed downloads)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    server = MockCourtServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                             args.timeout_rate, args.timeout_seconds, args.js_options, args.seed,
+                             args.truncate_rate)
+    print(f"Mock court listening on {server.url} (main.py: {server.base_url}/case.asp)")
+    try:
+        server.start()
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {server.stats()}")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,227 @@
 """
 Court Data Batch Fetcher using Playwright
 
-Reads a list of case numbers from a text file, fetches court data for each,
-and saves the results to output.json or output.csv.
+Streams a list of case numbers from a text file, fetches court data for each,
+and appends every result to output.jsonl and output.csv as soon as it
+arrives. Completed case tuples are checkpointed, so an interrupted run can
+simply be started again: finished cases are skipped and only failures are
+retried. Failed lookups go to output.failed.jsonl instead of the outputs.
 
 Usage:
-    python fetcher.py case_numbers.txt
+    python fetcher.py case_numbers.txt [--refresh] [--mode=auto|http|browser] [--restart] [--session]
+        [--download]
+
+Fresh results from the shared case cache are reused; pass --refresh to
+bypass it and scrape every case again. --mode picks the lookup path (see
+scraper.fetch_case_details); each result records it under "source".
+--restart discards the checkpoint and the previous outputs. --session keeps
+one search page loaded and submits every browser lookup through it instead
+of navigating per case (see utils.form_session). --download fetches the
+order PDFs linked from output.jsonl into the document store once the batch
+is done (see utils.downloader).
 """
 
 import sys
 import csv
 import json
 import logging
+import os
+import sqlite3
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict
-from scraper import fetch_case_details
+from typing import Dict, Iterator, Optional
+from scraper import FETCH_MODES, METRICS_LABEL, fetch_case_details, form_session
+from utils.cache import CaseKey, get_case_cache, normalize_case_key
+from utils import metrics, network
+from utils.downloader import download_documents, read_results
 
 # --- Configuration ---
-OUTPUT_JSON = "output.json"
+OUTPUT_JSONL = "output.jsonl"
 OUTPUT_CSV = "output.csv"
+FAILED_JSONL = "output.failed.jsonl"
+CHECKPOINT_DB = "fetcher_checkpoint.db"
 LOG_FILE = "fetcher.log"
 
+CSV_FIELDS = [
+    "case_type", "case_number", "filing_year",
+    "petitioner", "respondent", "filing_date", "next_hearing", "pdf_url",
+    "source", "cache", "status",
+]
+
 logging.basicConfig(
     filename=LOG_FILE,
     level=logging.INFO,
     format="%(asctime)s %(levelname)s: %(message)s"
 )
 
-def read_case_numbers(filename: str) -> List[Dict]:
+def read_case_numbers(filename: str) -> Iterator[Dict]:
     """
-    Reads case numbers from a text file.
+    Lazily reads case numbers from a text file.
     Each line should be: <CaseType>,<CaseNumber>,<FilingYear>
-    Returns a list of dicts.
+    Yields one dict per valid line.
     """
-    cases = []
     with open(filename, "r", encoding="utf-8") as f:
         for line in f:
             parts = [x.strip() for x in line.strip().split(",")]
             if len(parts) == 3:
-                cases.append({
+                yield {
                     "case_type": parts[0],
                     "case_number": parts[1],
                     "filing_year": parts[2]
-                })
-    return cases
-
-def save_to_json(data: List[Dict], filename: str):
-    """Saves the list of dicts to a JSON file."""
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-def save_to_csv(data: List[Dict], filename: str):
-    """Saves the list of dicts to a CSV file."""
-    if not data:
-        return
-    with open(filename, "w", newline='', encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
+                }
+
+def succeeded(result: Dict) -> bool:
+    return bool(result) and result.get("petitioner") not in ("Error", "Timeout")
+
+class Checkpoint:
+    """Outcome of every attempted case tuple, kept in SQLite so memory stays flat."""
+
+    def __init__(self, path: str = CHECKPOINT_DB):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoint (
+                case_type TEXT,
+                case_number TEXT,
+                filing_year TEXT,
+                ok INTEGER,
+                status TEXT,
+                updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (case_type, case_number, filing_year)
+            )
+        """)
+        self.conn.commit()
+
+    def is_done(self, key: CaseKey) -> bool:
+        row = self.conn.execute(
+            "SELECT ok FROM checkpoint WHERE case_type = ? AND case_number = ? AND filing_year = ?", key
+        ).fetchone()
+        return bool(row and row[0])
+
+    def record(self, key: CaseKey, ok: bool, status: str = ""):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoint (case_type, case_number, filing_year, ok, status) "
+            "VALUES (?, ?, ?, ?, ?)", (*key, int(ok), status)
+        )
+        self.conn.commit()
+
+    def reset(self):
+        self.conn.execute("DELETE FROM checkpoint")
+        self.conn.commit()
+
+    def counts(self) -> Dict:
+        done, failed = self.conn.execute(
+            "SELECT COALESCE(SUM(ok), 0), COALESCE(SUM(1 - ok), 0) FROM checkpoint"
+        ).fetchone()
+        return {"done": done, "failed": failed}
+
+    def close(self):
+        self.conn.close()
+
+class ResultWriter:
+    """Appends results to JSONL/CSV files, flushing after every row."""
+
+    def __init__(self, jsonl_path: str = OUTPUT_JSONL, csv_path: str = OUTPUT_CSV,
+                 failed_path: str = FAILED_JSONL):
+        self.jsonl = open(jsonl_path, "a", encoding="utf-8")
+        self.failed = open(failed_path, "a", encoding="utf-8")
+        new_csv = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+        self.csv_file = open(csv_path, "a", newline='', encoding="utf-8")
+        self.csv = csv.DictWriter(self.csv_file, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        if new_csv:
+            self.csv.writeheader()
+
+    def write(self, result: Dict, ok: bool = True):
+        line = json.dumps(result, ensure_ascii=False) + "\n"
+        if not ok:
+            self.failed.write(line)
+            self.failed.flush()
+            return
+        self.jsonl.write(line)
+        self.jsonl.flush()
+        self.csv.writerow(result)
+        self.csv_file.flush()
+
+    def close(self):
+        for f in (self.jsonl, self.failed, self.csv_file):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def fetch_case(case: Dict, force_refresh: bool = False, mode: Optional[str] = None, session=None) -> Dict:
+    """Look one case up through the shared cache and tag the result with its case tuple."""
+    result, cache_state = get_case_cache().get_or_fetch(
+        normalize_case_key(case["case_type"], case["case_number"], case["filing_year"]),
+        lambda: fetch_case_details(
+            case["case_type"],
+            case["case_number"],
+            case["filing_year"],
+            mode=mode,
+            session=session
+        ),
+        force_refresh=force_refresh,
+        allow_stale=False,
+    )
+    result["cache"] = cache_state
+    return {**case, **result}
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python fetcher.py case_numbers.txt")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    mode = next((flag.split("=", 1)[1] for flag in flags if flag.startswith("--mode=")), None)
+    if mode is not None and mode not in FETCH_MODES:
+        print(f"unknown --mode={mode}; expected one of {'|'.join(FETCH_MODES)}")
         sys.exit(1)
-    input_file = sys.argv[1]
+    if not args:
+        print("Usage: python fetcher.py case_numbers.txt [--refresh] [--mode=auto|http|browser] [--restart] [--session] "
+              "[--download]")
+        sys.exit(1)
+    input_file = args[0]
     if not Path(input_file).exists():
         print(f"Input file {input_file} not found.")
         sys.exit(1)
-    cases = read_case_numbers(input_file)
-    results = []
-    for case in cases:
-        logging.info(f"Fetching: {case['case_type']}-{case['case_number']}-{case['filing_year']}")
-        result = fetch_case_details(
-            case["case_type"],
-            case["case_number"],
-            case["filing_year"]
-        )
-        results.append(result)
-    save_to_json(results, OUTPUT_JSON)
-    save_to_csv(results, OUTPUT_CSV)
-    print(f"Done. Results saved to {OUTPUT_JSON} and {OUTPUT_CSV}")
+    force_refresh = "--refresh" in flags
+
+    checkpoint = Checkpoint()
+    if "--restart" in flags:
+        checkpoint.reset()
+        for path in (OUTPUT_JSONL, OUTPUT_CSV, FAILED_JSONL):
+            if os.path.exists(path):
+                os.remove(path)
+
+    fetched = skipped = failed = 0
+    with ResultWriter() as writer, (form_session() if "--session" in flags else nullcontext()) as session:
+        for case in read_case_numbers(input_file):
+            key = normalize_case_key(case["case_type"], case["case_number"], case["filing_year"])
+            if checkpoint.is_done(key):
+                skipped += 1
+                continue
+            logging.info(f"Fetching: {case['case_type']}-{case['case_number']}-{case['filing_year']}")
+            result = fetch_case(case, force_refresh=force_refresh, mode=mode, session=session)
+            ok = succeeded(result)
+            logging.info(f"Cache {result['cache']}, source {result.get('source')}: "
+                         f"{case['case_type']}-{case['case_number']}-{case['filing_year']}")
+            writer.write(result, ok)
+            checkpoint.record(key, ok, result.get("status", ""))
+            fetched += 1
+            failed += not ok
+    print(f"Done. {fetched} fetched ({failed} failed), {skipped} already done. "
+          f"Results appended to {OUTPUT_JSONL} and {OUTPUT_CSV}")
+    if failed:
+        print(f"Failures logged to {FAILED_JSONL}; run again to retry them.")
+    print(f"Checkpoint: {checkpoint.counts()}")
+    print(f"Cache: {get_case_cache().stats()}")
+    bandwidth = network.stats()
+    if bandwidth["lookups"]:
+        print(f"Bandwidth: {bandwidth}")
+    print(metrics.format_summary(METRICS_LABEL))
+    checkpoint.close()
+    if "--download" in flags and os.path.exists(OUTPUT_JSONL):
+        print(f"Documents: {download_documents(read_results(OUTPUT_JSONL))}")
 
 if __name__ == "__main__":
     main()
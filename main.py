@@ -1,12 +1,24 @@
 import os
 import sys
+import time
 import asyncio
 import logging
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
-from utils.google_sheet import read_case_ids, write_results
+from utils.google_sheet import SheetSync, read_case_ids
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from utils.browser_pool import AsyncBrowserPool
+from utils.cache import get_case_cache, parse_case_id
+from utils.case_parser import LABELS, parse_case_html
+from utils.downloader import download_documents
+from utils.form_session import AsyncFormSession
+from utils.http_client import NeedsBrowser, get_http_client
+from utils import metrics, network
+from utils.pacing import get_pacer
+from utils.singleflight import AsyncSingleFlight
+from utils.stats import LatencyStats
+from utils.throttle import AsyncTokenBucket, backoff_delay
 
 # Load environment variables
 load_dotenv()
@@ -26,60 +38,278 @@ DATA_DIR.mkdir(exist_ok=True)
 INPUT_FILE = DATA_DIR / "case_ids.txt"
 OUTPUT_FILE = DATA_DIR / "output.json"
 
+URL = os.getenv("CASE_URL", "https://delhihighcourt.nic.in/case.asp")
+# auto: plain HTTP first with Playwright fallback; http: never launch a browser; browser: always.
+FETCH_MODE = os.getenv("FETCH_MODE", "auto")
+
 RATE_LIMIT_SECONDS = float(os.getenv("RATE_LIMIT_SECONDS", 2))
+# Requests per second shared by all workers; defaults to the old one-per-RATE_LIMIT_SECONDS pace.
+# 0 (or RATE_LIMIT_SECONDS=0) turns the limit off.
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", 1 / RATE_LIMIT_SECONDS if RATE_LIMIT_SECONDS > 0 else 0))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 1))
+CONCURRENCY = int(os.getenv("CONCURRENCY", 4))
 RETRY_LIMIT = int(os.getenv("RETRY_LIMIT", 3))
+BACKOFF_BASE_SECONDS = float(os.getenv("BACKOFF_BASE_SECONDS", 1))
+BACKOFF_MAX_SECONDS = float(os.getenv("BACKOFF_MAX_SECONDS", 30))
+PROGRESS_EVERY = int(os.getenv("PROGRESS_EVERY", 10))
+FORCE_REFRESH = os.getenv("FORCE_REFRESH", "").lower() in ("1", "true", "yes")
+# Each worker keeps one search page loaded and submits its cases through it (utils.form_session).
+FORM_SESSION = os.getenv("FORM_SESSION", "").lower() in ("1", "true", "yes")
+# Download the order PDFs of the batch into the document store afterwards (utils.downloader).
+DOWNLOAD_ORDERS = os.getenv("DOWNLOAD_ORDERS", "").lower() in ("1", "true", "yes")
+
+# Rows naming the same case while it is being scraped share one lookup.
+_lookups = AsyncSingleFlight()
+
+# Label for this module's spans and lookups in utils.metrics.
+METRICS_LABEL = "main"
 
-async def fetch_case_details(playwright, case_id: str) -> Dict:
+async def fetch_case_details(pool: AsyncBrowserPool, case_id: str, mode: str = FETCH_MODE,
+                             session: Optional[AsyncFormSession] = None) -> Dict:
     """
-    Scrape court details for a given case_id using Playwright.
-    Returns a dict with extracted fields.
+    Scrape court details for a given case_id.
+    Tries the browserless HTTP path first (unless mode is "browser"), otherwise
+    runs Playwright in a fresh context leased from the warm browser pool, or
+    submits the case through `session` if one is given.
+    Returns a dict with extracted fields; "source" records which path served it.
     """
-    url = "https://delhihighcourt.nic.in/case.asp"
-    browser = await playwright.chromium.launch(headless=True)
-    page = await browser.new_page()
+    started = time.perf_counter()
+    details = await _fetch_case_details(pool, case_id, mode, session)
+    outcome = _outcome(details)
+    metrics.record_lookup(METRICS_LABEL, details.get("source", "browser"),
+                          outcome if outcome in ("success", "timeout", "needs_browser") else "error",
+                          time.perf_counter() - started)
+    return details
+
+async def _fetch_case_details(pool: AsyncBrowserPool, case_id: str, mode: str,
+                              session: Optional[AsyncFormSession]) -> Dict:
+    parts = [x.strip() for x in case_id.split(",")]
+    if mode in ("auto", "http") and len(parts) == 3:
+        try:
+            with metrics.span(METRICS_LABEL, "http_fetch"):
+                details, _ = await asyncio.to_thread(get_http_client().fetch, URL, *parts, missing="")
+            details["pdf_url"] = details["pdf_url"] or ""
+            return {"case_id": case_id, **details, "status": "success", "source": "http"}
+        except NeedsBrowser as e:
+            if mode == "http":
+                return {"case_id": case_id, "status": f"needs_browser: {e}", "source": "http"}
+            logging.info(f"HTTP fast path needs a browser for {case_id}: {e}")
+        except Exception as e:
+            if mode == "http":
+                return {"case_id": case_id, "status": f"error: {e}", "source": "http"}
+            logging.warning(f"HTTP fast path failed for {case_id}: {e}")
+    if session is not None:
+        return await _submit_in_session(session, case_id, parts)
+    async with pool.lease() as context:
+        details = await _scrape(context, case_id)
+    details["source"] = "browser"
+    return details
+
+async def _submit_in_session(session: AsyncFormSession, case_id: str, parts: List[str]) -> Dict:
+    details = {"case_id": case_id, "status": "error", "source": "session"}
+    if len(parts) != 3:
+        details["status"] = "invalid_format"
+        return details
+    try:
+        parsed, _ = await session.lookup(*parts, missing="")
+        parsed["pdf_url"] = parsed["pdf_url"] or ""
+        details.update(parsed)
+        details["status"] = "success"
+    except PlaywrightTimeoutError as e:
+        get_pacer().observe(0, ok=False)
+        details["status"] = f"timeout: {e}"
+        logging.warning(f"Timeout for {case_id}: {e}")
+    except Exception as e:
+        get_pacer().observe(0, ok=False)
+        details["status"] = f"error: {e}"
+        logging.error(f"Error for {case_id}: {e}")
+    return details
+
+async def _scrape(context, case_id: str) -> Dict:
+    page = await context.new_page()
     details = {"case_id": case_id, "status": "error"}
+    pacer = get_pacer()
+    net = await network.install_async(page, URL)
     try:
-        await page.goto(url)
-        await page.wait_for_selector("select[name='CaseType']", timeout=10000)
-        await page.wait_for_selector("input[name='CaseNo']", timeout=10000)
-        await page.wait_for_selector("input[name='CaseYear']", timeout=10000)
+        with metrics.span(METRICS_LABEL, "goto"):
+            started = time.monotonic()
+            response = await page.goto(URL, wait_until="domcontentloaded")
+            pacer.observe(time.monotonic() - started, response is None or response.ok)
+        with metrics.span(METRICS_LABEL, "form_wait"):
+            await page.wait_for_selector("select[name='CaseType']", timeout=10000)
+            await page.wait_for_selector("input[name='CaseNo']", timeout=10000)
+            await page.wait_for_selector("input[name='CaseYear']", timeout=10000)
         # Assume case_id format: <CaseType>,<CaseNumber>,<FilingYear>
         parts = [x.strip() for x in case_id.split(",")]
         if len(parts) != 3:
             details["status"] = "invalid_format"
             return details
         case_type, case_number, filing_year = parts
-        await page.select_option("select[name='CaseType']", label=case_type)
-        await page.fill("input[name='CaseNo']", case_number)
-        await page.fill("input[name='CaseYear']", filing_year)
-        await page.click("input[type='submit']")
-        await page.wait_for_selector("iframe[name='frmCaseStatus']", timeout=20000)
-        frame = page.frame(name="frmCaseStatus")
-        if not frame:
-            details["status"] = "iframe_not_found"
-            return details
-        await frame.wait_for_selector("table", timeout=20000)
-        # Extract details
-        def get_text(sel):
-            elem = frame.query_selector(sel)
-            return asyncio.run(elem.inner_text()) if elem else ""
-        details["petitioner"] = await (await frame.query_selector("td:has-text('Petitioner')")).evaluate("el => el.nextElementSibling.innerText") if await frame.query_selector("td:has-text('Petitioner')") else ""
-        details["respondent"] = await (await frame.query_selector("td:has-text('Respondent')")).evaluate("el => el.nextElementSibling.innerText") if await frame.query_selector("td:has-text('Respondent')") else ""
-        details["filing_date"] = await (await frame.query_selector("td:has-text('Filing Date')")).evaluate("el => el.nextElementSibling.innerText") if await frame.query_selector("td:has-text('Filing Date')") else ""
-        details["next_hearing"] = await (await frame.query_selector("td:has-text('Next Date')")).evaluate("el => el.nextElementSibling.innerText") if await frame.query_selector("td:has-text('Next Date')") else ""
-        pdf_elem = await frame.query_selector("a[href$='.pdf']")
-        details["pdf_url"] = await pdf_elem.get_attribute("href") if pdf_elem else ""
+        with metrics.span(METRICS_LABEL, "fill"):
+            await page.select_option("select[name='CaseType']", label=case_type)
+            await page.fill("input[name='CaseNo']", case_number)
+            await page.fill("input[name='CaseYear']", filing_year)
+        with metrics.span(METRICS_LABEL, "pacing"):
+            await asyncio.sleep(pacer.pause("before_submit"))
+        with metrics.span(METRICS_LABEL, "submit"):
+            started = time.monotonic()
+            async with page.expect_response(lambda r: r.request.is_navigation_request(), timeout=20000) as response_info:
+                await page.click("input[type='submit']")
+            response = await response_info.value
+            pacer.observe(time.monotonic() - started, response.ok)
+        with metrics.span(METRICS_LABEL, "iframe_wait"):
+            await page.wait_for_selector("iframe[name='frmCaseStatus']", timeout=20000)
+            frame = page.frame(name="frmCaseStatus")
+            if not frame:
+                details["status"] = "iframe_not_found"
+                return details
+            await frame.wait_for_selector("table", timeout=20000)
+        # Extract details from a single frame.content() round trip
+        with metrics.span(METRICS_LABEL, "extract"):
+            parsed = parse_case_html(await frame.content(), base_url=frame.url, missing="")
+        parsed["pdf_url"] = parsed["pdf_url"] or ""
+        details.update(parsed)
         details["status"] = "success"
     except PlaywrightTimeoutError as e:
+        pacer.observe(0, ok=False)
         details["status"] = f"timeout: {e}"
         logging.warning(f"Timeout for {case_id}: {e}")
     except Exception as e:
+        pacer.observe(0, ok=False)
         details["status"] = f"error: {e}"
         logging.error(f"Error for {case_id}: {e}")
     finally:
-        await browser.close()
+        await page.close()
+        logging.info(f"Network for {case_id}: {network.finish(net)}")
     return details
 
+async def fetch_with_retries(pool: AsyncBrowserPool, bucket: AsyncTokenBucket, case_id: str,
+                             session: Optional[AsyncFormSession] = None) -> Dict:
+    """
+    Fetch one case, coalescing with any identical lookup already in flight.
+    """
+    key = parse_case_id(case_id) or case_id
+    result = await _lookups.do(key, _fetch_with_retries, pool, bucket, case_id, session)
+    return {**result, "case_id": case_id}
+
+async def _fetch_with_retries(pool: AsyncBrowserPool, bucket: AsyncTokenBucket, case_id: str,
+                              session: Optional[AsyncFormSession] = None) -> Dict:
+    """
+    Fetch one case, retrying failures with jittered exponential backoff.
+    Fresh entries in the shared case cache are returned without scraping.
+    Every request sent takes a token from the shared bucket: one per attempt, and one
+    more when auto mode fell back from HTTP to the browser.
+    """
+    cache = get_case_cache()
+    key = parse_case_id(case_id)
+    if key and not FORCE_REFRESH:
+        cached, state = cache.lookup(key, allow_stale=False)
+        if state == "hit":
+            return {**_for_display(case_id, cached), "cache": "hit"}
+    for attempt in range(RETRY_LIMIT):
+        await bucket.acquire()
+        result = await fetch_case_details(pool, case_id, session=session)
+        # Charged after the fact, like scheduler.py, since only the result says whether HTTP was tried.
+        for _ in range(_requests_sent(result, case_id) - 1):
+            await bucket.acquire()
+        if _outcome(result) in ("success", "invalid_format", "needs_browser"):
+            break
+        if attempt + 1 < RETRY_LIMIT:
+            await asyncio.sleep(backoff_delay(attempt, BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS))
+    if key and result.get("status") == "success":
+        cache.store(key, _for_cache(result))
+    return result
+
+# main.py writes missing fields and a missing PDF link as ""; the shared case cache holds
+# them the way fetcher.py and app.py parse them, as "Not found" and None.
+def _for_cache(result: Dict) -> Dict:
+    details = {k: v for k, v in result.items() if k not in ("case_id", "status")}
+    for field in LABELS:
+        if details.get(field) == "":
+            details[field] = "Not found"
+    details["pdf_url"] = details.get("pdf_url") or None
+    return details
+
+def _for_display(case_id: str, details: Dict) -> Dict:
+    row = {"case_id": case_id, **details, "status": "success"}
+    for field in LABELS:
+        if row.get(field) == "Not found":
+            row[field] = ""
+    row["pdf_url"] = row.get("pdf_url") or ""
+    return row
+
+def _requests_sent(result: Dict, case_id: str, mode: str = FETCH_MODE) -> int:
+    """Requests one attempt sent: in auto mode a browser answer for a well-formed id tried HTTP first."""
+    if mode == "auto" and len(case_id.split(",")) == 3 and result.get("source") != "http":
+        return 2
+    return 1
+
+def _outcome(result: Dict) -> str:
+    status = result.get("status", "error")
+    return status.split(":", 1)[0]
+
+async def run_batch(pool: AsyncBrowserPool, case_ids: List[str], concurrency: int = CONCURRENCY,
+                    rate: float = RATE_LIMIT_RPS, burst: int = RATE_LIMIT_BURST,
+                    on_result: Optional[Callable[[Dict], None]] = None,
+                    form_session: bool = FORM_SESSION) -> List[Dict]:
+    """
+    Process case IDs with a pool of `concurrency` workers sharing one token bucket.
+    Returns results in input order and logs throughput/latency as it goes.
+    on_result, if given, is called in a worker thread with each result as it arrives.
+    With form_session, each worker submits its browser lookups through its own warm search page.
+    """
+    bucket = AsyncTokenBucket(rate, burst)
+    stats = LatencyStats()
+    results: List[Dict] = [None] * len(case_ids)
+    work: asyncio.Queue = asyncio.Queue()
+    for item in enumerate(case_ids):
+        work.put_nowait(item)
+
+    async def worker():
+        session = AsyncFormSession(pool, URL, METRICS_LABEL) if form_session else None
+        try:
+            await work_through(session)
+        finally:
+            if session is not None:
+                await session.close()
+                logging.info(f"Form session: {session.stats()}")
+
+    async def work_through(session: Optional[AsyncFormSession]):
+        while True:
+            try:
+                index, case_id = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.monotonic()
+            result = await fetch_with_retries(pool, bucket, case_id, session)
+            stats.record(time.monotonic() - started, _outcome(result))
+            results[index] = result
+            if on_result is not None:
+                try:
+                    await asyncio.to_thread(on_result, result)
+                except Exception as e:
+                    logging.error(f"Failed to stream result for {case_id}: {e}")
+            print(result)
+            logging.info(f"Fetched: {result}")
+            if stats.completed % PROGRESS_EVERY == 0:
+                report = stats.format(len(case_ids))
+                print(report)
+                logging.info(f"Progress: {report}")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(case_ids))))))
+    report = stats.format(len(case_ids))
+    print(f"Batch finished: {report}")
+    logging.info(f"Batch finished: {report}")
+    logging.info(f"Cache: {get_case_cache().stats()} | coalescing: {_lookups.stats()}")
+    bandwidth = network.stats()
+    if bandwidth["lookups"]:
+        print(f"Bandwidth: {bandwidth}")
+        logging.info(f"Bandwidth: {bandwidth}")
+    phases = metrics.format_summary(METRICS_LABEL)
+    print(phases)
+    logging.info(f"Phase timings:\n{phases}")
+    return results
+
 async def main():
     # Read case IDs from Google Sheet if possible, else from file
     try:
@@ -93,28 +323,29 @@ async def main():
         else:
             print("No input source found.")
             return
-    results = []
-    async with async_playwright() as playwright:
-        for case_id in case_ids:
-            for attempt in range(RETRY_LIMIT):
-                result = await fetch_case_details(playwright, case_id)
-                if result.get("status") == "success":
-                    break
-                await asyncio.sleep(1)
-            results.append(result)
-            print(result)
-            logging.info(f"Fetched: {result}")
-            await asyncio.sleep(RATE_LIMIT_SECONDS)
+    # Stream results into the Google Sheet while the batch runs, if it is reachable
+    try:
+        sheet = SheetSync()
+    except Exception as e:
+        sheet = None
+        logging.error(f"Google Sheet unavailable, results will only be saved to file: {e}")
+    async with async_playwright() as playwright, AsyncBrowserPool(playwright, size=CONCURRENCY) as pool:
+        results = await run_batch(pool, case_ids, on_result=sheet.push if sheet else None)
     # Save to file
     import json
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(results, f, indent=2, ensure_ascii=False)
-    # Write to Google Sheet if possible
-    try:
-        write_results(results)
-        logging.info("Results written to Google Sheet.")
-    except Exception as e:
-        logging.error(f"Failed to write to Google Sheet: {e}")
+    # Write whatever is still buffered to the Google Sheet
+    if sheet is not None:
+        try:
+            await asyncio.to_thread(sheet.flush)
+            logging.info(f"Results written to Google Sheet: {sheet.stats()}")
+        except Exception as e:
+            logging.error(f"Failed to write to Google Sheet: {e}")
+    if DOWNLOAD_ORDERS:
+        documents = await asyncio.to_thread(download_documents, [r for r in results if r.get("status") == "success"])
+        print(f"Documents: {documents}")
+        logging.info(f"Documents: {documents}")
 
 if __name__ == "__main__":
     asyncio.run(main())
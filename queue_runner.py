@@ -0,0 +1,288 @@
+"""
+Sharded batch runner: case tuples in a durable work queue, drained by worker processes.
+
+fetcher.py and main.py run in one process. This runner loads the cases into
+a SQLite work queue (utils.work_queue) and starts N worker processes. Each
+worker owns its own browser (BROWSER_POOL_SIZE defaults to 1 per process),
+claims one case at a time on a renewable lease and looks it up through the
+shared case cache, as fetcher.py does. If a worker crashes, its case is
+reclaimed once the lease expires, and the runner starts a replacement
+process. The runner merges finished results into output.jsonl, output.csv and
+output.failed.jsonl, optionally into the Google Sheet, and at the end into
+data/output.json.
+
+Usage:
+    python queue_runner.py run [cases.txt] [--workers=4] [--mode=auto|http|browser] [--refresh]
+                               [--session] [--sheet] [--serve=PORT [--bind=ADDR]] [--restart]
+                               [--download]
+    python queue_runner.py work QUEUE [--workers=4] [--mode=...] [--refresh] [--session]
+    python queue_runner.py status [QUEUE]
+
+`run` queues the cases in the file (failed ones are queued again), works the
+queue until it is empty and merges the results. Running it again without a
+file resumes an interrupted run. --serve also exposes the queue over HTTP on
+127.0.0.1. To let `work http://this-host:PORT` on other hosts add workers,
+pass --bind with an address they can reach and set the same QUEUE_TOKEN on
+every host. The server speaks plain HTTP, so the token is only as private as
+the network: bind on a trusted network or put a TLS proxy in front (workers
+accept https:// URLs). A queue file path given to `work` must be on this
+host: SQLite's WAL mode does not work over network filesystems, so other
+hosts use --serve. --restart empties the queue and the outputs first.
+--download then fetches the linked order PDFs (utils.downloader).
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import List, Optional
+
+from fetcher import (FAILED_JSONL, OUTPUT_CSV, OUTPUT_JSONL, ResultWriter, fetch_case, read_case_numbers,
+                     succeeded)
+from scraper import FETCH_MODES
+from utils.downloader import download_documents
+from utils.work_queue import QUEUE_DB_PATH, QUEUE_LEASE_SECONDS, QueueServer, WorkQueue, open_queue
+
+LOG_FILE = "queue_runner.log"
+OUTPUT_JSON = Path("data") / "output.json"  # the file main.py writes
+QUEUE_WORKERS = int(os.getenv("QUEUE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", 1))
+# Crashed workers are replaced at most this many times per configured worker.
+QUEUE_MAX_RESTARTS = int(os.getenv("QUEUE_MAX_RESTARTS", 3))
+
+MERGE_CURSOR = "outputs"
+
+
+def _setup_logging():
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format="%(asctime)s %(processName)s %(levelname)s: %(message)s",
+        force=True,
+    )
+
+
+def _option(flags: List[str], name: str, default: Optional[str] = None) -> Optional[str]:
+    return next((flag.split("=", 1)[1] for flag in flags if flag.startswith(f"--{name}=")), default)
+
+
+# --- workers ----------------------------------------------------------------
+def work(target: str, mode: Optional[str] = None, force_refresh: bool = False, session: bool = False,
+         lease_seconds: float = QUEUE_LEASE_SECONDS):
+    """Claim and look up cases from the queue at `target` (file path or URL) until it is drained."""
+    from scraper import form_session
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    queue = open_queue(target)
+    held = set()
+    stop = threading.Event()
+
+    def heartbeat():
+        # Keep leases alive through slow lookups; a dead process stops renewing.
+        while not stop.wait(lease_seconds / 3):
+            try:
+                queue.renew(owner, list(held), lease_seconds)
+            except Exception as e:
+                logging.warning(f"Could not renew leases: {e}")
+
+    threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True).start()
+    looked_up = 0
+    try:
+        with (form_session() if session else nullcontext()) as form:
+            while True:
+                try:
+                    items, wait = queue.claim(owner, 1, lease_seconds)
+                except Exception as e:
+                    logging.warning(f"Could not claim from {target}: {e}")
+                    time.sleep(QUEUE_POLL_SECONDS)
+                    continue
+                if not items:
+                    if wait is None:
+                        break
+                    time.sleep(min(max(wait, 0.05), QUEUE_POLL_SECONDS))
+                    continue
+                for item in items:
+                    case = {field: item[field] for field in ("case_type", "case_number", "filing_year")}
+                    key = tuple(item["key"])
+                    held.add(key)
+                    logging.info(f"Fetching (attempt {item['attempt']}): {'-'.join(key)}")
+                    result = fetch_case(case, force_refresh=force_refresh, mode=mode, session=form)
+                    try:
+                        if not queue.complete(owner, key, result, succeeded(result)):
+                            logging.warning(f"Lease on {'-'.join(key)} was lost; result dropped")
+                    finally:
+                        held.discard(key)
+                    looked_up += 1
+    finally:
+        stop.set()
+        try:
+            queue.release(owner)
+        except Exception as e:
+            logging.warning(f"Could not release leases: {e}")
+        queue.close()
+        logging.info(f"Worker {owner} finished after {looked_up} lookups")
+
+
+def _worker_process(target: str, mode: Optional[str], force_refresh: bool, session: bool):
+    _setup_logging()
+    work(target, mode, force_refresh, session)
+
+
+def _start_worker(ctx, index: int, target: str, mode: Optional[str], force_refresh: bool, session: bool):
+    process = ctx.Process(target=_worker_process, args=(target, mode, force_refresh, session),
+                          name=f"queue-worker-{index}")
+    process.start()
+    return process
+
+
+# --- merging ----------------------------------------------------------------
+def merge(queue: WorkQueue, writer: ResultWriter, sheet=None) -> int:
+    """Append results finished since the last merge to the outputs; returns how many."""
+    cursor = queue.get_cursor(MERGE_CURSOR)
+    merged = 0
+    while True:
+        rows = queue.finished(cursor)
+        if not rows:
+            return merged
+        for seq, status, result in rows:
+            writer.write(result, status == "done")
+            if sheet is not None and status == "done":
+                case_id = ",".join(result.get(field, "") for field in ("case_type", "case_number", "filing_year"))
+                try:
+                    sheet.push({"case_id": case_id, **result})
+                except Exception as e:
+                    logging.error(f"Failed to push {case_id} to Google Sheet: {e}")
+            cursor = seq
+            merged += 1
+        queue.set_cursor(MERGE_CURSOR, cursor)
+
+
+def run(input_file: Optional[str], flags: List[str]):
+    queue_path = _option(flags, "queue", QUEUE_DB_PATH)
+    workers = int(_option(flags, "workers", QUEUE_WORKERS))
+    mode = _option(flags, "mode")
+    force_refresh = "--refresh" in flags
+    session = "--session" in flags
+    queue = WorkQueue(queue_path)
+    if "--restart" in flags:
+        queue.reset()
+        for path in (OUTPUT_JSONL, OUTPUT_CSV, FAILED_JSONL):
+            if os.path.exists(path):
+                os.remove(path)
+    if input_file:
+        print(f"Queued from {input_file}: {queue.add(read_case_numbers(input_file))}")
+
+    sheet = None
+    if "--sheet" in flags:
+        try:
+            from utils.google_sheet import SheetSync
+            sheet = SheetSync()
+        except Exception as e:
+            logging.error(f"Google Sheet unavailable, results will only be saved to file: {e}")
+    server = None
+    port = _option(flags, "serve")
+    if port is not None:
+        server = QueueServer(queue, host=_option(flags, "bind", "127.0.0.1"), port=int(port)).start()
+        print(f"Queue served at {server.url}; add workers with: python queue_runner.py work {server.url}")
+
+    # One browser per process: the process is the unit of parallelism here.
+    os.environ.setdefault("BROWSER_POOL_SIZE", "1")
+    # Playwright starts threads, so workers are spawned rather than forked.
+    ctx = multiprocessing.get_context("spawn")
+    processes = [_start_worker(ctx, i, queue_path, mode, force_refresh, session) for i in range(workers)]
+    restarts = 0
+    started = time.monotonic()
+    merged = 0
+    try:
+        with ResultWriter() as writer:
+            while True:
+                merged += merge(queue, writer, sheet)
+                stats = queue.stats()
+                if not stats["pending"] and not stats["leased"]:
+                    break
+                for i, process in enumerate(processes):
+                    if process.is_alive():
+                        continue
+                    if process.exitcode != 0 and restarts < QUEUE_MAX_RESTARTS * workers:
+                        restarts += 1
+                        logging.warning(f"{process.name} exited with {process.exitcode}; starting a replacement")
+                        processes[i] = _start_worker(ctx, i, queue_path, mode, force_refresh, session)
+                if server is None and not any(process.is_alive() for process in processes):
+                    print("All workers exited with cases left in the queue; run again to resume.")
+                    break
+                time.sleep(QUEUE_POLL_SECONDS)
+            merged += merge(queue, writer, sheet)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if server is not None:
+            server.stop()
+
+    OUTPUT_JSON.parent.mkdir(exist_ok=True)
+    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
+        json.dump(queue.results(), f, indent=2, ensure_ascii=False)
+    if sheet is not None:
+        try:
+            sheet.flush()
+            logging.info(f"Results written to Google Sheet: {sheet.stats()}")
+        except Exception as e:
+            logging.error(f"Failed to write to Google Sheet: {e}")
+    elapsed = time.monotonic() - started
+    stats = queue.stats()
+    print(f"Done. Merged {merged} results in {elapsed:.1f}s with {workers} workers "
+          f"({merged / elapsed * 60 if elapsed else 0:.1f}/min); restarts: {restarts}.")
+    print(f"Queue: {stats}")
+    print(f"Results appended to {OUTPUT_JSONL} and {OUTPUT_CSV}, all results in {OUTPUT_JSON}")
+    if stats["failed"]:
+        print(f"Failures logged to {FAILED_JSONL}; run again with the same file to retry them.")
+    if "--download" in flags:
+        print(f"Documents: {download_documents(r for r in queue.results() if succeeded(r))}")
+    queue.close()
+
+
+def work_only(target: str, flags: List[str]):
+    workers = int(_option(flags, "workers", QUEUE_WORKERS))
+    os.environ.setdefault("BROWSER_POOL_SIZE", "1")
+    ctx = multiprocessing.get_context("spawn")
+    args = (target, _option(flags, "mode"), "--refresh" in flags, "--session" in flags)
+    processes = [_start_worker(ctx, i, *args) for i in range(workers)]
+    for process in processes:
+        process.join()
+    print(f"Workers finished; exit codes: {[process.exitcode for process in processes]}")
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    command = args[0] if args else ""
+    mode = _option(flags, "mode")
+    if mode is not None and mode not in FETCH_MODES:
+        print(f"unknown --mode={mode}; expected one of {'|'.join(FETCH_MODES)}")
+        sys.exit(1)
+    _setup_logging()
+    if command == "run":
+        if len(args) > 1 and not Path(args[1]).exists():
+            print(f"Input file {args[1]} not found.")
+            sys.exit(1)
+        run(args[1] if len(args) > 1 else None, flags)
+    elif command == "work" and len(args) > 1:
+        work_only(args[1], flags)
+    elif command == "status":
+        queue = open_queue(args[1] if len(args) > 1 else QUEUE_DB_PATH)
+        print(json.dumps(queue.stats(), indent=2))
+        queue.close()
+    else:
+        print(__doc__.split("Usage:", 1)[1].split("\n\n", 1)[0].rstrip())
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
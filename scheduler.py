@@ -0,0 +1,200 @@
+"""
+Hearing-aware refresh scheduler for tracked cases.
+
+Instead of scraping every case on every run, each tracked case is refreshed
+when it is due (see utils.tracking for the intervals). Cases with a hearing in
+the next few days are checked several times a day. Dormant cases are checked
+about once a month. At most TRACK_BUDGET_PER_HOUR requests go to the court per
+hour, spread evenly over the hour. An auto-mode refresh that falls back to the
+browser counts twice, once for the HTTP attempt and once for the browser.
+Each refresh is logged to the search log (DB_PATH) like a search from the web
+app, and stored in the shared case cache. Fields that changed are saved as
+change events in case_changes and appended to TRACK_EVENTS_FILE.
+
+Usage:
+    python scheduler.py add cases.txt          start tracking the cases in a file
+    python scheduler.py seed                   track every case in the search log, using its
+                                               latest stored page as the baseline
+    python scheduler.py run [--once] [--budget=N] [--mode=auto|http|browser]
+    python scheduler.py status
+    python scheduler.py changes [--since=ID]
+
+`run` keeps going until interrupted; --once refreshes what is due now (within
+the remaining hourly budget) and exits.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fetcher import read_case_numbers
+from scraper import FETCH_MODE, FETCH_MODES, URL, fetch_case_details
+from utils.cache import get_case_cache, normalize_case_key
+from utils.case_parser import parse_case_html
+from utils.search_log import DB_PATH, get_search_log, iter_searches
+from utils.tracking import CaseTracker
+
+LOG_FILE = "scheduler.log"
+TRACK_BUDGET_PER_HOUR = int(os.getenv("TRACK_BUDGET_PER_HOUR", 120))
+TRACK_EVENTS_FILE = os.getenv("TRACK_EVENTS_FILE", "case_changes.jsonl")
+TRACK_POLL_SECONDS = float(os.getenv("TRACK_POLL_SECONDS", 60))
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s: %(message)s"
+)
+
+
+def _option(flags: List[str], name: str, default: Optional[str] = None) -> Optional[str]:
+    return next((flag.split("=", 1)[1] for flag in flags if flag.startswith(f"--{name}=")), default)
+
+
+def refresh(case: Dict, mode: Optional[str] = None) -> Tuple[Dict, bool]:
+    """
+    Look one case (as returned by CaseTracker.due) up, bypassing the cache; logs the page and
+    updates the cache. Returns (details, ok).
+    """
+    lookup = (case["case_type"], case["case_number"], case["filing_year"])
+    result = fetch_case_details(*lookup, return_html=True, mode=mode)
+    details, html = result if isinstance(result, tuple) else (result, "")
+    if html:
+        get_search_log(DB_PATH).log(*lookup, html)
+    ok = bool(details) and details.get("petitioner") not in ("Error", "Timeout")
+    if ok:
+        get_case_cache().store(tuple(case["key"]), details)
+    return details, ok
+
+
+def requests_sent(details: Dict, mode: Optional[str] = None) -> int:
+    """Requests one refresh sent: in auto mode anything not answered over HTTP tried HTTP first."""
+    if (mode or FETCH_MODE) == "auto" and details.get("source") != "http":
+        return 2
+    return 1
+
+
+def emit(events: List[Dict]):
+    """Publish change events: the events file, the log and stdout."""
+    if not events:
+        return
+    with open(TRACK_EVENTS_FILE, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    for event in events:
+        message = (f"{event['case_type']}-{event['case_number']}-{event['filing_year']} {event['field']}: "
+                   f"{event['old']!r} -> {event['new']!r}")
+        logging.info(f"Change: {message}")
+        print(f"Changed: {message}")
+
+
+def run(tracker: CaseTracker, budget: int = TRACK_BUDGET_PER_HOUR, mode: Optional[str] = None,
+        once: bool = False) -> Dict:
+    """Refresh due cases within the hourly request budget; with once, stop when nothing more is due now."""
+    budget = max(1, budget)
+    spacing = 3600 / budget
+    counters = {"refreshed": 0, "failed": 0, "changed_cases": 0, "changes": 0, "requests": 0}
+    while True:
+        if tracker.used_last_hour() >= budget:
+            if once:
+                logging.info("Hourly budget spent")
+                break
+            time.sleep(max(1.0, tracker.budget_frees_at(budget) - time.time()))
+            continue
+        due = tracker.due(1)
+        if not due:
+            if once:
+                break
+            next_at = tracker.next_due_at()
+            wait = TRACK_POLL_SECONDS if next_at is None else next_at - time.time()
+            time.sleep(min(max(1.0, wait), TRACK_POLL_SECONDS))
+            continue
+        key = tuple(due[0]["key"])
+        started = time.monotonic()
+        # Charged up front so a crash mid-lookup still counts; a browser fallback is added after.
+        tracker.spend()
+        details, ok = refresh(due[0], mode)
+        sent = requests_sent(details, mode)
+        tracker.spend(sent - 1)
+        events = tracker.record(key, details, ok)
+        emit(events)
+        counters["refreshed"] += 1
+        counters["requests"] += sent
+        counters["failed"] += not ok
+        counters["changed_cases"] += bool(events)
+        counters["changes"] += len(events)
+        logging.info(f"Refreshed {'-'.join(key)}: ok={ok}, {len(events)} changes, "
+                     f"source {details.get('source')}")
+        if not once:
+            # Spread the budget over the hour rather than spending it in a burst.
+            time.sleep(max(0.0, spacing * sent - (time.monotonic() - started)))
+    return counters
+
+
+def seed(tracker: CaseTracker, db_path: str = DB_PATH) -> Dict:
+    """Track every case in the search log; the latest stored page of each becomes its baseline."""
+    # Only row ids are kept here; each case's page is read and parsed one at a time below.
+    latest = {}
+    for search in iter_searches(db_path, with_html=False):
+        key = normalize_case_key(search["case_type"], search["case_number"], search["filing_year"])
+        if search["page_hash"] or key not in latest:
+            latest[key] = search["id"]
+    tracked = seeded = 0
+    for search in iter_searches(db_path, ids=latest.values()):
+        case = {field: search[field] for field in ("case_type", "case_number", "filing_year")}
+        tracked += tracker.track([case])
+        if not search["raw_response"]:
+            continue
+        details = parse_case_html(search["raw_response"], base_url=URL)
+        if details["petitioner"] == "Not found":
+            continue
+        checked_at = datetime.strptime(search["timestamp"], "%Y-%m-%d %H:%M:%S").replace(
+            tzinfo=timezone.utc).timestamp()
+        seeded += tracker.seed(case, details, checked_at)
+    return {"cases": len(latest), "newly_tracked": tracked, "seeded_from_log": seeded}
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    command = args[0] if args else ""
+    mode = _option(flags, "mode")
+    if mode is not None and mode not in FETCH_MODES:
+        print(f"unknown --mode={mode}; expected one of {'|'.join(FETCH_MODES)}")
+        sys.exit(1)
+    tracker = CaseTracker(DB_PATH)
+    try:
+        if command == "add" and len(args) > 1:
+            if not Path(args[1]).exists():
+                print(f"Input file {args[1]} not found.")
+                sys.exit(1)
+            print(f"Now tracking {tracker.track(read_case_numbers(args[1]))} new cases.")
+        elif command == "seed":
+            print(f"Seeded from {DB_PATH}: {seed(tracker)}")
+        elif command == "run":
+            budget = int(_option(flags, "budget", TRACK_BUDGET_PER_HOUR))
+            try:
+                counters = run(tracker, budget, mode, once="--once" in flags)
+                print(f"Done: {counters}")
+            except KeyboardInterrupt:
+                print("Stopped.")
+            print(f"Tracked: {tracker.stats()}")
+        elif command == "status":
+            print(json.dumps({**tracker.stats(), "requests_last_hour": tracker.used_last_hour(),
+                              "budget_per_hour": TRACK_BUDGET_PER_HOUR}, indent=2))
+        elif command == "changes":
+            for event in tracker.changes(int(_option(flags, "since", 0))):
+                print(json.dumps(event, ensure_ascii=False))
+        else:
+            print(__doc__.split("Usage:", 1)[1].split("\n\n", 1)[0].rstrip())
+            sys.exit(1)
+    finally:
+        tracker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,199 @@
 import logging
 import os
-import random
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+import time
+from contextlib import contextmanager
+from utils.browser_pool import get_browser_pool
+from utils.cache import normalize_case_key
+from utils.case_parser import parse_case_html
+from utils.form_session import FORM_SELECTORS, FormSession
+from utils.http_client import NeedsBrowser, get_http_client
+from utils import metrics, network
+from utils.pacing import get_pacer
+from utils.singleflight import SingleFlight
 
-def fetch_case_details(case_type: str, case_number: str, filing_year: str, return_html: bool = False, headless: bool = True):
+URL = os.getenv("COURT_URL", "https://delhihighcourt.nic.in/app/get-case-type-status")
+
+# "auto" tries the browserless HTTP path first and falls back to Playwright,
+# "http" never launches a browser, "browser" always does.
+FETCH_MODES = ("auto", "http", "browser")
+FETCH_MODE = os.getenv("FETCH_MODE", "auto")
+
+# Concurrent lookups of the same case share a single scrape.
+_lookups = SingleFlight()
+
+# Label for this module's spans and lookups in utils.metrics.
+METRICS_LABEL = "scraper"
+
+
+def _save_failed_html(html: str):
+    logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir)
+    with open(os.path.join(logs_dir, "last_failed_html.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def _error_details(status: str = None) -> dict:
+    details = {
+        "petitioner": "Error",
+        "respondent": "Error",
+        "filing_date": "Error",
+        "next_hearing": "Error",
+        "pdf_url": None
+    }
+    if status:
+        details["status"] = status
+    return details
+
+
+def _pause(page, pacer, step: str):
+    seconds = pacer.pause(step)
+    if seconds > 0:
+        with metrics.span(METRICS_LABEL, "pacing"):
+            page.wait_for_timeout(seconds * 1000)
+
+
+def _scrape(context, case_type: str, case_number: str, filing_year: str, state: dict):
+    """
+    Runs one lookup in a leased browser context and returns the details dict.
+    The raw iframe HTML is stored in state["html"] as soon as it is available.
+
+    Every wait is tied to a concrete event (the navigation response, the form
+    selectors, the results frame loading); the only deliberate idle time comes
+    from the shared pacer (see utils.pacing). Resources the table does not need
+    are blocked and the rest is counted (see utils.network). Each phase is timed
+    by a utils.metrics span.
     """
-    Robustly fetches case details from the Delhi High Court website using Playwright.
-    Adds random delays, longer timeouts, and logs all steps and errors.
+    pacer = get_pacer()
+    page = context.new_page()
+    net = network.install(page, URL)
+    try:
+        return _fill_and_parse(page, pacer, case_type, case_number, filing_year, state)
+    finally:
+        logging.info(f"Network for {case_type}-{case_number}-{filing_year}: {network.finish(net)}")
+
+
+def _fill_and_parse(page, pacer, case_type: str, case_number: str, filing_year: str, state: dict):
+    logging.info(f"Navigating to {URL}")
+    with metrics.span(METRICS_LABEL, "goto"):
+        started = time.monotonic()
+        response = page.goto(URL, wait_until="domcontentloaded")
+        pacer.observe(time.monotonic() - started, response is None or response.ok)
+    _pause(page, pacer, "after_load")
+
+    with metrics.span(METRICS_LABEL, "form_wait"):
+        # Wait for every field: fill() on a slow page must not race the form render.
+        for selector in FORM_SELECTORS:
+            page.wait_for_selector(selector, timeout=20000)
+
+    _pause(page, pacer, "before_select")
+    _pause(page, pacer, "before_fill")
+    with metrics.span(METRICS_LABEL, "fill"):
+        page.select_option("select[name='CaseType']", label=case_type)
+        page.fill("input[name='CaseNo']", case_number)
+        page.fill("input[name='CaseYear']", filing_year)
+    _pause(page, pacer, "before_submit")
+
+    # The submission navigates either the page or the results iframe.
+    with metrics.span(METRICS_LABEL, "submit"):
+        started = time.monotonic()
+        with page.expect_response(lambda r: r.request.is_navigation_request(), timeout=20000) as response_info:
+            page.click("input[type='submit']")
+        response = response_info.value
+        pacer.observe(time.monotonic() - started, response.ok)
+    _pause(page, pacer, "after_submit")
+
+    with metrics.span(METRICS_LABEL, "iframe_wait"):
+        page.wait_for_selector("iframe[name='frmCaseStatus']", timeout=20000)
+        frame = page.frame(name="frmCaseStatus")
+        if not frame:
+            raise Exception("Results iframe not found.")
+        frame.wait_for_load_state("domcontentloaded", timeout=20000)
+        frame.wait_for_selector("table", timeout=20000)
+
+    # Extract every field from the HTML we already have instead of one IPC round trip per field.
+    with metrics.span(METRICS_LABEL, "extract"):
+        state["html"] = frame.content()
+        try:
+            return parse_case_html(state["html"], base_url=frame.url)
+        except Exception as e:
+            logging.warning(f"Error parsing case details: {e}")
+            return _error_details()
+
+
+@contextmanager
+def form_session(headless: bool = True):
+    """
+    Lease one browser and keep the search page loaded for a run of lookups.
+    Pass the yielded session to fetch_case_details(..., session=...); see utils.form_session.
+    """
+    with get_browser_pool(headless).lease() as slot:
+        session = FormSession(slot, URL, METRICS_LABEL)
+        try:
+            yield session
+        finally:
+            session.close()
+            logging.info(f"Form session: {session.stats()}")
+
+
+def _lookup(case_type: str, case_number: str, filing_year: str, headless: bool, mode: str,
+            session: FormSession = None):
+    """Look up one case and return (details, html); details["source"] records the path used."""
+    started = time.perf_counter()
+
+    def record(source: str, outcome: str):
+        metrics.record_lookup(METRICS_LABEL, source, outcome, time.perf_counter() - started)
+
+    if mode in ("auto", "http"):
+        try:
+            with metrics.span(METRICS_LABEL, "http_fetch"):
+                details, html = get_http_client().fetch(URL, case_type, case_number, filing_year)
+            details["source"] = "http"
+            record("http", "success")
+            logging.info(f"Extracted details over HTTP: {details}")
+            return details, html
+        except NeedsBrowser as e:
+            if mode == "http":
+                record("http", "needs_browser")
+                raise
+            logging.info(f"HTTP fast path needs a browser, falling back to Playwright: {e}")
+        except Exception as e:
+            if mode == "http":
+                record("http", metrics.outcome_of(e))
+                raise
+            logging.warning(f"HTTP fast path failed, falling back to Playwright: {e}")
+    source = "browser" if session is None else "session"
+    state = {"html": ""}
+    try:
+        if session is None:
+            details = get_browser_pool(headless).run(_scrape, case_type, case_number, filing_year, state)
+        else:
+            details, state["html"] = session.lookup(case_type, case_number, filing_year)
+    except Exception as e:
+        record(source, metrics.outcome_of(e))
+        # Timeouts and crashes count against the pacing as well.
+        get_pacer().observe(0, ok=False)
+        # Save last html if available
+        if state["html"]:
+            _save_failed_html(state["html"])
+        raise
+    details["source"] = source
+    record(source, "error" if details["petitioner"] == "Error" else "success")
+    logging.info(f"Extracted details: {details}")
+    if details["petitioner"] == "Error":
+        _save_failed_html(state["html"])
+    return details, state["html"]
+
+
+def fetch_case_details(case_type: str, case_number: str, filing_year: str, return_html: bool = False, headless: bool = True,
+                       mode: str = None, session: FormSession = None):
+    """
+    Robustly fetches case details from the Delhi High Court website.
+    By default the form is first submitted over plain HTTP (utils.http_client); Playwright
+    is used only when the page needs JavaScript. Browser lookups run in an isolated context
+    leased from the shared warm browser pool (see utils.browser_pool). Identical lookups
+    already in flight are coalesced into one scrape whose result (or error) every caller shares.
+    Waits on page events with adaptive pacing (utils.pacing), and logs all steps and errors.
 
     Args:
         case_type (str): The case type (e.g., "W.P.(C)").
@@ -14,110 +201,27 @@ def fetch_case_details(case_type: str, case_number: str, filing_year: str, retur
         filing_year (str): The filing year.
         return_html (bool): If True, also return the raw HTML of the result page.
         headless (bool): Whether to run the browser in headless mode.
+        mode (str): "auto", "http" or "browser"; defaults to the FETCH_MODE environment variable.
+        session (FormSession): Warm search page from form_session(); browser lookups are
+            submitted through it instead of opening a new page.
 
     Returns:
-        dict: Dictionary with case details (petitioner, respondent, filing_date, next_hearing, pdf_url).
+        dict: Dictionary with case details (petitioner, respondent, filing_date, next_hearing, pdf_url,
+            orders, extra, source); see utils.case_parser.parse_case_html. source is "http",
+            "browser" or "session".
         str (optional): Raw HTML if return_html is True.
     """
-    url = "https://delhihighcourt.nic.in/app/get-case-type-status"
-    details = {}
-    html = ""
+    mode = mode or FETCH_MODE
+    if mode not in FETCH_MODES:
+        raise ValueError(f"mode must be one of {FETCH_MODES}")
+    key = (*normalize_case_key(case_type, case_number, filing_year), headless, mode)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=headless)
-            page = browser.new_page()
-            logging.info(f"Navigating to {url}")
-            page.goto(url)
-            page.wait_for_load_state('networkidle')
-            page.wait_for_timeout(random.uniform(1000, 4000))
-
-            page.wait_for_selector("select[name='CaseType']", timeout=20000)
-            page.wait_for_selector("input[name='CaseNo']", timeout=20000)
-            page.wait_for_selector("input[name='CaseYear']", timeout=20000)
-            page.wait_for_selector("input[type='submit']", timeout=20000)
-
-            page.wait_for_timeout(random.uniform(1000, 2000))
-            page.select_option("select[name='CaseType']", label=case_type)
-            page.wait_for_timeout(random.uniform(1000, 2000))
-            page.fill("input[name='CaseNo']", case_number)
-            page.fill("input[name='CaseYear']", filing_year)
-            page.wait_for_timeout(random.uniform(1000, 2000))
-            page.click("input[type='submit']")
-
-            page.wait_for_load_state('networkidle')
-            page.wait_for_timeout(3000)
-
-            page.wait_for_selector("iframe[name='frmCaseStatus']", timeout=20000)
-            frame = page.frame(name="frmCaseStatus")
-            if not frame:
-                raise Exception("Results iframe not found.")
-
-            frame.wait_for_selector("table", timeout=20000)
-            html = frame.content()
-
-            # Extract details
-            try:
-                petitioner_elem = frame.query_selector("td:has-text('Petitioner')")
-                respondent_elem = frame.query_selector("td:has-text('Respondent')")
-                petitioner = petitioner_elem.evaluate("el => el.nextElementSibling.innerText") if petitioner_elem else "Not found"
-                respondent = respondent_elem.evaluate("el => el.nextElementSibling.innerText") if respondent_elem else "Not found"
-            except Exception as e:
-                logging.warning(f"Error extracting parties: {e}")
-                petitioner = respondent = "Error"
-
-            try:
-                filing_elem = frame.query_selector("td:has-text('Filing Date')")
-                filing_date = filing_elem.evaluate("el => el.nextElementSibling.innerText") if filing_elem else "Not found"
-            except Exception as e:
-                logging.warning(f"Error extracting filing date: {e}")
-                filing_date = "Error"
-
-            try:
-                next_elem = frame.query_selector("td:has-text('Next Date')")
-                next_hearing = next_elem.evaluate("el => el.nextElementSibling.innerText") if next_elem else "Not found"
-            except Exception as e:
-                logging.warning(f"Error extracting next hearing: {e}")
-                next_hearing = "Error"
-
-            try:
-                pdf_link_elem = frame.query_selector("a[href$='.pdf']")
-                pdf_url = pdf_link_elem.get_attribute("href") if pdf_link_elem else None
-            except Exception as e:
-                logging.warning(f"Error extracting PDF link: {e}")
-                pdf_url = None
-
-            details = {
-                "petitioner": petitioner,
-                "respondent": respondent,
-                "filing_date": filing_date,
-                "next_hearing": next_hearing,
-                "pdf_url": pdf_url
-            }
-            logging.info(f"Extracted details: {details}")
-            if details["petitioner"] == "Error":
-                logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
-                if not os.path.exists(logs_dir):
-                    os.makedirs(logs_dir)
-                with open(os.path.join(logs_dir, "last_failed_html.html"), "w", encoding="utf-8") as f:
-                    f.write(html)
-            browser.close()
-            if return_html:
-                return details, html
-            return details
+        details, html = _lookups.do(key, _lookup, case_type, case_number, filing_year, headless, mode, session)
+        # Callers may annotate the dict, so each gets its own copy.
+        details = dict(details)
+        if return_html:
+            return details, html
+        return details
     except Exception as e:
         logging.error(f"Scraper error: {e}")
-        # Ensure logs directory exists and save last html if available
-        if html:
-            logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
-            if not os.path.exists(logs_dir):
-                os.makedirs(logs_dir)
-            with open(os.path.join(logs_dir, "last_failed_html.html"), "w", encoding="utf-8") as f:
-                f.write(html)
-        return {
-            "petitioner": "Error",
-            "respondent": "Error",
-            "filing_date": "Error",
-            "next_hearing": "Error",
-            "pdf_url": None,
-            "status": "Scraping failed."
-        }
\ No newline at end of file
+        return _error_details("Scraping failed.")
@@ -110,6 +110,39 @@ document.addEventListener("DOMContentLoaded", () => {
         setTimeout(animateCards, 100); // Animate in
     }
 
+    // Helper: Submit a job (one case or {cases: [...]}) and stream its results.
+    // onResult is called with each finished case; resolves with the first one.
+    async function runJob(payload, onResult) {
+        const response = await fetch("/jobs", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(payload)
+        });
+        const job = await response.json();
+        if (!response.ok || job.error) {
+            throw new Error(job.error || "Could not start the lookup.");
+        }
+        return new Promise((resolve, reject) => {
+            let first = null;
+            const events = new EventSource(job.events_url);
+            events.addEventListener("result", (event) => {
+                const item = JSON.parse(event.data);
+                if (!first) first = item;
+                if (onResult) onResult(item);
+            });
+            events.addEventListener("done", () => {
+                events.close();
+                first ? resolve(first) : reject(new Error("No data found for this case."));
+            });
+            // EventSource reconnects by itself (resuming via Last-Event-ID); give up only once it is closed.
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) {
+                    reject(new Error("Lost connection while waiting for results."));
+                }
+            };
+        });
+    }
+
     // Helper: Reset form and results
     function resetAll() {
         form.reset();
@@ -166,15 +199,11 @@ document.addEventListener("DOMContentLoaded", () => {
         const filingYear = form.filingYear.value;
 
         try {
-            // Call backend API (replace with actual endpoint)
-            const response = await fetch("/fetch-case", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ case_type: caseType, case_number: caseNumber, filing_year: filingYear })
-            });
-            const data = await response.json();
+            // Submit a background job and wait for its result over Server-Sent Events
+            const item = await runJob({ case_type: caseType, case_number: caseNumber, filing_year: filingYear });
+            const data = item.result || {};
 
-            if (!response.ok || !data || data.error) {
+            if (item.status !== "done" || data.error) {
                 throw new Error(data.error || "No data found for this case.");
             }
 
@@ -0,0 +1,63 @@
+from datetime import date
+from pathlib import Path
+
+from utils.case_parser import parse_case_html
+from utils.dates import parse_court_date
+
+FIXTURE = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "case_status.html"
+BASE_URL = "https://delhihighcourt.nic.in/app/get-case-type-status"
+
+
+def parse_fixture(**kwargs):
+    return parse_case_html(FIXTURE.read_text(encoding="utf-8"), **kwargs)
+
+
+def test_parties():
+    details = parse_fixture()
+    assert details["petitioner"] == "RAMESH KUMAR & ORS.\nAdvocate: S. SHARMA"
+    assert details["respondent"] == "UNION OF INDIA & ANR."
+
+
+def test_dates():
+    details = parse_fixture()
+    assert details["filing_date"] == "12/01/2023"
+    assert details["next_hearing"] == "28/08/2025 (Court No. 12)"
+    assert parse_court_date(details["filing_date"]) == date(2023, 1, 12)
+    assert parse_court_date(details["next_hearing"]) == date(2025, 8, 28)
+
+
+def test_order_links_are_absolute_and_deduplicated():
+    details = parse_fixture(base_url=BASE_URL)
+    assert details["orders"] == [
+        {"name": "Order dated 14/05/2025", "url": "https://delhihighcourt.nic.in/app/showlogo/order_14052025.pdf"},
+        {"name": "Order dated 02/02/2024", "url": "https://delhihighcourt.nic.in/app/showlogo/order_02022024.pdf"},
+        {"name": "Judgment", "url": "https://delhihighcourt.nic.in/app/judgment/JUDG_WPC1234.PDF?id=9"},
+    ]
+    assert details["pdf_url"] == details["orders"][0]["url"]
+
+
+def test_order_links_without_base_url():
+    details = parse_fixture()
+    assert details["pdf_url"] == "/app/showlogo/order_14052025.pdf"
+
+
+def test_extra_rows():
+    # Parties, dates and the serial-numbered order rows are not repeated as extra rows.
+    assert parse_fixture()["extra"] == {"Status": "PENDING", "Court No.": "12"}
+
+
+def test_not_found_page():
+    html = "<html><body><table><tr><td>No record found.</td></tr></table></body></html>"
+    details = parse_case_html(html, base_url=BASE_URL)
+    for field in ("petitioner", "respondent", "filing_date", "next_hearing"):
+        assert details[field] == "Not found"
+    assert details["pdf_url"] is None
+    assert details["orders"] == []
+    assert details["extra"] == {}
+    assert parse_court_date(details["next_hearing"]) is None
+
+
+def test_missing_value():
+    details = parse_case_html("", missing=None)
+    assert details["petitioner"] is None
+    assert details["orders"] == []
@@ -0,0 +1,114 @@
+from utils.google_sheet import InMemoryWorksheet, SheetSync, a1_to_rowcol, rowcol_to_a1
+
+HEADERS = ["case_id", "petitioner", "next_hearing"]
+
+
+def result(case_id, petitioner="A", next_hearing="01/01/2026"):
+    return {"case_id": case_id, "petitioner": petitioner, "next_hearing": next_hearing}
+
+
+def make_sync(worksheet, tmp_path, **kwargs):
+    options = {"snapshot_path": str(tmp_path / "snapshot.json"), "flush_rows": 1000, "min_write_interval": 0}
+    return SheetSync(worksheet, **{**options, **kwargs})
+
+
+def test_a1_labels():
+    assert rowcol_to_a1(1, 1) == "A1"
+    assert rowcol_to_a1(2, 28) == "AB2"
+    assert a1_to_rowcol("AB2") == (2, 28)
+    assert a1_to_rowcol(rowcol_to_a1(120, 703)) == (120, 703)
+
+
+def test_new_rows_are_appended_under_the_headers(tmp_path):
+    sheet = InMemoryWorksheet()
+    sync = make_sync(sheet, tmp_path)
+    sync.push(result("W.P.(C),1,2023"))
+    sync.push(result("W.P.(C),2,2023", petitioner="B"))
+    sync.flush()
+    assert sheet.get_all_values() == [
+        HEADERS,
+        ["W.P.(C),1,2023", "A", "01/01/2026"],
+        ["W.P.(C),2,2023", "B", "01/01/2026"],
+    ]
+
+
+def test_unchanged_rows_are_skipped(tmp_path):
+    sheet = InMemoryWorksheet([HEADERS, ["W.P.(C),1,2023", "A", "01/01/2026"]])
+    sync = make_sync(sheet, tmp_path)
+    sync.push(result("W.P.(C),1,2023"))
+    sync.flush()
+    assert sheet.requests == 0
+    assert sync.stats()["unchanged"] == 1
+    assert sync.stats()["rows_written"] == 0
+
+
+def test_changed_rows_are_rewritten_in_place(tmp_path):
+    sheet = InMemoryWorksheet([
+        HEADERS,
+        ["W.P.(C),1,2023", "A", "01/01/2026"],
+        ["W.P.(C),2,2023", "B", "01/01/2026"],
+    ])
+    sync = make_sync(sheet, tmp_path)
+    sync.push(result("W.P.(C),1,2023"))
+    sync.push(result("W.P.(C),2,2023", petitioner="B", next_hearing="15/03/2026"))
+    sync.flush()
+    assert sheet.get_all_values()[1:] == [
+        ["W.P.(C),1,2023", "A", "01/01/2026"],
+        ["W.P.(C),2,2023", "B", "15/03/2026"],
+    ]
+    assert sync.stats()["rows_written"] == 1
+    assert sheet.requests == 1
+
+
+def test_batches_are_split_at_max_cells(tmp_path):
+    sheet = InMemoryWorksheet()
+    # Header plus five rows of three cells; at most two rows fit in a batch of seven cells.
+    sync = make_sync(sheet, tmp_path, max_cells_per_batch=7)
+    for number in range(1, 6):
+        sync.push(result(f"W.P.(C),{number},2023"))
+    sync.flush()
+    assert sheet.requests == 3
+    assert sync.stats()["cells_written"] == 18
+    assert len(sheet.get_all_values()) == 6
+
+
+def test_flush_rows_triggers_a_write(tmp_path):
+    sheet = InMemoryWorksheet()
+    sync = make_sync(sheet, tmp_path, flush_rows=2)
+    sync.push(result("W.P.(C),1,2023"))
+    assert sheet.requests == 1
+    assert sync.stats()["pending"] == 0
+
+
+def test_snapshot_is_reloaded_by_a_fresh_sync(tmp_path):
+    sheet = InMemoryWorksheet()
+    sync = make_sync(sheet, tmp_path)
+    sync.push(result("W.P.(C),1,2023"))
+    sync.flush()
+
+    class NoReads(InMemoryWorksheet):
+        def get_all_values(self):
+            raise AssertionError("the snapshot should make a read unnecessary")
+
+    replica = NoReads(sheet.values)
+    fresh = make_sync(replica, tmp_path)
+    assert fresh.headers == HEADERS
+    assert fresh.rows["W.P.(C),1,2023"]["row"] == 2
+    fresh.push(result("W.P.(C),1,2023"))
+    fresh.push(result("W.P.(C),2,2023"))
+    fresh.flush()
+    assert fresh.stats()["unchanged"] == 1
+    assert replica.values[2] == ["W.P.(C),2,2023", "A", "01/01/2026"]
+
+
+def test_resync_ignores_the_snapshot(tmp_path):
+    sheet = InMemoryWorksheet()
+    sync = make_sync(sheet, tmp_path)
+    sync.push(result("W.P.(C),1,2023"))
+    sync.flush()
+
+    edited = InMemoryWorksheet([HEADERS, ["W.P.(C),1,2023", "Edited", "01/01/2026"]])
+    fresh = make_sync(edited, tmp_path, resync=True)
+    fresh.push(result("W.P.(C),1,2023"))
+    fresh.flush()
+    assert edited.get_all_values()[1] == ["W.P.(C),1,2023", "A", "01/01/2026"]
@@ -0,0 +1,313 @@
+"""
+Long-lived pools of warm Chromium browsers for the scrapers.
+
+Launching Chromium costs more than most lookups, so browsers are started once
+and reused. Every lease gets a fresh, isolated browser context; the browser
+itself is recycled after BROWSER_MAX_USES leases or as soon as it stops
+responding.
+
+Playwright's sync API is bound to the thread that started it, so each slot of
+the sync pool owns a dedicated thread and runs leased work on it. This lets
+Flask's threaded workers and fetcher.py share the same pool. main.py uses the
+asyncio flavour, which keeps its browsers on the running event loop.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, Optional
+
+from utils import metrics
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+MAX_USES = int(os.getenv("BROWSER_MAX_USES", 50))
+LEASE_TIMEOUT = float(os.getenv("BROWSER_LEASE_TIMEOUT", 120))
+
+
+class PoolClosedError(RuntimeError):
+    """Raised when leasing from a pool that has been shut down."""
+
+
+class _BrowserSlot:
+    """One warm browser living on its own thread."""
+
+    def __init__(self, index: int, headless: bool, max_uses: int):
+        self.index = index
+        self.headless = headless
+        self.max_uses = max_uses
+        self.uses = 0
+        self.launches = 0
+        self._playwright = None
+        self._browser = None
+        self._tasks = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, name=f"browser-slot-{index}", daemon=True
+        )
+        self._thread.start()
+
+    # --- methods below only run on the slot thread ---
+    def _launch(self):
+        from playwright.sync_api import sync_playwright
+
+        with metrics.span("scraper", "browser_launch"):
+            if self._playwright is None:
+                self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=self.headless)
+        self.uses = 0
+        self.launches += 1
+        logging.info(f"Browser slot {self.index}: launched browser #{self.launches}")
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception as e:
+                logging.warning(f"Browser slot {self.index}: error closing browser: {e}")
+            self._browser = None
+
+    def _healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    def _ensure_browser(self):
+        if not self._healthy():
+            if self._browser is not None:
+                logging.warning(f"Browser slot {self.index}: browser unhealthy, recycling")
+            self._close_browser()
+            self._launch()
+        return self._browser
+
+    def _run_leased(self, fn: Callable, args, kwargs):
+        browser = self._ensure_browser()
+        with metrics.span("scraper", "new_context"):
+            context = browser.new_context()
+        try:
+            return fn(context, *args, **kwargs)
+        finally:
+            try:
+                context.close()
+            except Exception as e:
+                logging.warning(f"Browser slot {self.index}: error closing context: {e}")
+            self.uses += 1
+            if not self._healthy():
+                logging.warning(f"Browser slot {self.index}: browser crashed, recycling")
+                self._close_browser()
+            elif self.uses >= self.max_uses:
+                logging.info(f"Browser slot {self.index}: reached {self.uses} uses, recycling")
+                self._close_browser()
+
+    def _loop(self):
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+            fn, args, kwargs, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    # --- methods below are called from any thread ---
+    def _submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        self._tasks.put((fn, args, kwargs, future))
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Run fn(context, *args, **kwargs) in a fresh context of this browser."""
+        return self._submit(self._run_leased, fn, args, kwargs).result()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """
+        Run fn(browser, *args, **kwargs) on this slot's thread.
+        For work that keeps its own context open across calls (utils.form_session);
+        the browser is relaunched first if it died, but calls do not count as uses.
+        """
+        return self._submit(lambda: fn(self._ensure_browser(), *args, **kwargs)).result()
+
+    def warm(self) -> Future:
+        return self._submit(lambda: self._healthy() or self._launch())
+
+    def stop(self, timeout: Optional[float] = None):
+        self._tasks.put(None)
+        self._thread.join(timeout)
+
+
+class BrowserPool:
+    """
+    Fixed-size pool of warm browsers with lease/return semantics.
+
+    Usage:
+        with pool.lease() as slot:
+            slot.run(scrape, case_type, case_number, filing_year)
+
+    or simply pool.run(scrape, ...), which leases a slot for one call.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = MAX_USES,
+                 headless: bool = True, lease_timeout: float = LEASE_TIMEOUT):
+        self.size = max(1, size)
+        self.headless = headless
+        self.lease_timeout = lease_timeout
+        self._slots = [_BrowserSlot(i, headless, max_uses) for i in range(self.size)]
+        self._idle = queue.Queue()
+        for slot in self._slots:
+            self._idle.put(slot)
+        self._closed = False
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        if self._closed:
+            raise PoolClosedError("Browser pool is closed.")
+        try:
+            with metrics.span("scraper", "lease_wait"):
+                slot = self._idle.get(timeout=timeout or self.lease_timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a free browser.")
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(slot)
+
+    def run(self, fn: Callable, *args, **kwargs):
+        with self.lease() as slot:
+            return slot.run(fn, *args, **kwargs)
+
+    def warm(self):
+        """Launch every browser up front instead of on first lease."""
+        for future in [slot.warm() for slot in self._slots]:
+            future.result()
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "in_use": self._in_use,
+            "launches": sum(slot.launches for slot in self._slots),
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for slot in self._slots:
+            slot.stop(timeout=10)
+
+
+class AsyncBrowserPool:
+    """asyncio counterpart of BrowserPool, for use inside async_playwright()."""
+
+    def __init__(self, playwright, size: int = POOL_SIZE, max_uses: int = MAX_USES,
+                 headless: bool = True):
+        self.playwright = playwright
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.headless = headless
+        self.launches = 0
+        self._in_use = 0
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def _launch(self, slot: Dict):
+        with metrics.span("main", "browser_launch"):
+            slot["browser"] = await self.playwright.chromium.launch(headless=self.headless)
+        slot["uses"] = 0
+        self.launches += 1
+        logging.info(f"Async browser slot {slot['index']}: launched browser #{self.launches}")
+
+    async def _close_browser(self, slot: Dict):
+        browser = slot.get("browser")
+        slot["browser"] = None
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logging.warning(f"Async browser slot {slot['index']}: error closing browser: {e}")
+
+    async def start(self):
+        self._idle = asyncio.Queue()
+        for i in range(self.size):
+            self._idle.put_nowait({"index": i, "browser": None, "uses": 0})
+        return self
+
+    @asynccontextmanager
+    async def lease(self):
+        if self._idle is None:
+            await self.start()
+        with metrics.span("main", "lease_wait"):
+            slot = await self._idle.get()
+        self._in_use += 1
+        context = None
+        try:
+            browser = slot["browser"]
+            if browser is None or not browser.is_connected():
+                await self._close_browser(slot)
+                await self._launch(slot)
+            with metrics.span("main", "new_context"):
+                context = await slot["browser"].new_context()
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logging.warning(f"Async browser slot {slot['index']}: error closing context: {e}")
+            slot["uses"] += 1
+            browser = slot["browser"]
+            if browser is not None and (not browser.is_connected() or slot["uses"] >= self.max_uses):
+                await self._close_browser(slot)
+            self._in_use -= 1
+            self._idle.put_nowait(slot)
+
+    def stats(self) -> Dict:
+        return {"size": self.size, "in_use": self._in_use, "launches": self.launches}
+
+    async def close(self):
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            await self._close_browser(self._idle.get_nowait())
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+_pools: Dict[bool, BrowserPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_browser_pool(headless: bool = True) -> BrowserPool:
+    """Return the process-wide sync pool, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(headless)
+        if pool is None:
+            pool = _pools[headless] = BrowserPool(headless=headless)
+        return pool
+
+
+@atexit.register
+def close_browser_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,228 @@
+"""
+Two-tier cache for case lookups: an in-process LRU in front of a persistent
+SQLite store shared by the Flask app and the batch runners.
+
+Entries expire according to per-field TTLs (the shortest TTL among the fields
+present wins) and a hearing-aware rule that shortens the TTL as next_hearing
+approaches. Expired entries can still be served for CACHE_STALE_SECONDS while
+a background refresh runs (stale-while-revalidate).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+
+from utils.dates import parse_court_date
+
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "case_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 6 * 3600))
+CACHE_STALE_SECONDS = int(os.getenv("CACHE_STALE_SECONDS", 3600))
+CACHE_NEAR_HEARING_DAYS = int(os.getenv("CACHE_NEAR_HEARING_DAYS", 3))
+CACHE_NEAR_HEARING_TTL = int(os.getenv("CACHE_NEAR_HEARING_TTL", 1800))
+
+# Per-field TTLs in seconds; override with CACHE_TTL_<FIELD>, e.g. CACHE_TTL_NEXT_HEARING=3600.
+FIELD_TTLS = {
+    field: int(os.getenv(f"CACHE_TTL_{field.upper()}", default))
+    for field, default in {
+        "petitioner": 7 * 24 * 3600,
+        "respondent": 7 * 24 * 3600,
+        "filing_date": 30 * 24 * 3600,
+        "next_hearing": 12 * 3600,
+        "pdf_url": 6 * 3600,
+    }.items()
+}
+
+# Keys describing a particular run rather than the case itself.
+VOLATILE_KEYS = ("case_id", "status", "cache")
+
+CaseKey = Tuple[str, str, str]
+
+
+def normalize_case_key(case_type: str, case_number: str, filing_year: str) -> CaseKey:
+    """Canonical (case_type, case_number, filing_year) used for cache and dedup keys."""
+    number = str(case_number).strip().lstrip("0") or "0"
+    return (" ".join(str(case_type).split()).upper(), number, str(filing_year).strip())
+
+
+def parse_case_id(case_id: str) -> Optional[CaseKey]:
+    """Split a "<CaseType>,<CaseNumber>,<FilingYear>" id as used by main.py."""
+    parts = [x.strip() for x in case_id.split(",")]
+    if len(parts) != 3:
+        return None
+    return normalize_case_key(*parts)
+
+
+def is_cacheable(details) -> bool:
+    return bool(details) and details.get("petitioner") not in ("Error", "Timeout", None)
+
+
+def ttl_for(details: Dict, today: Optional[date] = None) -> int:
+    """TTL in seconds for a details dict."""
+    ttls = [ttl for field, ttl in FIELD_TTLS.items() if details.get(field) not in (None, "")]
+    ttl = min(ttls) if ttls else CACHE_DEFAULT_TTL
+    hearing = parse_court_date(details.get("next_hearing"))
+    if hearing is not None:
+        days_left = (hearing - (today or date.today())).days
+        # A hearing that is close or already past will soon change the record.
+        if days_left <= CACHE_NEAR_HEARING_DAYS:
+            ttl = min(ttl, CACHE_NEAR_HEARING_TTL)
+    return ttl
+
+
+class CaseCache:
+    """Thread-safe LRU + SQLite cache of case details."""
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 stale_seconds: int = CACHE_STALE_SECONDS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self._lru: "OrderedDict[CaseKey, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "stale_hits": 0,
+                         "misses": 0, "bypasses": 0, "refreshes": 0, "refresh_errors": 0}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS case_cache (
+                case_type TEXT,
+                case_number TEXT,
+                filing_year TEXT,
+                details TEXT,
+                fetched_at REAL,
+                expires_at REAL,
+                PRIMARY KEY (case_type, case_number, filing_year)
+            )
+        """)
+        self._conn.commit()
+
+    def _count(self, *names: str):
+        for name in names:
+            self.counters[name] += 1
+
+    def _remember(self, key: CaseKey, details: Dict, expires_at: float):
+        self._lru[key] = (details, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def lookup(self, key: CaseKey, allow_stale: bool = True) -> Tuple[Optional[Dict], str]:
+        """
+        Return (details, state) where state is "hit", "stale" or "miss".
+        Stale entries are only returned when allow_stale is True.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            tier = "memory_hits"
+            if entry is not None:
+                self._lru.move_to_end(key)
+            else:
+                row = self._conn.execute(
+                    "SELECT details, expires_at FROM case_cache "
+                    "WHERE case_type = ? AND case_number = ? AND filing_year = ?", key
+                ).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, *entry)
+                    tier = "disk_hits"
+            if entry is not None:
+                details, expires_at = entry
+                if now < expires_at:
+                    self._count("hits", tier)
+                    return dict(details), "hit"
+                if allow_stale and now < expires_at + self.stale_seconds:
+                    self._count("stale_hits", tier)
+                    return dict(details), "stale"
+            self._count("misses")
+            return None, "miss"
+
+    def store(self, key: CaseKey, details: Dict):
+        if not is_cacheable(details):
+            return
+        details = {k: v for k, v in details.items() if k not in VOLATILE_KEYS}
+        now = time.time()
+        expires_at = now + ttl_for(details)
+        with self._lock:
+            self._remember(key, details, expires_at)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO case_cache "
+                "(case_type, case_number, filing_year, details, fetched_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(details, ensure_ascii=False), now, expires_at),
+            )
+            self._conn.commit()
+
+    def invalidate(self, key: CaseKey):
+        with self._lock:
+            self._lru.pop(key, None)
+            self._conn.execute(
+                "DELETE FROM case_cache WHERE case_type = ? AND case_number = ? AND filing_year = ?", key
+            )
+            self._conn.commit()
+
+    def _revalidate(self, key: CaseKey, fetch: Callable[[], Dict]):
+        try:
+            self.store(key, fetch())
+            self._count("refreshes")
+        except Exception as e:
+            self._count("refresh_errors")
+            logging.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(self, key: CaseKey, fetch: Callable[[], Dict], force_refresh: bool = False,
+                     allow_stale: bool = True) -> Tuple[Dict, str]:
+        """
+        Return (details, state) for key, calling fetch() on a miss.
+        state is "hit", "stale" (refresh started in the background), "miss" or "bypass".
+        """
+        if force_refresh:
+            self._count("bypasses")
+            details = fetch()
+            self.store(key, details)
+            return details, "bypass"
+        details, state = self.lookup(key, allow_stale)
+        if state == "hit":
+            return details, state
+        if state == "stale":
+            with self._lock:
+                start = key not in self._refreshing
+                self._refreshing.add(key)
+            if start:
+                threading.Thread(target=self._revalidate, args=(key, fetch), daemon=True).start()
+            return details, state
+        details = fetch()
+        self.store(key, details)
+        return details, "miss"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._lru)
+            stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM case_cache").fetchone()[0]
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[CaseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_case_cache() -> CaseCache:
+    """Return the process-wide cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CaseCache()
+        return _cache
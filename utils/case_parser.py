@@ -0,0 +1,187 @@
+"""
+Offline parser for the frmCaseStatus results page.
+
+Extracts every field from the HTML already fetched with frame.content(), so a
+lookup needs one browser round trip instead of one per field. Being a pure
+function it can also re-parse raw_response rows stored in the search log:
+
+    python -m utils.case_parser search_logs.db
+"""
+
+import json
+import re
+import sys
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+# Field -> labels that may appear in the cell before its value, in order of preference.
+LABELS = {
+    "petitioner": ("Petitioner",),
+    "respondent": ("Respondent",),
+    "filing_date": ("Filing Date", "Date of Filing"),
+    "next_hearing": ("Next Date", "Next Hearing"),
+}
+
+_WS_RE = re.compile(r"[ \t\r\f\v\xa0]+")
+_SERIAL_RE = re.compile(r"^\d+\.?$")
+_MAX_LABEL_LENGTH = 60
+
+
+def _clean(parts: List[str]) -> str:
+    lines = (_WS_RE.sub(" ", line).strip() for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+class _TableParser(HTMLParser):
+    """Collects table rows (as lists of cell texts) and links in one pass."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[List[str]] = []
+        self.links: List[Dict[str, str]] = []
+        # One frame per open <table>: the open row and the open cell's text buffer.
+        self._tables: List[Dict] = [{"row": None, "cell": None}]
+        self._link: Optional[Dict] = None
+
+    def _close_cell(self, table: Dict):
+        if table["cell"] is not None:
+            if table["row"] is None:
+                table["row"] = []
+            table["row"].append(_clean(table["cell"]))
+            table["cell"] = None
+
+    def _close_row(self, table: Dict):
+        self._close_cell(table)
+        if table["row"]:
+            self.rows.append(table["row"])
+        table["row"] = None
+
+    def handle_starttag(self, tag, attrs):
+        table = self._tables[-1]
+        if tag == "table":
+            self._tables.append({"row": None, "cell": None})
+        elif tag == "tr":
+            self._close_row(table)
+            table["row"] = []
+        elif tag in ("td", "th"):
+            # Browsers close an open cell implicitly when the next one starts.
+            self._close_cell(table)
+            table["cell"] = []
+        elif tag in ("br", "p", "div", "li"):
+            self.handle_data("\n")
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            self._link = {"href": href, "text": []} if href else None
+
+    def handle_endtag(self, tag):
+        table = self._tables[-1]
+        if tag == "table" and len(self._tables) > 1:
+            self._close_row(table)
+            self._tables.pop()
+        elif tag == "tr":
+            self._close_row(table)
+        elif tag in ("td", "th"):
+            self._close_cell(table)
+        elif tag == "a" and self._link is not None:
+            self.links.append({"href": self._link["href"], "text": _clean(self._link["text"])})
+            self._link = None
+
+    def handle_data(self, data):
+        cell = self._tables[-1]["cell"]
+        if cell is not None:
+            cell.append(data)
+        if self._link is not None:
+            self._link["text"].append(data)
+
+    def close(self):
+        super().close()
+        while len(self._tables) > 1:
+            self._close_row(self._tables.pop())
+        self._close_row(self._tables[0])
+
+
+def _is_pdf(href: str) -> bool:
+    return urlsplit(href).path.lower().endswith(".pdf")
+
+
+def _find_value(rows: List[List[str]], labels) -> Optional[str]:
+    """Value in the cell after the first cell matching a label; exact matches win."""
+    for exact in (True, False):
+        for label in labels:
+            wanted = label.lower()
+            for row in rows:
+                for cell, value in zip(row, row[1:]):
+                    text = cell.rstrip(":- ").lower()
+                    if (text == wanted) if exact else (wanted in text and len(text) <= _MAX_LABEL_LENGTH):
+                        return value
+    return None
+
+
+def parse_case_html(html: str, base_url: Optional[str] = None, missing: Optional[str] = "Not found") -> Dict:
+    """
+    Parse the results iframe HTML into a details dict.
+
+    Args:
+        html (str): HTML of the frmCaseStatus frame.
+        base_url (str): URL of the frame, used to make links absolute.
+        missing: Value used for fields that are not on the page.
+
+    Returns:
+        dict: petitioner, respondent, filing_date, next_hearing, pdf_url (first PDF link or None),
+        orders (list of {"name", "url"} for every PDF link) and extra (any other label/value rows).
+    """
+    parser = _TableParser()
+    parser.feed(html or "")
+    parser.close()
+
+    details = {}
+    for field, labels in LABELS.items():
+        value = _find_value(parser.rows, labels)
+        details[field] = value if value is not None else missing
+
+    orders = []
+    seen = set()
+    for link in parser.links:
+        href = link["href"].strip()
+        if not _is_pdf(href):
+            continue
+        url = urljoin(base_url, href) if base_url else href
+        if url in seen:
+            continue
+        seen.add(url)
+        orders.append({"name": link["text"] or url.rsplit("/", 1)[-1], "url": url})
+    details["pdf_url"] = orders[0]["url"] if orders else None
+    details["orders"] = orders
+
+    known = {label.lower() for labels in LABELS.values() for label in labels}
+    extra = {}
+    for row in parser.rows:
+        label = row[0].rstrip(":- ")
+        if len(row) < 2 or not label or len(label) > _MAX_LABEL_LENGTH or label.lower() in known:
+            continue
+        # Serial-numbered rows are list entries (e.g. orders), not label/value pairs.
+        value = " | ".join(cell for cell in row[1:] if cell)
+        if value and not _SERIAL_RE.match(label):
+            extra.setdefault(label, value)
+    details["extra"] = extra
+    return details
+
+
+def reparse_search_log(db_path: str) -> Iterator[Dict]:
+    """Yield re-parsed details for every stored page in the search log."""
+    from utils.search_log import iter_searches
+
+    for search in iter_searches(db_path):
+        raw_response = search.pop("raw_response")
+        search.pop("page_hash")
+        if raw_response:
+            yield {**search, **parse_case_html(raw_response)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.case_parser search_logs.db")
+        sys.exit(1)
+    for details in reparse_search_log(sys.argv[1]):
+        print(json.dumps(details, ensure_ascii=False))
@@ -0,0 +1,29 @@
+"""
+Parsing helpers for the date strings shown on the court site.
+"""
+
+import re
+from datetime import date, datetime
+from typing import Optional
+
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%d %b %Y", "%d %B %Y", "%d-%b-%Y")
+_DATE_RE = re.compile(r"\d{1,2}[/.-]\d{1,2}[/.-]\d{4}|\d{4}-\d{2}-\d{2}|\d{1,2}[ -][A-Za-z]{3,9}[ -]\d{4}")
+
+
+def parse_court_date(value: Optional[str]) -> Optional[date]:
+    """
+    Extract the first date from a field such as "12/08/2025 (Court No. 3)".
+    Returns None for empty, "Not found", "Error" and unparseable values.
+    """
+    if not value:
+        return None
+    match = _DATE_RE.search(value)
+    if not match:
+        return None
+    text = match.group(0)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,327 @@
+"""
+Concurrent, content-addressed downloads of order and judgment PDFs.
+
+Links are collected from lookup results (the "orders" list, or "pdf_url" for
+results without one). Each distinct URL is then fetched once by a pool of
+DOWNLOAD_CONCURRENCY threads, with at most DOWNLOAD_PER_HOST requests in
+flight per host, over pooled keep-alive connections (utils.http_client).
+
+Bodies are streamed in DOWNLOAD_CHUNK_BYTES chunks into a .part file and
+hashed on the way. An interrupted download resumes from the bytes already on
+disk with a Range request, guarded by If-Range so a changed document is
+fetched again from the start. A finished file is stored as
+<DOWNLOAD_DIR>/<sha256[:2]>/<sha256>.pdf. The same order linked from several
+cases or URLs is therefore kept once.
+
+The SQLite index (DOWNLOAD_DB_PATH) maps case tuples to URLs
+(case_documents), URLs to their content hash and download state (downloads),
+and hashes to stored files (documents). Run it on batch outputs with:
+    python -m utils.downloader output.jsonl data/output.json
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from utils.cache import CaseKey, normalize_case_key, parse_case_id
+from utils.http_client import HTTP_TIMEOUT, MAX_REDIRECTS, USER_AGENT, ConnectionPool
+from utils.search_log import connect
+from utils.throttle import backoff_delay
+
+DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "documents")
+DOWNLOAD_DB_PATH = os.getenv("DOWNLOAD_DB_PATH", "documents.db")
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", 8))
+DOWNLOAD_PER_HOST = int(os.getenv("DOWNLOAD_PER_HOST", 2))
+DOWNLOAD_MAX_ATTEMPTS = int(os.getenv("DOWNLOAD_MAX_ATTEMPTS", 4))
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", 64 * 1024))
+DOWNLOAD_BACKOFF_BASE_SECONDS = float(os.getenv("DOWNLOAD_BACKOFF_BASE_SECONDS", 1))
+DOWNLOAD_BACKOFF_MAX_SECONDS = float(os.getenv("DOWNLOAD_BACKOFF_MAX_SECONDS", 30))
+
+
+class DownloadError(Exception):
+    """The server did not return the document (bad status, HTML error page, short body)."""
+
+
+def document_links(result: Dict) -> Tuple[Optional[CaseKey], List[Tuple[str, str]]]:
+    """(case key, [(name, url), ...]) for the PDF links in one lookup result."""
+    if all(result.get(field) for field in ("case_type", "case_number", "filing_year")):
+        key = normalize_case_key(result["case_type"], result["case_number"], result["filing_year"])
+    else:
+        key = parse_case_id(result.get("case_id") or "")
+    orders = result.get("orders") or [{"name": "", "url": result.get("pdf_url")}]
+    links = []
+    for order in orders:
+        url = order.get("url") or ""
+        if url.startswith(("http://", "https://")) and url not in (u for _, u in links):
+            links.append((order.get("name") or url.rsplit("/", 1)[-1], url))
+    return key, links
+
+
+def read_results(path: str) -> Iterable[Dict]:
+    """Results from a JSON Lines file (fetcher.py) or a JSON list (main.py)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if f.read(1) == "[":
+            f.seek(0)
+            yield from json.load(f)
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Downloader:
+    """Document index plus the bounded download pool that fills it."""
+
+    def __init__(self, root: str = DOWNLOAD_DIR, db_path: str = DOWNLOAD_DB_PATH,
+                 concurrency: int = DOWNLOAD_CONCURRENCY, per_host: int = DOWNLOAD_PER_HOST,
+                 max_attempts: int = DOWNLOAD_MAX_ATTEMPTS, pool: Optional[ConnectionPool] = None):
+        self.root = Path(root)
+        self.partial_dir = self.root / ".partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.max_attempts = max(1, max_attempts)
+        self.pool = pool or ConnectionPool(max_idle_per_host=self.per_host, timeout=HTTP_TIMEOUT)
+        self._conn = connect(db_path)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self.counters = {"downloaded": 0, "deduplicated": 0, "resumed": 0, "retries": 0, "failed": 0,
+                         "bytes": 0}
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER,
+                    content_type TEXT,
+                    path TEXT,
+                    created DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    url TEXT PRIMARY KEY,
+                    status TEXT DEFAULT 'pending',
+                    sha256 TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT,
+                    updated DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS case_documents (
+                    case_type TEXT,
+                    case_number TEXT,
+                    filing_year TEXT,
+                    url TEXT,
+                    name TEXT,
+                    PRIMARY KEY (case_type, case_number, filing_year, url)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (status)")
+
+    # --- index --------------------------------------------------------------
+    def add(self, results: Iterable[Dict]) -> int:
+        """Record the document links of lookup results; returns how many links were seen."""
+        seen = 0
+        with self._lock, self._conn:
+            for result in results:
+                key, links = document_links(result)
+                for name, url in links:
+                    seen += 1
+                    self._conn.execute("INSERT OR IGNORE INTO downloads (url) VALUES (?)", (url,))
+                    if key:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO case_documents (case_type, case_number, filing_year, url, name) "
+                            "VALUES (?, ?, ?, ?, ?)", (*key, url, name),
+                        )
+        return seen
+
+    def pending(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM downloads WHERE status != 'done' ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def documents_for(self, case_type: str, case_number: str, filing_year: str) -> List[Dict]:
+        """Every document linked from a case, with the stored file once it is downloaded."""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT c.name, c.url, d.status, d.sha256, doc.path, doc.size FROM case_documents c
+                JOIN downloads d ON d.url = c.url LEFT JOIN documents doc ON doc.sha256 = d.sha256
+                WHERE c.case_type = ? AND c.case_number = ? AND c.filing_year = ? ORDER BY c.rowid
+            """, normalize_case_key(case_type, case_number, filing_year)).fetchall()
+        return [{"name": name, "url": url, "status": status, "sha256": sha, "path": path, "size": size}
+                for name, url, status, sha, path, size in rows]
+
+    def _update(self, url: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE downloads SET {assignments}, updated = CURRENT_TIMESTAMP WHERE url = ?",
+                               (*fields.values(), url))
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    # --- downloading --------------------------------------------------------
+    def run(self, results: Optional[Iterable[Dict]] = None) -> Dict:
+        """Add the links of `results` (if given) and download every document not stored yet."""
+        if results is not None:
+            self.add(results)
+        urls = self.pending()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="download") as executor:
+            list(executor.map(self._download_with_retries, urls))
+        stats = self.stats()
+        logging.info(f"Downloaded {len(urls)} documents in {time.monotonic() - started:.1f}s: {stats}")
+        return stats
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def _download_with_retries(self, url: str):
+        for attempt in range(self.max_attempts):
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE downloads SET attempts = attempts + 1 WHERE url = ?", (url,))
+            try:
+                with self._host_slot(url):
+                    sha = self._download(url)
+                self._update(url, status="done", sha256=sha, error=None)
+                return
+            except Exception as e:
+                logging.warning(f"Download of {url} failed (attempt {attempt + 1}): {e}")
+                self._update(url, status="failed", error=str(e)[:500])
+                if attempt + 1 < self.max_attempts:
+                    self._count("retries")
+                    time.sleep(backoff_delay(attempt, DOWNLOAD_BACKOFF_BASE_SECONDS, DOWNLOAD_BACKOFF_MAX_SECONDS))
+        self._count("failed")
+
+    def _download(self, url: str) -> str:
+        """Stream one document into its .part file and store it; returns its SHA-256."""
+        part = self.partial_dir / (hashlib.sha1(url.encode()).hexdigest() + ".part")
+        with self._lock:
+            etag, last_modified = self._conn.execute(
+                "SELECT etag, last_modified FROM downloads WHERE url = ?", (url,)
+            ).fetchone()
+        offset = part.stat().st_size if part.exists() else 0
+        target = url
+        for _ in range(MAX_REDIRECTS + 1):
+            headers = {"User-Agent": USER_AGENT, "Accept": "application/pdf,*/*", "Accept-Encoding": "identity",
+                       "Connection": "keep-alive"}
+            validator = etag or last_modified
+            if offset and validator:
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+            with self.pool.stream("GET", target, headers) as response:
+                if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                    response.read()
+                    target = urljoin(target, response.getheader("Location"))
+                    continue
+                if response.status == 416 and offset:
+                    # The .part file already holds the whole body.
+                    response.read()
+                    return self._store(part, response.getheader("Content-Type") or "application/pdf")
+                if response.status not in (200, 206):
+                    response.read()
+                    raise DownloadError(f"HTTP {response.status}")
+                content_type = response.getheader("Content-Type") or ""
+                if "html" in content_type:
+                    response.read()
+                    raise DownloadError(f"got {content_type} instead of a document")
+                etag, last_modified = response.getheader("ETag"), response.getheader("Last-Modified")
+                self._update(url, etag=etag, last_modified=last_modified)
+                if response.status == 206 and (response.getheader("Content-Range") or "").startswith(
+                        f"bytes {offset}-"):
+                    self._count("resumed")
+                    mode = "ab"
+                else:
+                    offset, mode = 0, "wb"
+                expected = response.length
+                received = 0
+                with open(part, mode) as f:
+                    while True:
+                        chunk = response.read(DOWNLOAD_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        received += len(chunk)
+                        self._count("bytes", len(chunk))
+                if expected is not None and received < expected:
+                    # The connection dropped; the .part file is kept and the next attempt resumes it.
+                    raise DownloadError(f"connection closed after {received} of {expected} bytes")
+            return self._store(part, content_type)
+        raise DownloadError("too many redirects")
+
+    def _store(self, part: Path, content_type: str) -> str:
+        digest = hashlib.sha256()
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        size = part.stat().st_size
+        if size == 0:
+            part.unlink()
+            raise DownloadError("empty body")
+        dest = self.root / sha[:2] / f"{sha}.pdf"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self._conn:
+            known = self._conn.execute("SELECT 1 FROM documents WHERE sha256 = ?", (sha,)).fetchone()
+            if known and dest.exists():
+                part.unlink()
+                self.counters["deduplicated"] += 1
+            else:
+                os.replace(part, dest)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (sha256, size, content_type, path) VALUES (?, ?, ?, ?)",
+                    (sha, size, content_type.split(";")[0].strip() or "application/pdf", str(dest)),
+                )
+                self.counters["downloaded"] += 1
+        return sha
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM downloads GROUP BY status").fetchall())
+            documents, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents").fetchone()
+            counters = dict(self.counters)
+        return {**counters, "links_done": counts.get("done", 0), "links_failed": counts.get("failed", 0),
+                "links_pending": counts.get("pending", 0), "documents": documents, "stored_bytes": size,
+                "connections": dict(self.pool.counters)}
+
+    def close(self):
+        self.pool.close()
+        with self._lock:
+            self._conn.close()
+
+
+def download_documents(results: Iterable[Dict]) -> Dict:
+    """Download the documents linked from `results` into the default store; returns the stats."""
+    downloader = Downloader()
+    try:
+        return downloader.run(results)
+    finally:
+        downloader.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.downloader output.jsonl [data/output.json ...]")
+        sys.exit(1)
+    downloader = Downloader()
+    for path in sys.argv[1:]:
+        print(f"{path}: {downloader.add(read_results(path))} document links")
+    print(json.dumps(downloader.run(), indent=2))
+    downloader.close()
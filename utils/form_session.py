@@ -0,0 +1,306 @@
+"""
+Warm form sessions: many lookups through one loaded search page.
+
+A normal lookup opens a context, navigates to the search page and waits for
+the form before it can submit anything. A session loads the page once. Each
+later case is filled into the same form, and its result is read from the
+frmCaseStatus iframe after the iframe navigates. The page is reloaded only
+in these cases:
+    expired    FORM_SESSION_MAX_LOOKUPS submissions or FORM_SESSION_MAX_AGE
+               seconds on the same page
+    structure  the form fields or the results iframe are gone
+    navigated  a submission replaced the whole page instead of the iframe
+    error      the previous submission failed (a fresh context is opened too)
+
+A submission that fails on a page that was already in use is retried once
+after a reload, so an expired server session costs one extra navigation.
+
+FormSession is bound to one slot of the sync BrowserPool (scraper.form_session);
+AsyncFormSession holds a lease on an AsyncBrowserPool (main.py).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from utils import metrics, network
+from utils.case_parser import parse_case_html
+from utils.pacing import get_pacer
+
+FORM_SESSION_MAX_LOOKUPS = int(os.getenv("FORM_SESSION_MAX_LOOKUPS", 200))
+FORM_SESSION_MAX_AGE = float(os.getenv("FORM_SESSION_MAX_AGE", 600))
+RESULTS_FRAME = "frmCaseStatus"
+TIMEOUT_MS = 20000
+
+# Every control a submission touches; waited for one by one after a page load.
+FORM_SELECTORS = ("select[name='CaseType']", "input[name='CaseNo']", "input[name='CaseYear']",
+                  "input[type='submit']")
+# One round trip to confirm the page still has everything a submission needs.
+FORM_CHECK_JS = """() => [
+    "select[name='CaseType']", "input[name='CaseNo']", "input[name='CaseYear']",
+    "input[type='submit']", "iframe[name='frmCaseStatus']"
+].every((selector) => document.querySelector(selector) !== null)"""
+
+
+class _SessionState:
+    """Reload bookkeeping shared by the sync and async sessions."""
+
+    def __init__(self, url: str, metrics_label: str, max_lookups: int, max_age: float):
+        self.url = url
+        self.metrics_label = metrics_label
+        self.max_lookups = max_lookups
+        self.max_age = max_age
+        self.loaded_at = 0.0
+        self.on_page = 0
+        self.broken = False
+        self.navigated = False
+        self.net = None
+        self.counters = {"lookups": 0, "loads": 0, "retries": 0}
+
+    def stale_reason(self, has_page: bool) -> Optional[str]:
+        if not has_page:
+            return "initial"
+        if self.broken:
+            return "error"
+        if self.navigated:
+            return "navigated"
+        if self.on_page >= self.max_lookups or time.monotonic() - self.loaded_at >= self.max_age:
+            return "expired"
+        return None
+
+    def loaded(self, reason: str):
+        self.counters["loads"] += 1
+        if reason != "initial":
+            key = f"reload_{reason}"
+            self.counters[key] = self.counters.get(key, 0) + 1
+        logging.info(f"Form session: loaded search page ({reason})")
+        self.loaded_at = time.monotonic()
+        self.on_page = 0
+        self.broken = self.navigated = False
+
+    def finish_network(self):
+        if self.net is not None:
+            logging.info(f"Network for form session page: {network.finish(self.net)}")
+            self.net = None
+
+    def stats(self) -> Dict:
+        return {**self.counters, "lookups_per_load": round(self.counters["lookups"] / max(1, self.counters["loads"]), 1)}
+
+
+def _is_results_navigation(page):
+    return lambda frame: frame.name == RESULTS_FRAME or frame == page.main_frame
+
+
+class FormSession:
+    """Warm search page on one BrowserPool slot; lookup() may be called from any thread."""
+
+    def __init__(self, slot, url: str, metrics_label: str = "scraper",
+                 max_lookups: int = FORM_SESSION_MAX_LOOKUPS, max_age: float = FORM_SESSION_MAX_AGE):
+        self.slot = slot
+        self.state = _SessionState(url, metrics_label, max_lookups, max_age)
+        self.context = None
+        self.page = None
+
+    def lookup(self, case_type: str, case_number: str, filing_year: str) -> Tuple[Dict, str]:
+        """Submit one case and return (details, html of the results frame)."""
+        return self.slot.call(self._lookup, case_type, case_number, filing_year)
+
+    def close(self):
+        self.slot.call(lambda browser: self._close_context())
+
+    def stats(self) -> Dict:
+        return self.state.stats()
+
+    # --- methods below run on the slot thread ---
+    def _close_context(self):
+        self.state.finish_network()
+        if self.context is not None:
+            try:
+                self.context.close()
+            except Exception as e:
+                logging.warning(f"Form session: error closing context: {e}")
+        self.context = self.page = None
+
+    def _load(self, browser, reason: str):
+        label = self.state.metrics_label
+        with metrics.span(label, "session_load"):
+            if reason == "error" or self.context is None:
+                self._close_context()
+                self.context = browser.new_context()
+            elif self.page is not None:
+                self.state.finish_network()
+                self.page.close()
+            self.page = self.context.new_page()
+            self.state.net = network.install(self.page, self.state.url)
+            started = time.monotonic()
+            response = self.page.goto(self.state.url, wait_until="domcontentloaded")
+            get_pacer().observe(time.monotonic() - started, response is None or response.ok)
+            for selector in FORM_SELECTORS:
+                self.page.wait_for_selector(selector, timeout=TIMEOUT_MS)
+        self.state.loaded(reason)
+
+    def _lookup(self, browser, case_type: str, case_number: str, filing_year: str):
+        reason = self.state.stale_reason(self.page is not None)
+        if reason is None and not self.page.evaluate(FORM_CHECK_JS):
+            reason = "structure"
+        if reason:
+            self._load(browser, reason)
+        try:
+            return self._submit(case_type, case_number, filing_year)
+        except Exception as e:
+            self.state.broken = True
+            if self.state.on_page == 0:
+                raise
+            # A page that served earlier lookups may have outlived its server session.
+            logging.warning(f"Form session: lookup failed on a warm page, reloading once: {e}")
+            self.state.counters["retries"] += 1
+            self._load(browser, "error")
+            try:
+                return self._submit(case_type, case_number, filing_year)
+            except Exception:
+                self.state.broken = True
+                raise
+
+    def _submit(self, case_type: str, case_number: str, filing_year: str):
+        page, label, pacer = self.page, self.state.metrics_label, get_pacer()
+        with metrics.span(label, "fill"):
+            page.select_option("select[name='CaseType']", label=case_type, timeout=TIMEOUT_MS)
+            page.fill("input[name='CaseNo']", case_number)
+            page.fill("input[name='CaseYear']", filing_year)
+        seconds = pacer.pause("before_submit")
+        if seconds > 0:
+            with metrics.span(label, "pacing"):
+                page.wait_for_timeout(seconds * 1000)
+        with metrics.span(label, "submit"):
+            started = time.monotonic()
+            with page.expect_event("framenavigated", predicate=_is_results_navigation(page),
+                                   timeout=TIMEOUT_MS) as navigation, \
+                    page.expect_response(lambda r: r.request.is_navigation_request(),
+                                         timeout=TIMEOUT_MS) as response_info:
+                page.click("input[type='submit']")
+            response = response_info.value
+            frame = navigation.value
+            pacer.observe(time.monotonic() - started, response.ok)
+        with metrics.span(label, "iframe_wait"):
+            if frame == page.main_frame:
+                # The whole page navigated; read this result, reload before the next one.
+                self.state.navigated = True
+                page.wait_for_selector(f"iframe[name='{RESULTS_FRAME}']", timeout=TIMEOUT_MS)
+                frame = page.frame(name=RESULTS_FRAME)
+                if not frame:
+                    raise Exception("Results iframe not found.")
+            frame.wait_for_load_state("domcontentloaded", timeout=TIMEOUT_MS)
+            frame.wait_for_selector("table", timeout=TIMEOUT_MS)
+        with metrics.span(label, "extract"):
+            html = frame.content()
+            details = parse_case_html(html, base_url=frame.url)
+        self.state.on_page += 1
+        self.state.counters["lookups"] += 1
+        return details, html
+
+
+class AsyncFormSession:
+    """asyncio counterpart of FormSession; leases a browser from an AsyncBrowserPool while open."""
+
+    def __init__(self, pool, url: str, metrics_label: str = "main",
+                 max_lookups: int = FORM_SESSION_MAX_LOOKUPS, max_age: float = FORM_SESSION_MAX_AGE):
+        self.pool = pool
+        self.state = _SessionState(url, metrics_label, max_lookups, max_age)
+        self._lease = None
+        self.context = None
+        self.page = None
+        self._lock = asyncio.Lock()
+
+    async def lookup(self, case_type: str, case_number: str, filing_year: str, missing: str = "Not found"):
+        """Submit one case and return (details, html of the results frame)."""
+        async with self._lock:
+            reason = self.state.stale_reason(self.page is not None)
+            if reason is None and not await self.page.evaluate(FORM_CHECK_JS):
+                reason = "structure"
+            if reason:
+                await self._load(reason)
+            try:
+                return await self._submit(case_type, case_number, filing_year, missing)
+            except Exception as e:
+                self.state.broken = True
+                if self.state.on_page == 0:
+                    raise
+                logging.warning(f"Form session: lookup failed on a warm page, reloading once: {e}")
+                self.state.counters["retries"] += 1
+                await self._load("error")
+                try:
+                    return await self._submit(case_type, case_number, filing_year, missing)
+                except Exception:
+                    self.state.broken = True
+                    raise
+
+    async def close(self):
+        self.state.finish_network()
+        if self._lease is not None:
+            lease, self._lease = self._lease, None
+            try:
+                await lease.__aexit__(None, None, None)
+            except Exception as e:
+                logging.warning(f"Form session: error returning browser: {e}")
+        self.context = self.page = None
+
+    def stats(self) -> Dict:
+        return self.state.stats()
+
+    async def _load(self, reason: str):
+        label = self.state.metrics_label
+        with metrics.span(label, "session_load"):
+            if reason == "error" or self.context is None:
+                # Returning the lease closes the context and recycles the browser if it died.
+                await self.close()
+                self._lease = self.pool.lease()
+                self.context = await self._lease.__aenter__()
+            elif self.page is not None:
+                self.state.finish_network()
+                await self.page.close()
+            self.page = await self.context.new_page()
+            self.state.net = await network.install_async(self.page, self.state.url)
+            started = time.monotonic()
+            response = await self.page.goto(self.state.url, wait_until="domcontentloaded")
+            get_pacer().observe(time.monotonic() - started, response is None or response.ok)
+            for selector in FORM_SELECTORS:
+                await self.page.wait_for_selector(selector, timeout=TIMEOUT_MS)
+        self.state.loaded(reason)
+
+    async def _submit(self, case_type: str, case_number: str, filing_year: str, missing: str):
+        page, label, pacer = self.page, self.state.metrics_label, get_pacer()
+        with metrics.span(label, "fill"):
+            await page.select_option("select[name='CaseType']", label=case_type, timeout=TIMEOUT_MS)
+            await page.fill("input[name='CaseNo']", case_number)
+            await page.fill("input[name='CaseYear']", filing_year)
+        seconds = pacer.pause("before_submit")
+        if seconds > 0:
+            with metrics.span(label, "pacing"):
+                await asyncio.sleep(seconds)
+        with metrics.span(label, "submit"):
+            started = time.monotonic()
+            async with page.expect_event("framenavigated", predicate=_is_results_navigation(page),
+                                         timeout=TIMEOUT_MS) as navigation, \
+                    page.expect_response(lambda r: r.request.is_navigation_request(),
+                                         timeout=TIMEOUT_MS) as response_info:
+                await page.click("input[type='submit']")
+            response = await response_info.value
+            frame = await navigation.value
+            pacer.observe(time.monotonic() - started, response.ok)
+        with metrics.span(label, "iframe_wait"):
+            if frame == page.main_frame:
+                self.state.navigated = True
+                await page.wait_for_selector(f"iframe[name='{RESULTS_FRAME}']", timeout=TIMEOUT_MS)
+                frame = page.frame(name=RESULTS_FRAME)
+                if not frame:
+                    raise Exception("Results iframe not found.")
+            await frame.wait_for_load_state("domcontentloaded", timeout=TIMEOUT_MS)
+            await frame.wait_for_selector("table", timeout=TIMEOUT_MS)
+        with metrics.span(label, "extract"):
+            html = await frame.content()
+            details = parse_case_html(html, base_url=frame.url, missing=missing)
+        self.state.on_page += 1
+        self.state.counters["lookups"] += 1
+        return details, html
@@ -1,34 +1,338 @@
 import os
-import gspread
-from dotenv import load_dotenv
-from typing import List, Dict
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
 
-load_dotenv()
+from utils.throttle import backoff_delay
+
+# gspread is imported when a client is first needed, so SheetSync can run on an
+# InMemoryWorksheet without it; .env support is optional for the same reason.
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
 
 SHEET_NAME = os.getenv("GOOGLE_SHEET_NAME", "CourtData")
 CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+SNAPSHOT_FILE = os.getenv("SHEET_SNAPSHOT_FILE", "sheet_snapshot.json")
+SHEET_RESYNC = os.getenv("SHEET_RESYNC", "").lower() in ("1", "true", "yes")
+# Rows buffered before a streaming flush, and cells per batch_update request.
+SHEET_FLUSH_ROWS = int(os.getenv("SHEET_FLUSH_ROWS", 50))
+SHEET_MAX_CELLS_PER_BATCH = int(os.getenv("SHEET_MAX_CELLS_PER_BATCH", 5000))
+SHEET_MAX_RETRIES = int(os.getenv("SHEET_MAX_RETRIES", 6))
+# Sheets allows 60 write requests per minute per user.
+SHEET_MIN_WRITE_INTERVAL = float(os.getenv("SHEET_MIN_WRITE_INTERVAL", 1.1))
+KEY_COLUMN = "case_id"
+RETRY_STATUSES = (429, 500, 502, 503)
+
+_client = None
+_worksheets: Dict[str, object] = {}
+_client_lock = threading.Lock()
 
 
 def get_gsheet_client():
-    """Authenticate and return a gspread client."""
-    return gspread.service_account(filename=CREDENTIALS_FILE)
+    """Authenticate once and return the cached gspread client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import gspread
+
+            _client = gspread.service_account(filename=CREDENTIALS_FILE)
+        return _client
+
+
+def get_worksheet(sheet_name: str = SHEET_NAME):
+    """Return the cached first worksheet of the named spreadsheet."""
+    gc = get_gsheet_client()
+    with _client_lock:
+        worksheet = _worksheets.get(sheet_name)
+        if worksheet is None:
+            worksheet = _worksheets[sheet_name] = gc.open(sheet_name).sheet1
+        return worksheet
 
 
 def read_case_ids(sheet_name: str = SHEET_NAME) -> List[str]:
     """Read case IDs from the first column of the Google Sheet."""
-    gc = get_gsheet_client()
-    sh = gc.open(sheet_name)
-    worksheet = sh.sheet1
+    worksheet = get_worksheet(sheet_name)
     case_ids = worksheet.col_values(1)[1:]  # Skip header
     return case_ids
 
 
+def rowcol_to_a1(row: int, col: int) -> str:
+    """A1 label of a 1-based cell, e.g. (2, 28) -> "AB2"."""
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return f"{letters}{row}"
+
+
+def a1_to_rowcol(label: str) -> Tuple[int, int]:
+    """1-based (row, col) of an A1 label such as "AB2"."""
+    letters = label.rstrip("0123456789")
+    col = 0
+    for letter in letters.upper():
+        col = col * 26 + ord(letter) - ord("A") + 1
+    return int(label[len(letters):]), col
+
+
+def _cell(value):
+    """Sheets cells hold scalars; nested values such as the orders list are stored as JSON."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _as_text(value) -> str:
+    """The string get_all_values() returns for a value written with RAW input."""
+    value = _cell(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return str(value)
+
+
+class SheetSync:
+    """
+    Incremental writer for a results worksheet.
+
+    Keeps a local snapshot of what the sheet holds (headers and rows keyed by
+    case_id) and sends only rows whose values changed, as size-bounded
+    batch_update requests with quota-aware backoff. push() can be called
+    while a batch is still running; rows are flushed every SHEET_FLUSH_ROWS.
+
+    Only get_all_values, batch_update, row_count, col_count, add_rows and
+    add_cols are used on the worksheet, so InMemoryWorksheet can stand in for it.
+    """
+
+    def __init__(self, worksheet=None, sheet_name: str = SHEET_NAME, snapshot_path: Optional[str] = SNAPSHOT_FILE,
+                 resync: bool = SHEET_RESYNC, flush_rows: int = SHEET_FLUSH_ROWS,
+                 max_cells_per_batch: int = SHEET_MAX_CELLS_PER_BATCH,
+                 min_write_interval: float = SHEET_MIN_WRITE_INTERVAL):
+        self.worksheet = worksheet if worksheet is not None else get_worksheet(sheet_name)
+        self.sheet_name = sheet_name
+        self.snapshot_path = snapshot_path
+        self.flush_rows = flush_rows
+        self.max_cells_per_batch = max_cells_per_batch
+        self.min_write_interval = min_write_interval
+        self.counters = {"pushed": 0, "unchanged": 0, "rows_written": 0, "cells_written": 0,
+                         "requests": 0, "retries": 0}
+        self._lock = threading.RLock()
+        self._pending: Dict[int, List[str]] = {}  # row number -> full row values
+        self._last_write = 0.0
+        self.headers: List[str] = []
+        self.columns: Dict[str, int] = {}  # result key -> column index
+        self.rows: Dict[str, Dict] = {}  # case_id -> {"row": n, "values": [...]}
+        self.next_row = 2
+        if resync or not self._load_snapshot():
+            self._resync()
+
+    # --- snapshot -------------------------------------------------------
+    def _load_snapshot(self) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable sheet snapshot {self.snapshot_path}: {e}")
+            return False
+        if snapshot.get("sheet") != self.sheet_name:
+            return False
+        self.headers = snapshot["headers"]
+        self.rows = snapshot["rows"]
+        self.next_row = snapshot["next_row"]
+        self._index_columns()
+        return True
+
+    def _index_columns(self):
+        self.columns = {h: i for i, h in enumerate(self.headers) if h}
+        # A sheet used as input may label its case ID column differently; it is column A.
+        if self.headers and KEY_COLUMN not in self.columns:
+            self.columns[KEY_COLUMN] = 0
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"sheet": self.sheet_name, "headers": self.headers, "rows": self.rows,
+                       "next_row": self.next_row}, f, ensure_ascii=False)
+        os.replace(tmp, self.snapshot_path)
+
+    def _resync(self):
+        """Rebuild the snapshot from the live sheet with a single read."""
+        values = self.worksheet.get_all_values()
+        self.headers = list(values[0]) if values else []
+        self._index_columns()
+        key_index = self.columns.get(KEY_COLUMN, 0)
+        self.rows = {}
+        for number, row in enumerate(values[1:], start=2):
+            if len(row) > key_index and row[key_index]:
+                self.rows[row[key_index]] = {"row": number, "values": list(row)}
+        self.next_row = len(values) + 1 if values else 2
+        self._save_snapshot()
+
+    # --- diffing --------------------------------------------------------
+    def _ensure_headers(self, result: Dict) -> bool:
+        """Add columns for unseen result keys; True when the header row must be (re)written."""
+        added = False
+        for key in [KEY_COLUMN, *result]:
+            if key not in self.columns:
+                self.columns[key] = len(self.headers)
+                self.headers.append(key)
+                added = True
+        return added
+
+    def push(self, result: Dict):
+        """Record one result; it is written on the next flush if it differs from the sheet."""
+        key = _as_text(result.get(KEY_COLUMN))
+        if not key:
+            raise ValueError(f"Result has no {KEY_COLUMN}: {result}")
+        with self._lock:
+            self.counters["pushed"] += 1
+            if self._ensure_headers(result):
+                self._pending[1] = list(self.headers)
+            entry = self.rows.get(key)
+            old = list(entry["values"]) if entry else []
+            old += [""] * (len(self.headers) - len(old))
+            new = list(old)
+            for field, value in result.items():
+                new[self.columns[field]] = _as_text(value)
+            new[self.columns[KEY_COLUMN]] = key
+            if entry and new == old:
+                self.counters["unchanged"] += 1
+                return
+            if entry is None:
+                entry = self.rows[key] = {"row": self.next_row, "values": []}
+                self.next_row += 1
+            entry["values"] = new
+            self._pending[entry["row"]] = new
+            if len(self._pending) >= self.flush_rows:
+                self.flush()
+
+    # --- writing --------------------------------------------------------
+    def _batches(self):
+        """Group pending rows into batch_update payloads of at most max_cells_per_batch cells."""
+        batch, cells = [], 0
+        for number in sorted(self._pending):
+            values = self._pending[number]
+            if batch and cells + len(values) > self.max_cells_per_batch:
+                yield batch
+                batch, cells = [], 0
+            batch.append({
+                "range": f"{rowcol_to_a1(number, 1)}:{rowcol_to_a1(number, max(1, len(values)))}",
+                "values": [values],
+            })
+            cells += len(values)
+        if batch:
+            yield batch
+
+    def _ensure_grid(self):
+        rows_needed = max(self._pending) - self.worksheet.row_count
+        if rows_needed > 0:
+            self.worksheet.add_rows(rows_needed)
+        cols_needed = len(self.headers) - self.worksheet.col_count
+        if cols_needed > 0:
+            self.worksheet.add_cols(cols_needed)
+
+    def _send(self, batch):
+        for attempt in range(SHEET_MAX_RETRIES + 1):
+            wait = self.min_write_interval - (time.monotonic() - self._last_write)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.counters["requests"] += 1
+                self.worksheet.batch_update(batch, value_input_option="RAW")
+                self._last_write = time.monotonic()
+                return
+            except Exception as e:
+                # gspread's APIError carries the HTTP response; anything else is not retried.
+                self._last_write = time.monotonic()
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status not in RETRY_STATUSES or attempt == SHEET_MAX_RETRIES:
+                    raise
+                self.counters["retries"] += 1
+                delay = backoff_delay(attempt, base=2.0, cap=64.0)
+                logging.warning(f"Sheets API returned {status}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def flush(self):
+        """Write every pending row; the snapshot is saved after each successful batch."""
+        with self._lock:
+            if not self._pending:
+                return
+            self._ensure_grid()
+            for batch in self._batches():
+                try:
+                    self._send(batch)
+                except Exception:
+                    # The snapshot may now claim rows that never reached the sheet.
+                    if self.snapshot_path and os.path.exists(self.snapshot_path):
+                        os.remove(self.snapshot_path)
+                    raise
+                for update in batch:
+                    number = a1_to_rowcol(update["range"].split(":")[0])[0]
+                    self._pending.pop(number, None)
+                    self.counters["rows_written"] += 1
+                    self.counters["cells_written"] += len(update["values"][0])
+                self._save_snapshot()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "pending": len(self._pending)}
+
+
+class InMemoryWorksheet:
+    """Stand-in for gspread.Worksheet implementing the calls SheetSync makes."""
+
+    def __init__(self, values: Optional[List[List[str]]] = None, rows: int = 1000, cols: int = 26):
+        self.values = [list(row) for row in values or []]
+        self.row_count = max(rows, len(self.values))
+        self.col_count = max([cols] + [len(row) for row in self.values])
+        self.requests = 0
+
+    def get_all_values(self) -> List[List[str]]:
+        width = max((len(row) for row in self.values), default=0)
+        rows = [row + [""] * (width - len(row)) for row in self.values]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def col_values(self, col: int) -> List[str]:
+        return [row[col - 1] if len(row) >= col else "" for row in self.get_all_values()]
+
+    def add_rows(self, rows: int):
+        self.row_count += rows
+
+    def add_cols(self, cols: int):
+        self.col_count += cols
+
+    def batch_update(self, data: List[Dict], value_input_option: str = "RAW"):
+        self.requests += 1
+        for update in data:
+            start = update["range"].split(":")[0]
+            row, col = a1_to_rowcol(start)
+            for r, values in enumerate(update["values"], start=row):
+                if r > self.row_count or col - 1 + len(values) > self.col_count:
+                    raise ValueError(f"Range {update['range']} exceeds grid limits")
+                while len(self.values) < r:
+                    self.values.append([])
+                target = self.values[r - 1]
+                if len(target) < col - 1 + len(values):
+                    target.extend([""] * (col - 1 + len(values) - len(target)))
+                target[col - 1:col - 1 + len(values)] = [_as_text(v) for v in values]
+
+
 def write_results(results: List[Dict], sheet_name: str = SHEET_NAME):
-    """Write results to the Google Sheet, starting from row 2."""
-    gc = get_gsheet_client()
-    sh = gc.open(sheet_name)
-    worksheet = sh.sheet1
-    headers = list(results[0].keys())
-    worksheet.update('A1', [headers])
-    rows = [[r.get(h, "") for h in headers] for r in results]
-    worksheet.update(f'A2', rows)
+    """Write results to the Google Sheet, sending only rows that changed since the last sync."""
+    if not results:
+        return
+    sync = SheetSync(sheet_name=sheet_name)
+    for result in results:
+        sync.push(result)
+    sync.flush()
@@ -0,0 +1,334 @@
+"""
+Browserless fast path for case-status lookups.
+
+Fetches the search page over pooled keep-alive connections, carries its
+hidden fields and cookies into the form submission, follows the results
+iframe if there is one and parses the HTML with utils.case_parser. When the
+page cannot be handled without JavaScript (no server-rendered form, options
+filled in by script, empty results) NeedsBrowser is raised so the caller can
+fall back to Playwright.
+"""
+
+import gzip
+import http.client
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urljoin, urlsplit
+
+from utils.case_parser import LABELS, parse_case_html
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 20))
+HTTP_MAX_IDLE_PER_HOST = int(os.getenv("HTTP_MAX_IDLE_PER_HOST", 4))
+USER_AGENT = os.getenv(
+    "HTTP_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+)
+MAX_REDIRECTS = 5
+RESULTS_FRAME = "frmCaseStatus"
+FORM_FIELDS = ("CaseType", "CaseNo", "CaseYear")
+
+
+class NeedsBrowser(Exception):
+    """The page needs a real browser (JavaScript) to complete the lookup."""
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port), shared by all threads."""
+
+    def __init__(self, max_idle_per_host: int = HTTP_MAX_IDLE_PER_HOST, timeout: float = HTTP_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.counters = {"opened": 0, "reused": 0}
+
+    @staticmethod
+    def _origin(url: str) -> Tuple[str, str, int]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        return scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80)
+
+    def _acquire(self, origin) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(origin)
+            if idle:
+                self.counters["reused"] += 1
+                return idle.pop(), True
+            self.counters["opened"] += 1
+        scheme, host, port = origin
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=self.timeout), False
+
+    def _release(self, origin, conn: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault(origin, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, url: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> http.client.HTTPResponse:
+        """
+        Send a request and return the response with its body already read into
+        response.data; the connection goes back to the pool unless the server closes it.
+        """
+        origin = self._origin(url)
+        parts = urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        for attempt in range(2):
+            conn, reused = self._acquire(origin)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                response.data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # A reused connection may have been closed by the server while idle.
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(origin, conn)
+            return response
+
+    @contextmanager
+    def stream(self, method: str, url: str, headers: Optional[Dict[str, str]] = None):
+        """
+        Like request(), but yields the response with its body unread so the caller can
+        stream it. The connection goes back to the pool only if the body was read to the end.
+        """
+        origin = self._origin(url)
+        parts = urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        for attempt in range(2):
+            conn, reused = self._acquire(origin)
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+        if response.isclosed() and not response.will_close and not response.length:
+            self._release(origin, conn)
+        else:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+class _FormParser(HTMLParser):
+    """Collects forms (action, method, fields, select options) and iframes."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms: List[Dict] = []
+        self.iframes: Dict[str, str] = {}
+        self._form: Optional[Dict] = None
+        self._select: Optional[str] = None
+        self._option: Optional[Dict] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: (v if v is not None else "") for k, v in attrs}
+        if tag == "form":
+            self._form = {
+                "action": attrs.get("action", ""),
+                "method": attrs.get("method", "get").lower(),
+                "target": attrs.get("target", ""),
+                "fields": {},
+                "submit": None,
+                "options": {},
+            }
+            self.forms.append(self._form)
+        elif tag == "iframe":
+            self.iframes[attrs.get("name") or attrs.get("id", "")] = attrs.get("src", "")
+        elif self._form is None:
+            return
+        elif tag == "input":
+            name, kind = attrs.get("name"), attrs.get("type", "text").lower()
+            if not name:
+                return
+            if kind in ("submit", "image"):
+                self._form["submit"] = self._form["submit"] or (name, attrs.get("value", ""))
+            elif kind in ("checkbox", "radio"):
+                if "checked" in attrs:
+                    self._form["fields"][name] = attrs.get("value", "on")
+            else:
+                self._form["fields"][name] = attrs.get("value", "")
+        elif tag == "select" and attrs.get("name"):
+            self._select = attrs["name"]
+            self._form["options"][self._select] = {}
+            self._form["fields"].setdefault(self._select, "")
+        elif tag == "option" and self._select:
+            # </option> is optional in HTML.
+            if self._option is not None:
+                self._close_option()
+            self._option = {"value": attrs.get("value"), "label": []}
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+        elif tag == "select":
+            if self._option is not None:
+                self._close_option()
+            self._select = None
+        elif tag == "option" and self._option is not None:
+            self._close_option()
+
+    def _close_option(self):
+        label = " ".join("".join(self._option["label"]).split())
+        value = self._option["value"] if self._option["value"] is not None else label
+        self._form["options"][self._select][label] = value
+        self._option = None
+
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option["label"].append(data)
+
+
+def _decode(response: http.client.HTTPResponse) -> str:
+    body = response.data
+    encoding = (response.getheader("Content-Encoding") or "").lower()
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "deflate":
+        body = zlib.decompress(body)
+    charset = response.headers.get_content_charset() or "utf-8"
+    return body.decode(charset, errors="replace")
+
+
+class HttpCaseClient:
+    """Submits the case-status form without a browser."""
+
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or ConnectionPool()
+
+    def _fetch(self, method: str, url: str, cookies: SimpleCookie, referer: Optional[str] = None,
+               fields: Optional[Dict[str, str]] = None) -> Tuple[str, str]:
+        """Run one request (following redirects) and return (final_url, html)."""
+        for _ in range(MAX_REDIRECTS + 1):
+            body = None
+            headers = {
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml",
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+            }
+            if referer:
+                headers["Referer"] = referer
+            if cookies:
+                headers["Cookie"] = "; ".join(f"{k}={m.value}" for k, m in cookies.items())
+            if method == "POST":
+                body = urlencode(fields or {}).encode()
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            elif fields:
+                url = f"{url.split('?', 1)[0]}?{urlencode(fields)}"
+            response = self.pool.request(method, url, body=body, headers=headers)
+            for header in response.headers.get_all("Set-Cookie") or []:
+                cookies.load(header)
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                referer, url = url, urljoin(url, response.getheader("Location"))
+                if response.status in (301, 302, 303):
+                    method, fields = "GET", None
+                continue
+            if response.status >= 400:
+                raise http.client.HTTPException(f"HTTP {response.status} for {url}")
+            return url, _decode(response)
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    @staticmethod
+    def _find_form(forms: List[Dict]) -> Dict:
+        for form in forms:
+            if all(name in form["fields"] for name in FORM_FIELDS):
+                return form
+        raise NeedsBrowser("Search form is not server-rendered.")
+
+    @staticmethod
+    def _option_value(form: Dict, case_type: str) -> str:
+        options = form["options"].get("CaseType", {})
+        if case_type in options:
+            return options[case_type]
+        wanted = case_type.strip().lower()
+        for label, value in options.items():
+            if label.lower() == wanted:
+                return value
+        raise NeedsBrowser(f"Case type {case_type!r} not among the server-rendered options.")
+
+    def fetch(self, url: str, case_type: str, case_number: str, filing_year: str,
+              missing: Optional[str] = "Not found") -> Tuple[Dict, str]:
+        """
+        Look up one case and return (details, html of the results page).
+        Fields absent from the results are set to `missing`.
+        Raises NeedsBrowser when the lookup has to go through Playwright.
+        """
+        cookies = SimpleCookie()
+        page_url, html = self._fetch("GET", url, cookies)
+        page = _FormParser()
+        page.feed(html)
+        form = self._find_form(page.forms)
+
+        fields = dict(form["fields"])
+        fields.update({
+            "CaseType": self._option_value(form, case_type),
+            "CaseNo": case_number,
+            "CaseYear": filing_year,
+        })
+        if form["submit"]:
+            fields.setdefault(*form["submit"])
+        action = urljoin(page_url, form["action"] or page_url)
+        result_url, result_html = self._fetch(form["method"].upper(), action, cookies, page_url, fields)
+
+        # The results may come back as a page that embeds the results iframe.
+        if RESULTS_FRAME not in form["target"]:
+            result_page = _FormParser()
+            result_page.feed(result_html)
+            src = result_page.iframes.get(RESULTS_FRAME)
+            if src:
+                result_url, result_html = self._fetch("GET", urljoin(result_url, src), cookies, result_url)
+
+        details = parse_case_html(result_html, base_url=result_url, missing=None)
+        if all(details[field] is None for field in LABELS):
+            raise NeedsBrowser("No case fields in the server-rendered results.")
+        for field in LABELS:
+            if details[field] is None:
+                details[field] = missing
+        return details, result_html
+
+
+_client: Optional[HttpCaseClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpCaseClient:
+    """Return the process-wide client so every lookup shares one connection pool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpCaseClient()
+        return _client
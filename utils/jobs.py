@@ -0,0 +1,249 @@
+"""
+Background lookup jobs for the web app.
+
+POST /jobs stores the submitted cases in SQLite and returns at once. A fixed
+pool of worker threads (JOB_WORKERS) runs the lookups, so slow scrapes no longer
+hold Flask request threads. Each finished case is saved with a sequence
+number. GET /jobs/<id> reads progress and partial results, and
+JobManager.events() feeds the Server-Sent Events stream. A client that
+reconnects with Last-Event-ID continues where it left off.
+
+Cases still pending or running when the process stopped are queued again the
+next time a JobManager is created on the same database.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.search_log import connect
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_CASES = int(os.getenv("JOB_MAX_CASES", 500))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 7))  # 0 keeps everything
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 15))
+
+CASE_FIELDS = ("case_type", "case_number", "filing_year")
+
+# fetch(case_type, case_number, filing_year, force_refresh, mode) -> (details, ok)
+Fetch = Callable[[str, str, str, bool, Optional[str]], tuple]
+
+
+class JobManager:
+    """SQLite-backed job store plus the bounded worker pool that drains it."""
+
+    def __init__(self, fetch: Fetch, db_path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS,
+                 retention_days: int = JOB_RETENTION_DAYS):
+        self.fetch = fetch
+        self._conn = connect(db_path)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._generation = 0  # bumped whenever an item finishes
+        self._queue = queue.Queue()
+        self.counters = {"submitted": 0, "finished": 0, "failed": 0, "resumed": 0}
+        self._create_schema()
+        if retention_days > 0:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "DELETE FROM job_items WHERE job_id IN "
+                    "(SELECT id FROM jobs WHERE created < datetime('now', ?))", (f"-{retention_days} days",)
+                )
+                self._conn.execute("DELETE FROM jobs WHERE created < datetime('now', ?)", (f"-{retention_days} days",))
+        self._resume()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    options TEXT,
+                    total INTEGER,
+                    created DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT,
+                    idx INTEGER,
+                    case_type TEXT,
+                    case_number TEXT,
+                    filing_year TEXT,
+                    status TEXT DEFAULT 'pending',
+                    result TEXT,
+                    seq INTEGER,
+                    updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (job_id, idx)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (status)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_seq ON job_items (job_id, seq)")
+            self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM job_items").fetchone()[0]
+
+    def _resume(self):
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT i.job_id, i.idx FROM job_items i JOIN jobs j ON j.id = i.job_id
+                WHERE i.status IN ('pending', 'running') ORDER BY j.created, i.idx
+            """).fetchall()
+        for job_id, idx in rows:
+            self._queue.put((job_id, idx))
+        if rows:
+            self.counters["resumed"] += len(rows)
+            logging.info(f"Resuming {len(rows)} unfinished job items")
+
+    # --- submission -------------------------------------------------------
+    def submit(self, cases: List[Dict], force_refresh: bool = False, mode: Optional[str] = None) -> str:
+        """Store a job and queue its cases; returns the job ID."""
+        if not cases:
+            raise ValueError("A job needs at least one case.")
+        if len(cases) > JOB_MAX_CASES:
+            raise ValueError(f"A job may contain at most {JOB_MAX_CASES} cases.")
+        job_id = uuid.uuid4().hex
+        options = json.dumps({"force_refresh": force_refresh, "mode": mode})
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO jobs (id, options, total) VALUES (?, ?, ?)", (job_id, options, len(cases)))
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, case_type, case_number, filing_year) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, i, *(str(case[field]).strip() for field in CASE_FIELDS)) for i, case in enumerate(cases)],
+            )
+        for i in range(len(cases)):
+            self._queue.put((job_id, i))
+        self.counters["submitted"] += 1
+        return job_id
+
+    # --- workers ----------------------------------------------------------
+    def _work(self):
+        while True:
+            job_id, idx = self._queue.get()
+            try:
+                self._run_item(job_id, idx)
+            except Exception as e:
+                logging.error(f"Job {job_id} item {idx} could not be processed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _run_item(self, job_id: str, idx: int):
+        with self._lock, self._conn:
+            row = self._conn.execute("""
+                SELECT i.case_type, i.case_number, i.filing_year, i.status, j.options
+                FROM job_items i JOIN jobs j ON j.id = i.job_id WHERE i.job_id = ? AND i.idx = ?
+            """, (job_id, idx)).fetchone()
+            if row is None or row[3] in ("done", "failed"):
+                return
+            self._conn.execute(
+                "UPDATE job_items SET status = 'running', updated = CURRENT_TIMESTAMP WHERE job_id = ? AND idx = ?",
+                (job_id, idx),
+            )
+        case_type, case_number, filing_year, _, options = row
+        options = json.loads(options or "{}")
+        try:
+            details, ok = self.fetch(case_type, case_number, filing_year,
+                                     options.get("force_refresh", False), options.get("mode"))
+        except Exception as e:
+            details, ok = {"error": f"Error fetching data: {e}"}, False
+        with self._lock, self._conn:
+            self._seq += 1
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, seq = ?, updated = CURRENT_TIMESTAMP "
+                "WHERE job_id = ? AND idx = ?",
+                ("done" if ok else "failed", json.dumps(details, ensure_ascii=False), self._seq, job_id, idx),
+            )
+        self.counters["finished"] += 1
+        self.counters["failed"] += not ok
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    # --- reading ----------------------------------------------------------
+    @staticmethod
+    def _item(row) -> Dict:
+        idx, case_type, case_number, filing_year, status, result, seq = row
+        return {
+            "index": idx,
+            "case_type": case_type,
+            "case_number": case_number,
+            "filing_year": filing_year,
+            "status": status,
+            "seq": seq,
+            "result": json.loads(result) if result else None,
+        }
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Progress and every finished result of a job, or None if it does not exist."""
+        with self._lock:
+            job = self._conn.execute("SELECT total, created FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            rows = self._conn.execute("""
+                SELECT idx, case_type, case_number, filing_year, status, result, seq
+                FROM job_items WHERE job_id = ? ORDER BY idx
+            """, (job_id,)).fetchall()
+        items = [self._item(row) for row in rows]
+        counts = {status: sum(1 for item in items if item["status"] == status)
+                  for status in ("pending", "running", "done", "failed")}
+        finished = counts["done"] + counts["failed"]
+        return {
+            "job_id": job_id,
+            "created": job[1],
+            "status": "finished" if finished == job[0] else ("running" if finished or counts["running"] else "queued"),
+            "total": job[0],
+            "completed": finished,
+            "failed": counts["failed"],
+            "results": [item for item in items if item["status"] in ("done", "failed")],
+        }
+
+    def _finished_since(self, job_id: str, after_seq: int):
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT idx, case_type, case_number, filing_year, status, result, seq
+                FROM job_items WHERE job_id = ? AND seq > ? ORDER BY seq
+            """, (job_id, after_seq)).fetchall()
+            total, finished = self._conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(status IN ('done', 'failed')), 0) FROM job_items WHERE job_id = ?
+            """, (job_id,)).fetchone()
+        return [self._item(row) for row in rows], finished == total
+
+    def events(self, job_id: str, after_seq: int = 0) -> Iterator[str]:
+        """Server-Sent Events: one "result" per finished case, then "done". Comments keep idle streams open."""
+        while True:
+            with self._changed:
+                generation = self._generation
+            items, finished = self._finished_since(job_id, after_seq)
+            for item in items:
+                after_seq = item["seq"]
+                yield f"id: {after_seq}\nevent: result\ndata: {json.dumps(item, ensure_ascii=False)}\n\n"
+            if finished:
+                summary = {k: v for k, v in self.get(job_id).items() if k != "results"}
+                yield f"event: done\ndata: {json.dumps(summary, ensure_ascii=False)}\n\n"
+                return
+            with self._changed:
+                changed = self._changed.wait_for(lambda: self._generation != generation, JOB_HEARTBEAT_SECONDS)
+            if not changed:
+                yield ": keep-alive\n\n"
+
+    def exists(self, job_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is not None
+
+    def stats(self) -> Dict:
+        return {**self.counters, "queued": self._queue.qsize(), "workers": len(self._threads)}
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued case has been processed; False on timeout."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while self._queue.unfinished_tasks:
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
@@ -0,0 +1,210 @@
+"""
+In-process timing spans, histograms and counters for lookups.
+
+Each phase of a lookup (lease wait, browser launch, goto, form wait, fill,
+pacing, submit, iframe wait, extract, or the whole HTTP fast path) runs inside
+span(). The span records its duration in a bucketed histogram and counts the
+phase as failed if it raised. Whole lookups are recorded with their outcome
+(success, timeout or error) and the path that served them. A span costs two
+perf_counter() calls, a bisect and a lock, so it stays on in production
+(METRICS_ENABLED=0 turns it off).
+
+render() produces the Prometheus text format served at /metrics by app.py.
+summary() and format_summary() give the per-phase view printed at the end of
+batch runs.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Seconds; covers sub-millisecond parsing up to a browser launch on a busy host.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def series(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def quantile(self, q: float, counts: List[int]) -> float:
+        """Estimate a quantile from bucket counts by linear interpolation, as histogram_quantile() does."""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower  # +Inf bucket: the best we can say is "above the last bound"
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.series().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="{}"'.format("+Inf" if bound == float("inf") else _number(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+PHASE_SECONDS = Histogram(
+    "court_lookup_phase_seconds", "Time spent in each phase of a lookup.", ("scraper", "phase")
+)
+PHASE_FAILURES = Counter(
+    "court_lookup_phase_failures_total", "Phases that raised, by outcome.", ("scraper", "phase", "outcome")
+)
+LOOKUP_SECONDS = Histogram(
+    "court_lookup_seconds", "End-to-end lookup time.", ("scraper", "source", "outcome")
+)
+LOOKUPS = Counter(
+    "court_lookups_total", "Lookups by the path that served them and their outcome.", ("scraper", "source", "outcome")
+)
+REGISTRY = (LOOKUPS, LOOKUP_SECONDS, PHASE_SECONDS, PHASE_FAILURES)
+
+
+def outcome_of(error: Optional[BaseException]) -> str:
+    """Classify an exception (or None) as success, timeout or error."""
+    if error is None:
+        return "success"
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+        return "timeout"
+    return "error"
+
+
+@contextmanager
+def span(scraper: str, phase: str):
+    """Time one phase of a lookup; exceptions are counted and re-raised."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        PHASE_FAILURES.inc(scraper=scraper, phase=phase, outcome=outcome_of(e))
+        raise
+    finally:
+        PHASE_SECONDS.observe(time.perf_counter() - started, scraper=scraper, phase=phase)
+
+
+def record_lookup(scraper: str, source: str, outcome: str, seconds: float):
+    if METRICS_ENABLED:
+        LOOKUPS.inc(scraper=scraper, source=source, outcome=outcome)
+        LOOKUP_SECONDS.observe(seconds, scraper=scraper, source=source, outcome=outcome)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def summary(scraper: Optional[str] = None) -> Dict:
+    """Per-phase count, mean and estimated p50/p95 seconds, plus lookup outcomes."""
+    phases = {}
+    for (name, phase), (counts, total, count) in PHASE_SECONDS.series().items():
+        if scraper and name != scraper:
+            continue
+        phases[phase if scraper else f"{name}:{phase}"] = {
+            "count": count,
+            "mean_s": round(total / count, 3) if count else 0.0,
+            "p50_s": round(PHASE_SECONDS.quantile(0.5, counts), 3),
+            "p95_s": round(PHASE_SECONDS.quantile(0.95, counts), 3),
+        }
+    for (name, phase, outcome), value in PHASE_FAILURES.values().items():
+        key = phase if scraper else f"{name}:{phase}"
+        if key in phases and (not scraper or name == scraper):
+            phases[key][outcome] = phases[key].get(outcome, 0) + int(value)
+    outcomes: Dict[str, int] = {}
+    for (name, source, outcome), value in LOOKUPS.values().items():
+        if not scraper or name == scraper:
+            outcomes[f"{source}/{outcome}"] = outcomes.get(f"{source}/{outcome}", 0) + int(value)
+    return {"lookups": outcomes, "phases": phases}
+
+
+def format_summary(scraper: Optional[str] = None) -> str:
+    s = summary(scraper)
+    lines = [f"Lookups: {s['lookups']}"]
+    for phase, p in sorted(s["phases"].items(), key=lambda item: -item[1]["mean_s"] * item[1]["count"]):
+        failures = {k: v for k, v in p.items() if k in ("timeout", "error")}
+        lines.append(
+            f"  {phase:<15} n={p['count']:<5} mean {p['mean_s']:7.3f}s  p50 {p['p50_s']:7.3f}s  "
+            f"p95 {p['p95_s']:7.3f}s" + (f"  failed {failures}" if failures else "")
+        )
+    return "\n".join(lines)
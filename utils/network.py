@@ -0,0 +1,220 @@
+"""
+Request blocking and bandwidth accounting for Playwright lookups.
+
+We only ever read one iframe table, so images, stylesheets, fonts, media and
+third-party scripts are aborted at the route level. Each lookup counts the
+requests it made, the bytes it received and what was blocked. Process-wide
+totals compare lookups with and without blocking, which gives a measured
+latency difference and an estimate of the bytes saved. Received bytes are
+read from Content-Length, so chunked responses are counted but not sized.
+
+Configuration (comma-separated lists):
+    NETWORK_BLOCKING          "1" (default) or "0" to let everything through
+    NETWORK_BLOCK_TYPES       resource types to abort (denylist mode)
+    NETWORK_ALLOW_TYPES       if set, abort every type NOT listed (allowlist mode)
+    NETWORK_BLOCK_URLS        glob patterns always aborted
+    NETWORK_ALLOW_URLS        glob patterns never aborted (wins over everything)
+    NETWORK_BLOCK_THIRD_PARTY "1" (default) aborts scripts/XHR from other hosts
+"""
+
+import fnmatch
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+
+def _env_list(name: str, default: str = "") -> tuple:
+    return tuple(item.strip() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+NETWORK_BLOCKING = os.getenv("NETWORK_BLOCKING", "1").lower() in ("1", "true", "yes")
+NETWORK_BLOCK_TYPES = _env_list("NETWORK_BLOCK_TYPES", "image,stylesheet,font,media,texttrack,eventsource,websocket,manifest")
+NETWORK_ALLOW_TYPES = _env_list("NETWORK_ALLOW_TYPES")
+NETWORK_BLOCK_URLS = _env_list(
+    "NETWORK_BLOCK_URLS",
+    "*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,*facebook.net*,*hotjar.com*",
+)
+NETWORK_ALLOW_URLS = _env_list("NETWORK_ALLOW_URLS")
+NETWORK_BLOCK_THIRD_PARTY = os.getenv("NETWORK_BLOCK_THIRD_PARTY", "1").lower() in ("1", "true", "yes")
+
+# Used to estimate bytes saved until unblocked lookups provide real averages.
+DEFAULT_SIZE_ESTIMATES = {"image": 40_000, "stylesheet": 30_000, "font": 50_000, "script": 60_000, "media": 200_000}
+
+
+class ResourcePolicy:
+    """Decides which requests a lookup may make."""
+
+    def __init__(self, enabled: bool = NETWORK_BLOCKING, block_types: Iterable[str] = NETWORK_BLOCK_TYPES,
+                 allow_types: Iterable[str] = NETWORK_ALLOW_TYPES, block_urls: Iterable[str] = NETWORK_BLOCK_URLS,
+                 allow_urls: Iterable[str] = NETWORK_ALLOW_URLS, block_third_party: bool = NETWORK_BLOCK_THIRD_PARTY):
+        self.enabled = enabled
+        self.block_types = set(block_types)
+        self.allow_types = set(allow_types)
+        self.block_urls = tuple(block_urls)
+        self.allow_urls = tuple(allow_urls)
+        self.block_third_party = block_third_party
+
+    def reason_to_block(self, resource_type: str, url: str, first_party: Optional[str]) -> Optional[str]:
+        """Why the request should be aborted, or None to let it through."""
+        if not self.enabled or resource_type == "document":
+            return None
+        if any(fnmatch.fnmatch(url, pattern) for pattern in self.allow_urls):
+            return None
+        if any(fnmatch.fnmatch(url, pattern) for pattern in self.block_urls):
+            return "url"
+        if self.allow_types:
+            if resource_type not in self.allow_types:
+                return "type"
+        elif resource_type in self.block_types:
+            return "type"
+        if self.block_third_party and first_party and resource_type in ("script", "xhr", "fetch"):
+            host = urlsplit(url).hostname or ""
+            if host != first_party and not host.endswith("." + first_party):
+                return "third_party"
+        return None
+
+
+class LookupNetwork:
+    """Per-lookup request/byte counters, filled in by route and response handlers."""
+
+    def __init__(self, policy: ResourcePolicy, first_party_url: str):
+        self.policy = policy
+        self.first_party = _registrable_host(first_party_url)
+        self.started = time.monotonic()
+        self.requests = 0
+        self.bytes = 0
+        self.bytes_by_type: Dict[str, int] = {}
+        self.responses_by_type: Dict[str, int] = {}
+        self.blocked: Dict[str, int] = {}
+
+    def decide(self, resource_type: str, url: str) -> bool:
+        """True if the request may continue."""
+        reason = self.policy.reason_to_block(resource_type, url, self.first_party)
+        if reason:
+            self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+            return False
+        self.requests += 1
+        return True
+
+    def record_response(self, resource_type: str, headers: Dict[str, str]):
+        try:
+            size = int(headers.get("content-length", 0))
+        except ValueError:
+            size = 0
+        self.bytes += size
+        self.bytes_by_type[resource_type] = self.bytes_by_type.get(resource_type, 0) + size
+        self.responses_by_type[resource_type] = self.responses_by_type.get(resource_type, 0) + 1
+
+    def summary(self) -> Dict:
+        return {"requests": self.requests, "bytes": self.bytes, "blocked": sum(self.blocked.values()),
+                "seconds": round(time.monotonic() - self.started, 3)}
+
+
+def _registrable_host(url: str) -> str:
+    """The court host without "www", so its subdomains count as first party."""
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+class BandwidthTotals:
+    """Process-wide aggregate of every finished lookup."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lookups = {"blocking": 0, "unblocked": 0}
+        self.seconds = {"blocking": 0.0, "unblocked": 0.0}
+        self.requests = 0
+        self.bytes = 0
+        self.blocked: Dict[str, int] = {}
+        self._observed_bytes: Dict[str, int] = {}
+        self._observed_count: Dict[str, int] = {}
+
+    def add(self, lookup: LookupNetwork):
+        key = "blocking" if lookup.policy.enabled else "unblocked"
+        with self._lock:
+            self.lookups[key] += 1
+            self.seconds[key] += time.monotonic() - lookup.started
+            self.requests += lookup.requests
+            self.bytes += lookup.bytes
+            for kind, count in lookup.blocked.items():
+                self.blocked[kind] = self.blocked.get(kind, 0) + count
+            for kind, size in lookup.bytes_by_type.items():
+                self._observed_bytes[kind] = self._observed_bytes.get(kind, 0) + size
+                self._observed_count[kind] = self._observed_count.get(kind, 0) + lookup.responses_by_type[kind]
+
+    def _average_size(self, kind: str) -> int:
+        count = self._observed_count.get(kind)
+        if count and self._observed_bytes.get(kind):
+            return self._observed_bytes[kind] // count
+        return DEFAULT_SIZE_ESTIMATES.get(kind, 10_000)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            lookups = sum(self.lookups.values())
+            mean = {k: round(self.seconds[k] / n, 3) for k, n in self.lookups.items() if n}
+            summary = {
+                "lookups": lookups,
+                "requests": self.requests,
+                "bytes_received": self.bytes,
+                "avg_bytes_per_lookup": self.bytes // lookups if lookups else 0,
+                "blocked_requests": dict(self.blocked),
+                "est_bytes_saved": sum(n * self._average_size(kind) for kind, n in self.blocked.items()),
+                "mean_lookup_seconds": mean,
+            }
+        if "blocking" in mean and "unblocked" in mean:
+            summary["est_seconds_saved_per_lookup"] = round(mean["unblocked"] - mean["blocking"], 3)
+        return summary
+
+
+_policy = ResourcePolicy()
+totals = BandwidthTotals()
+
+
+def install(context, first_party_url: str, policy: Optional[ResourcePolicy] = None) -> LookupNetwork:
+    """Attach blocking and accounting to a sync Playwright context (or page)."""
+    lookup = LookupNetwork(policy or _policy, first_party_url)
+
+    def handle_route(route):
+        request = route.request
+        if lookup.decide(request.resource_type, request.url):
+            route.continue_()
+        else:
+            route.abort("blockedbyclient")
+
+    if lookup.policy.enabled:
+        context.route("**/*", handle_route)
+    else:
+        context.on("request", lambda request: lookup.decide(request.resource_type, request.url))
+    context.on("response", lambda response: lookup.record_response(response.request.resource_type, response.headers))
+    return lookup
+
+
+async def install_async(context, first_party_url: str, policy: Optional[ResourcePolicy] = None) -> LookupNetwork:
+    """Attach blocking and accounting to an async Playwright context (or page)."""
+    lookup = LookupNetwork(policy or _policy, first_party_url)
+
+    async def handle_route(route):
+        request = route.request
+        if lookup.decide(request.resource_type, request.url):
+            await route.continue_()
+        else:
+            await route.abort("blockedbyclient")
+
+    if lookup.policy.enabled:
+        await context.route("**/*", handle_route)
+    else:
+        context.on("request", lambda request: lookup.decide(request.resource_type, request.url))
+    context.on("response", lambda response: lookup.record_response(response.request.resource_type, response.headers))
+    return lookup
+
+
+def finish(lookup: LookupNetwork) -> Dict:
+    """Fold a finished lookup into the process totals and return its summary."""
+    totals.add(lookup)
+    return lookup.summary()
+
+
+def stats() -> Dict:
+    return totals.summary()
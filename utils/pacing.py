@@ -0,0 +1,103 @@
+"""
+Human-like pacing between form actions.
+
+PACING_MODE selects the policy:
+    adaptive  one think-time pause before each submit, sized by AIMD: it shrinks
+              by PACING_STEP_SECONDS after every healthy response and is
+              multiplied by PACING_BACKOFF_FACTOR after an error or a response
+              slower than PACING_SLOW_SECONDS (default)
+    fixed     the old hard-coded random delays at every step (for benchmarks)
+    off       no pauses at all
+"""
+
+import os
+import random
+import threading
+from typing import Dict, Tuple
+
+PACING_MODE = os.getenv("PACING_MODE", "adaptive")
+PACING_MIN_SECONDS = float(os.getenv("PACING_MIN_SECONDS", 0.25))
+PACING_MAX_SECONDS = float(os.getenv("PACING_MAX_SECONDS", 5.0))
+PACING_START_SECONDS = float(os.getenv("PACING_START_SECONDS", 0.5))
+PACING_STEP_SECONDS = float(os.getenv("PACING_STEP_SECONDS", 0.1))
+PACING_BACKOFF_FACTOR = float(os.getenv("PACING_BACKOFF_FACTOR", 2.0))
+PACING_SLOW_SECONDS = float(os.getenv("PACING_SLOW_SECONDS", 3.0))
+PACING_JITTER = float(os.getenv("PACING_JITTER", 0.25))
+
+# The delays scraper.fetch_case_details used to hard-code, in seconds.
+LEGACY_DELAYS: Dict[str, Tuple[float, float]] = {
+    "after_load": (1.0, 4.0),
+    "before_select": (1.0, 2.0),
+    "before_fill": (1.0, 2.0),
+    "before_submit": (1.0, 2.0),
+    "after_submit": (3.0, 3.0),
+}
+
+
+class AdaptivePacer:
+    """Thread-safe AIMD pacer shared by every lookup in the process."""
+
+    def __init__(self, mode: str = PACING_MODE, min_delay: float = PACING_MIN_SECONDS,
+                 max_delay: float = PACING_MAX_SECONDS, start_delay: float = PACING_START_SECONDS,
+                 step: float = PACING_STEP_SECONDS, backoff_factor: float = PACING_BACKOFF_FACTOR,
+                 slow_seconds: float = PACING_SLOW_SECONDS, jitter: float = PACING_JITTER):
+        if mode not in ("adaptive", "fixed", "off"):
+            raise ValueError(f"Unknown pacing mode {mode!r}")
+        self.mode = mode
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.step = step
+        self.backoff_factor = backoff_factor
+        self.slow_seconds = slow_seconds
+        self.jitter = jitter
+        self._delay = min(max(start_delay, min_delay), max_delay)
+        self._lock = threading.Lock()
+        self.counters = {"healthy": 0, "backoffs": 0, "paused_s": 0.0}
+
+    @property
+    def current_delay(self) -> float:
+        return self._delay
+
+    def pause(self, step: str) -> float:
+        """Seconds to wait before `step` (one of LEGACY_DELAYS)."""
+        if self.mode == "off":
+            return 0.0
+        if self.mode == "fixed":
+            seconds = random.uniform(*LEGACY_DELAYS[step])
+        elif step != "before_submit":
+            return 0.0
+        else:
+            with self._lock:
+                base = self._delay
+            seconds = base * random.uniform(1 - self.jitter, 1 + self.jitter)
+        with self._lock:
+            self.counters["paused_s"] += seconds
+        return seconds
+
+    def observe(self, seconds: float, ok: bool = True):
+        """Feed back how long a server response took and whether it succeeded."""
+        with self._lock:
+            if ok and seconds < self.slow_seconds:
+                self.counters["healthy"] += 1
+                self._delay = max(self.min_delay, self._delay - self.step)
+            else:
+                self.counters["backoffs"] += 1
+                grown = max(self._delay, self.step) * self.backoff_factor
+                self._delay = min(self.max_delay, grown)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "mode": self.mode, "delay_s": round(self._delay, 3)}
+
+
+_pacer = None
+_pacer_lock = threading.Lock()
+
+
+def get_pacer() -> AdaptivePacer:
+    """Return the process-wide pacer."""
+    global _pacer
+    with _pacer_lock:
+        if _pacer is None:
+            _pacer = AdaptivePacer()
+        return _pacer
@@ -0,0 +1,304 @@
+"""
+Write-behind store for the search log.
+
+The request path only enqueues (case_type, case_number, filing_year, html).
+A background writer owns one WAL-mode connection and inserts queued searches
+in batches. It stores each distinct page once, zlib-compressed and keyed by
+its SHA-256 hash, in the `pages` table. The writer also applies the retention
+policy and reclaims free pages with incremental vacuum.
+
+Schema versions (PRAGMA user_version):
+    0  original `searches` table with raw HTML in raw_response
+    1  searches.page_hash -> pages(hash, html, size), indexes, raw_response migrated
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, Optional
+
+DB_PATH = os.getenv("DB_PATH", "search_logs.db")
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 100))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", 1.0))
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 90))  # 0 keeps everything
+LOG_MAINTENANCE_SECONDS = int(os.getenv("LOG_MAINTENANCE_SECONDS", 3600))
+LOG_COMPRESSION_LEVEL = int(os.getenv("LOG_COMPRESSION_LEVEL", 6))
+
+SCHEMA_VERSION = 1
+MIGRATION_BATCH = 500
+
+
+def page_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def compress(html: str) -> bytes:
+    return zlib.compress(html.encode("utf-8"), LOG_COMPRESSION_LEVEL)
+
+
+def decompress(blob: Optional[bytes]) -> str:
+    return zlib.decompress(blob).decode("utf-8") if blob else ""
+
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def migrate(conn: sqlite3.Connection):
+    """Create or upgrade the schema to SCHEMA_VERSION."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    existing = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'searches'"
+    ).fetchone()
+    if not existing:
+        # Must be set before the first table is created to take effect without a VACUUM.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            case_type TEXT,
+            case_number TEXT,
+            filing_year TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            raw_response TEXT
+        )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(searches)")}
+    if "page_hash" not in columns:
+        conn.execute("ALTER TABLE searches ADD COLUMN page_hash TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pages (
+            hash TEXT PRIMARY KEY,
+            html BLOB,
+            size INTEGER,
+            created DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_case ON searches (case_type, case_number, filing_year)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_timestamp ON searches (timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_searches_page ON searches (page_hash)")
+    conn.commit()
+
+    # Move raw HTML of existing rows into the deduplicated pages table.
+    migrated = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, raw_response FROM searches WHERE raw_response IS NOT NULL LIMIT ?", (MIGRATION_BATCH,)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, html in rows:
+            digest = None
+            if html:
+                digest = page_hash(html)
+                conn.execute(
+                    "INSERT OR IGNORE INTO pages (hash, html, size) VALUES (?, ?, ?)",
+                    (digest, compress(html), len(html)),
+                )
+            conn.execute("UPDATE searches SET page_hash = ?, raw_response = NULL WHERE id = ?", (digest, row_id))
+        conn.commit()
+        migrated += len(rows)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    if existing:
+        # Switch the old file to incremental auto-vacuum and reclaim the space freed above.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    logging.info(f"Search log schema at version {SCHEMA_VERSION}; migrated {migrated} rows")
+
+
+class SearchLogStore:
+    """Batches search-log inserts on a background writer thread."""
+
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = LOG_BATCH_SIZE,
+                 flush_seconds: float = LOG_FLUSH_SECONDS, retention_days: int = LOG_RETENTION_DAYS,
+                 maintenance_seconds: int = LOG_MAINTENANCE_SECONDS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+        self.maintenance_seconds = maintenance_seconds
+        self.counters = {"queued": 0, "written": 0, "pages_stored": 0, "pages_deduplicated": 0,
+                         "bytes_raw": 0, "bytes_stored": 0, "write_errors": 0, "expired": 0}
+        # counters is updated from request threads and the writer thread.
+        self._counters_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._conn = connect(db_path)
+        migrate(self._conn)
+        self._last_maintenance = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="search-log-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, case_type: str, case_number: str, filing_year: str, raw_response: str):
+        """Queue one search; returns immediately."""
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self._queue.put((case_type, case_number, filing_year, timestamp, raw_response or ""))
+        self._count(queued=1)
+
+    def _count(self, **amounts: int):
+        with self._counters_lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def _write(self, batch):
+        searches = []
+        pages = {}
+        for case_type, case_number, filing_year, timestamp, html in batch:
+            digest = None
+            if html:
+                digest = page_hash(html)
+                pages.setdefault(digest, html)
+            searches.append((case_type, case_number, filing_year, timestamp, digest))
+        inserted = bytes_stored = 0
+        with self._conn:
+            for digest, html in pages.items():
+                if self._conn.execute("SELECT 1 FROM pages WHERE hash = ?", (digest,)).fetchone():
+                    continue
+                blob = compress(html)
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO pages (hash, html, size) VALUES (?, ?, ?)", (digest, blob, len(html))
+                )
+                if cursor.rowcount:
+                    inserted += 1
+                    bytes_stored += len(blob)
+            self._conn.executemany(
+                "INSERT INTO searches (case_type, case_number, filing_year, timestamp, page_hash) "
+                "VALUES (?, ?, ?, ?, ?)", searches
+            )
+        with_html = sum(1 for search in searches if search[4])
+        self._count(written=len(searches), pages_stored=inserted, pages_deduplicated=with_html - inserted,
+                    bytes_raw=sum(len(item[4]) for item in batch), bytes_stored=bytes_stored)
+
+    def maintain(self):
+        """Apply the retention policy, drop unreferenced pages and reclaim free space."""
+        if self.retention_days > 0:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM searches WHERE timestamp < datetime('now', ?)", (f"-{self.retention_days} days",)
+                )
+                self._count(expired=cursor.rowcount)
+                self._conn.execute(
+                    "DELETE FROM pages WHERE hash NOT IN (SELECT page_hash FROM searches WHERE page_hash IS NOT NULL)"
+                )
+        self._conn.execute("PRAGMA incremental_vacuum")
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._last_maintenance = time.monotonic()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    self._count(write_errors=1)
+                    logging.error(f"Failed to write {len(batch)} search log rows: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+            if time.monotonic() - self._last_maintenance >= self.maintenance_seconds:
+                try:
+                    self.maintain()
+                except Exception as e:
+                    logging.error(f"Search log maintenance failed: {e}")
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._conn.close()
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {**counters, "pending": self._queue.qsize()}
+
+
+def iter_searches(db_path: str = DB_PATH, ids: Optional[Iterable[int]] = None,
+                  with_html: bool = True) -> Iterator[Dict]:
+    """
+    Yield logged searches, oldest first; only the rows in `ids` when given.
+    With with_html the decompressed page is included as raw_response; without it the rows
+    carry only page_hash (None when no page was stored), so no page is read.
+    """
+    conn = connect(db_path)
+    migrate(conn)
+    query = f"""
+        SELECT s.id, s.case_type, s.case_number, s.filing_year, s.timestamp, s.page_hash,
+               {"p.html" if with_html else "NULL"}
+        FROM searches s {"LEFT JOIN pages p ON p.hash = s.page_hash" if with_html else ""}
+    """
+    try:
+        if ids is None:
+            batches = [conn.execute(query + " ORDER BY s.id")]
+        else:
+            ids = sorted(set(ids))
+            batches = (
+                conn.execute(query + f" WHERE s.id IN ({', '.join('?' * len(chunk))}) ORDER BY s.id", chunk)
+                for chunk in (ids[i:i + MIGRATION_BATCH] for i in range(0, len(ids), MIGRATION_BATCH))
+            )
+        for rows in batches:
+            for row_id, case_type, case_number, filing_year, timestamp, digest, blob in rows:
+                search = {
+                    "id": row_id,
+                    "case_type": case_type,
+                    "case_number": case_number,
+                    "filing_year": filing_year,
+                    "timestamp": timestamp,
+                    "page_hash": digest,
+                }
+                if with_html:
+                    search["raw_response"] = decompress(blob)
+                yield search
+    finally:
+        conn.close()
+
+
+_store: Optional[SearchLogStore] = None
+_store_lock = threading.Lock()
+
+
+def get_search_log(db_path: str = DB_PATH) -> SearchLogStore:
+    """Return the process-wide store, starting its writer on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SearchLogStore(db_path)
+        return _store
+
+
+@atexit.register
+def close_search_log():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
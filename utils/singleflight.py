@@ -0,0 +1,94 @@
+"""
+Coalesce identical in-flight calls.
+
+The first caller for a key runs the function; callers arriving while it is
+still running wait for it and receive the same result or exception. Nothing is
+remembered once the call finishes, so this complements rather than replaces
+utils.cache.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread-based coalescing, for Flask's threaded workers and fetcher.py."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["leaders"] += 1
+            else:
+                call.waiters += 1
+                self.counters["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """asyncio coalescing, for the workers in main.py."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable], *args, **kwargs):
+        future = self._calls.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            # shield() so one cancelled waiter does not cancel the shared call.
+            return await asyncio.shield(future)
+        self.counters["leaders"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict:
+        return {**self.counters, "in_flight": len(self._calls)}
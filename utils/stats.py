@@ -0,0 +1,53 @@
+"""
+Lightweight throughput and latency bookkeeping for batch runs.
+"""
+
+import math
+import time
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyStats:
+    """Collects per-lookup latencies and outcomes for a running batch."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies: List[float] = []
+        self.outcomes: Dict[str, int] = {}
+
+    def record(self, seconds: float, outcome: str = "success"):
+        self.latencies.append(seconds)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    @property
+    def completed(self) -> int:
+        return len(self.latencies)
+
+    def summary(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        ordered = sorted(self.latencies)
+        return {
+            "completed": self.completed,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_min": round(self.completed / elapsed * 60, 2) if elapsed else 0.0,
+            "p50_s": round(percentile(ordered, 50), 3),
+            "p95_s": round(percentile(ordered, 95), 3),
+            "p99_s": round(percentile(ordered, 99), 3),
+            "outcomes": dict(self.outcomes),
+        }
+
+    def format(self, total: int = 0) -> str:
+        s = self.summary()
+        progress = f"{s['completed']}/{total}" if total else str(s["completed"])
+        return (
+            f"{progress} done in {s['elapsed_s']}s | {s['throughput_per_min']}/min | "
+            f"p50 {s['p50_s']}s p95 {s['p95_s']}s p99 {s['p99_s']}s | {s['outcomes']}"
+        )
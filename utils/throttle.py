@@ -0,0 +1,46 @@
+"""
+Rate limiting and retry helpers shared by the batch runners.
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket shared by all workers of an asyncio batch.
+
+    Tokens refill continuously at `rate` per second up to `burst`; every
+    request to the court site (including retries) must take one. A rate of 0
+    or less means no limit: acquire() returns at once.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst if burst is not None else max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        # The lock keeps waiters in FIFO order so no worker is starved.
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff: a random delay in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
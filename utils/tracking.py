@@ -0,0 +1,328 @@
+"""
+Tracked cases: last known details, refresh schedule and field-level change history.
+
+Each tracked case keeps its last successful details and the time it is next
+due. The refresh interval follows the parsed next_hearing and filing_date:
+    near      hearing within TRACK_NEAR_DAYS (or today)     TRACK_NEAR_INTERVAL
+    past      hearing date passed, new one not listed yet    TRACK_PAST_INTERVAL
+    upcoming  hearing within TRACK_UPCOMING_DAYS             TRACK_UPCOMING_INTERVAL
+    far       later hearing; also due once it comes near     TRACK_FAR_INTERVAL
+    recent    no hearing, filed within TRACK_RECENT_DAYS     TRACK_RECENT_INTERVAL
+    dormant   anything else                                  TRACK_DORMANT_INTERVAL
+Cases never fetched come first. When several cases are due, the classes above
+are served in that order. Failed refreshes back off exponentially.
+
+A refresh stores only the fields that changed, one row each, in case_changes.
+Those rows are the change events. Requests sent to the court are counted in
+refresh_requests, so the hourly budget holds across restarts. The tables live
+next to the search log (DB_PATH), from which tracking can be seeded without
+any new requests.
+
+Cases are identified by their normalized key (utils.cache.normalize_case_key).
+The case type and number are also kept as they were first tracked, because
+the court's form matches the case type label exactly. due() hands those out
+for the lookup.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.cache import CaseKey, normalize_case_key
+from utils.dates import parse_court_date
+from utils.search_log import DB_PATH, connect
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+TRACK_NEAR_DAYS = int(os.getenv("TRACK_NEAR_DAYS", 3))
+TRACK_UPCOMING_DAYS = int(os.getenv("TRACK_UPCOMING_DAYS", 30))
+TRACK_RECENT_DAYS = int(os.getenv("TRACK_RECENT_DAYS", 365))
+TRACK_NEAR_INTERVAL = float(os.getenv("TRACK_NEAR_INTERVAL", 2 * HOUR))
+TRACK_PAST_INTERVAL = float(os.getenv("TRACK_PAST_INTERVAL", 6 * HOUR))
+TRACK_UPCOMING_INTERVAL = float(os.getenv("TRACK_UPCOMING_INTERVAL", DAY))
+TRACK_FAR_INTERVAL = float(os.getenv("TRACK_FAR_INTERVAL", 7 * DAY))
+TRACK_RECENT_INTERVAL = float(os.getenv("TRACK_RECENT_INTERVAL", 3 * DAY))
+TRACK_DORMANT_INTERVAL = float(os.getenv("TRACK_DORMANT_INTERVAL", 30 * DAY))
+TRACK_RETRY_INTERVAL = float(os.getenv("TRACK_RETRY_INTERVAL", 15 * 60))
+
+# Served in this order when more cases are due than the budget allows.
+PRIORITIES = ("new", "near", "past", "upcoming", "far", "recent", "dormant")
+INTERVALS = {
+    "near": TRACK_NEAR_INTERVAL,
+    "past": TRACK_PAST_INTERVAL,
+    "upcoming": TRACK_UPCOMING_INTERVAL,
+    "far": TRACK_FAR_INTERVAL,
+    "recent": TRACK_RECENT_INTERVAL,
+    "dormant": TRACK_DORMANT_INTERVAL,
+}
+DIFF_FIELDS = ("petitioner", "respondent", "filing_date", "next_hearing", "pdf_url")
+
+
+def classify(details: Optional[Dict], today: Optional[date] = None) -> str:
+    """Priority class of a case from its last known details."""
+    if not details:
+        return "new"
+    today = today or date.today()
+    hearing = parse_court_date(details.get("next_hearing"))
+    if hearing is not None:
+        days_left = (hearing - today).days
+        if days_left < 0:
+            return "past"
+        if days_left <= TRACK_NEAR_DAYS:
+            return "near"
+        return "upcoming" if days_left <= TRACK_UPCOMING_DAYS else "far"
+    filed = parse_court_date(details.get("filing_date"))
+    if filed is not None and (today - filed).days <= TRACK_RECENT_DAYS:
+        return "recent"
+    return "dormant"
+
+
+def next_due(details: Optional[Dict], checked_at: float, today: Optional[date] = None) -> Tuple[str, float]:
+    """(priority class, timestamp the case is next due) after a successful check at checked_at."""
+    priority = classify(details, today)
+    if priority == "new":
+        return priority, checked_at
+    due = checked_at + INTERVALS[priority]
+    hearing = parse_court_date(details.get("next_hearing"))
+    if priority in ("upcoming", "far") and hearing is not None:
+        # Check again once the hearing enters the near window, however long the interval.
+        window = datetime.combine(hearing - timedelta(days=TRACK_NEAR_DAYS), datetime.min.time()).timestamp()
+        due = min(due, max(window, checked_at))
+    return priority, due
+
+
+def _text(value) -> Optional[str]:
+    if value in (None, ""):
+        return None
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def diff_details(old: Dict, new: Dict) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """Field-level changes from old to new as (field, old, new); orders and extra rows by entry."""
+    changes = []
+    for field in DIFF_FIELDS:
+        before, after = _text(old.get(field)), _text(new.get(field))
+        if before != after:
+            changes.append((field, before, after))
+    old_orders = {order["url"]: order.get("name") for order in old.get("orders") or []}
+    new_orders = {order["url"]: order.get("name") for order in new.get("orders") or []}
+    for url in new_orders.keys() - old_orders.keys():
+        changes.append(("orders", None, f"{new_orders[url]} {url}".strip()))
+    for url in old_orders.keys() - new_orders.keys():
+        changes.append(("orders", f"{old_orders[url]} {url}".strip(), None))
+    old_extra, new_extra = old.get("extra") or {}, new.get("extra") or {}
+    for label in sorted(old_extra.keys() | new_extra.keys()):
+        before, after = _text(old_extra.get(label)), _text(new_extra.get(label))
+        if before != after:
+            changes.append((f"extra.{label}", before, after))
+    return changes
+
+
+class CaseTracker:
+    """SQLite store of tracked cases, their schedule, change history and request budget."""
+
+    def __init__(self, db_path: str = DB_PATH):
+        self._conn = connect(db_path)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tracked_cases (
+                    case_type TEXT,
+                    case_number TEXT,
+                    filing_year TEXT,
+                    details TEXT,
+                    priority TEXT DEFAULT 'new',
+                    next_due REAL DEFAULT 0,
+                    last_checked REAL,
+                    last_changed REAL,
+                    failures INTEGER DEFAULT 0,
+                    added DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    input_case_type TEXT,
+                    input_case_number TEXT,
+                    PRIMARY KEY (case_type, case_number, filing_year)
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tracked_cases)")}
+            for column in ("input_case_type", "input_case_number"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE tracked_cases ADD COLUMN {column} TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tracked_due ON tracked_cases (next_due)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS case_changes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    case_type TEXT,
+                    case_number TEXT,
+                    filing_year TEXT,
+                    field TEXT,
+                    old_value TEXT,
+                    new_value TEXT,
+                    detected_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_case_changes_case "
+                "ON case_changes (case_type, case_number, filing_year)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS refresh_requests (ts REAL)")
+
+    # --- tracking -----------------------------------------------------------
+    def _insert(self, case: Dict) -> Tuple[CaseKey, bool]:
+        key = normalize_case_key(case["case_type"], case["case_number"], case["filing_year"])
+        spelling = (str(case["case_type"]).strip(), str(case["case_number"]).strip())
+        added = self._conn.execute(
+            "INSERT OR IGNORE INTO tracked_cases (case_type, case_number, filing_year, input_case_type, "
+            "input_case_number) VALUES (?, ?, ?, ?, ?)", (*key, *spelling),
+        ).rowcount
+        if not added:
+            # Rows tracked before the original spelling was kept pick it up here.
+            self._conn.execute(
+                "UPDATE tracked_cases SET input_case_type = ?, input_case_number = ? "
+                "WHERE case_type = ? AND case_number = ? AND filing_year = ? AND input_case_type IS NULL",
+                (*spelling, *key),
+            )
+        return key, bool(added)
+
+    def track(self, cases: Iterable[Dict]) -> int:
+        """Start tracking case tuples; returns how many were new."""
+        added = 0
+        with self._lock, self._conn:
+            for case in cases:
+                added += self._insert(case)[1]
+        return added
+
+    def seed(self, case: Dict, details: Dict, checked_at: float) -> bool:
+        """Use details parsed from an earlier search as the baseline of a case not fetched yet."""
+        priority, due = next_due(details, checked_at)
+        with self._lock, self._conn:
+            key = self._insert(case)[0]
+            return bool(self._conn.execute(
+                "UPDATE tracked_cases SET details = ?, priority = ?, next_due = ?, last_checked = ? "
+                "WHERE case_type = ? AND case_number = ? AND filing_year = ? "
+                "AND (last_checked IS NULL OR last_checked < ?)",
+                (json.dumps(details, ensure_ascii=False), priority, due, checked_at, *key, checked_at),
+            ).rowcount)
+
+    def untrack(self, key: CaseKey) -> bool:
+        with self._lock, self._conn:
+            return bool(self._conn.execute(
+                "DELETE FROM tracked_cases WHERE case_type = ? AND case_number = ? AND filing_year = ?", key
+            ).rowcount)
+
+    def due(self, limit: int, now: Optional[float] = None) -> List[Dict]:
+        """
+        Up to `limit` cases due for a refresh, most urgent class first. Each holds the case as it
+        was tracked plus its normalized "key", which record() takes.
+        """
+        order = " ".join(f"WHEN '{name}' THEN {rank}" for rank, name in enumerate(PRIORITIES))
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT case_type, case_number, filing_year,
+                       COALESCE(input_case_type, case_type), COALESCE(input_case_number, case_number)
+                FROM tracked_cases WHERE next_due <= ?
+                ORDER BY CASE priority {order} END, next_due LIMIT ?
+            """, (now if now is not None else time.time(), max(0, limit))).fetchall()
+        return [{"case_type": input_type, "case_number": input_number, "filing_year": filing_year,
+                 "key": (case_type, case_number, filing_year)}
+                for case_type, case_number, filing_year, input_type, input_number in rows]
+
+    def next_due_at(self) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute("SELECT MIN(next_due) FROM tracked_cases").fetchone()[0]
+
+    def record(self, key: CaseKey, details: Dict, ok: bool, now: Optional[float] = None) -> List[Dict]:
+        """Store the outcome of a refresh; returns the change events it produced."""
+        now = now if now is not None else time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT details, failures FROM tracked_cases "
+                "WHERE case_type = ? AND case_number = ? AND filing_year = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                return []
+            previous = json.loads(row[0]) if row[0] else None
+            if not ok:
+                failures = row[1] + 1
+                delay = min(TRACK_RETRY_INTERVAL * 2 ** (failures - 1), TRACK_DORMANT_INTERVAL)
+                self._conn.execute(
+                    "UPDATE tracked_cases SET failures = ?, next_due = ? "
+                    "WHERE case_type = ? AND case_number = ? AND filing_year = ?", (failures, now + delay, *key),
+                )
+                return []
+            stored = {k: v for k, v in details.items() if k not in ("status", "source", "cache", "case_id")}
+            changes = diff_details(previous, stored) if previous else []
+            events = []
+            for field, before, after in changes:
+                cursor = self._conn.execute(
+                    "INSERT INTO case_changes (case_type, case_number, filing_year, field, old_value, new_value) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (*key, field, before, after),
+                )
+                events.append({"id": cursor.lastrowid, "case_type": key[0], "case_number": key[1],
+                               "filing_year": key[2], "field": field, "old": before, "new": after})
+            priority, due = next_due(stored, now)
+            if changes:
+                # A record that just moved is likely to move again soon.
+                due = min(due, now + TRACK_UPCOMING_INTERVAL)
+            self._conn.execute(
+                "UPDATE tracked_cases SET details = ?, priority = ?, next_due = ?, last_checked = ?, "
+                "failures = 0, last_changed = CASE WHEN ? THEN ? ELSE last_changed END "
+                "WHERE case_type = ? AND case_number = ? AND filing_year = ?",
+                (json.dumps(stored, ensure_ascii=False), priority, due, now, bool(changes), now, *key),
+            )
+        return events
+
+    # --- budget -------------------------------------------------------------
+    def used_last_hour(self, now: Optional[float] = None) -> int:
+        now = now if now is not None else time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM refresh_requests WHERE ts < ?", (now - HOUR,))
+            return self._conn.execute("SELECT COUNT(*) FROM refresh_requests").fetchone()[0]
+
+    def spend(self, requests: int = 1, now: Optional[float] = None):
+        """Count `requests` sent to the court against the hourly budget."""
+        ts = now if now is not None else time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO refresh_requests (ts) VALUES (?)", [(ts,)] * max(0, requests))
+
+    def budget_frees_at(self, budget: int) -> float:
+        """When the oldest request of a spent hourly budget leaves the window."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ts FROM refresh_requests ORDER BY ts DESC LIMIT 1 OFFSET ?", (max(0, budget - 1),)
+            ).fetchone()
+        return row[0] + HOUR if row else time.time()
+
+    # --- reading ------------------------------------------------------------
+    def changes(self, since_id: int = 0, key: Optional[CaseKey] = None, limit: int = 500) -> List[Dict]:
+        query = ("SELECT id, case_type, case_number, filing_year, field, old_value, new_value, detected_at "
+                 "FROM case_changes WHERE id > ?")
+        params: list = [since_id]
+        if key:
+            query += " AND case_type = ? AND case_number = ? AND filing_year = ?"
+            params += list(key)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id LIMIT ?", (*params, limit)).fetchall()
+        return [{"id": row[0], "case_type": row[1], "case_number": row[2], "filing_year": row[3], "field": row[4],
+                 "old": row[5], "new": row[6], "detected_at": row[7]} for row in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_priority = dict(self._conn.execute(
+                "SELECT priority, COUNT(*) FROM tracked_cases GROUP BY priority"
+            ).fetchall())
+            tracked, due, failing = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(next_due <= ?), 0), COALESCE(SUM(failures > 0), 0) "
+                "FROM tracked_cases",
+                (time.time(),),
+            ).fetchone()
+            changes = self._conn.execute("SELECT COUNT(*) FROM case_changes").fetchone()[0]
+        return {"tracked": tracked, "due": due, "failing": failing, "changes": changes,
+                "by_priority": {name: by_priority.get(name, 0) for name in PRIORITIES}}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,451 @@
+"""
+Durable, lease-based work queue of case tuples for multi-process batch runs.
+
+Cases live in one SQLite table. A worker claims a case, which leases it to
+that worker until QUEUE_LEASE_SECONDS have passed, and renews the lease while
+the lookup is still running. A lease that expires (for example because the
+worker process crashed or its host went away) makes the case claimable again,
+so nothing is lost. A result is accepted only from the worker that still
+holds the lease. Failed lookups go back to the queue with jittered backoff
+until QUEUE_MAX_ATTEMPTS is reached. Finished cases get an increasing
+sequence number, which lets the runner merge results into its outputs exactly
+once.
+
+Cases are identified by their normalized key (utils.cache.normalize_case_key),
+which removes duplicates. Workers are handed the case type and number as they
+were queued, because the court's form matches the case type label exactly.
+
+Workers on the same host open WorkQueue directly. The file is in WAL mode,
+which needs memory shared between the processes using it. It must therefore
+not be shared over a network filesystem. Other hosts reach the queue over
+HTTP instead: QueueServer exposes the same calls as JSON endpoints and
+RemoteQueue is the matching client. open_queue() picks one from a path or URL.
+"""
+
+import hmac
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from utils.cache import CaseKey, normalize_case_key
+from utils.search_log import connect
+from utils.throttle import backoff_delay
+
+QUEUE_DB_PATH = os.getenv("QUEUE_DB_PATH", "work_queue.db")
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", 120))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 3))
+QUEUE_BACKOFF_BASE_SECONDS = float(os.getenv("QUEUE_BACKOFF_BASE_SECONDS", 5))
+QUEUE_BACKOFF_MAX_SECONDS = float(os.getenv("QUEUE_BACKOFF_MAX_SECONDS", 120))
+# Lookups per second handed out to all workers together; 0 leaves pacing to each worker.
+QUEUE_RATE_RPS = float(os.getenv("QUEUE_RATE_RPS", 0))
+# Shared secret for QueueServer; remote workers send it as a bearer token. It is
+# required to listen on anything but the loopback interface.
+QUEUE_TOKEN = os.getenv("QUEUE_TOKEN", "")
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+CASE_FIELDS = ("case_type", "case_number", "filing_year")
+
+
+def _key(item: Dict) -> CaseKey:
+    return normalize_case_key(*(str(item[field]) for field in CASE_FIELDS))
+
+
+class WorkQueue:
+    """SQLite-backed queue; safe to share between threads and processes on one host."""
+
+    def __init__(self, db_path: str = QUEUE_DB_PATH, max_attempts: int = QUEUE_MAX_ATTEMPTS,
+                 rate: float = QUEUE_RATE_RPS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.rate = rate
+        self._conn = connect(db_path)
+        # Transactions are explicit so a claim can take the write lock up front (BEGIN IMMEDIATE).
+        self._conn.isolation_level = None
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue (
+                    case_type TEXT,
+                    case_number TEXT,
+                    filing_year TEXT,
+                    status TEXT DEFAULT 'pending',
+                    attempts INTEGER DEFAULT 0,
+                    owner TEXT,
+                    lease_expires REAL,
+                    available_at REAL DEFAULT 0,
+                    result TEXT,
+                    seq INTEGER,
+                    updated REAL,
+                    input_case_type TEXT,
+                    input_case_number TEXT,
+                    PRIMARY KEY (case_type, case_number, filing_year)
+                )
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(queue)")}
+            for column in ("input_case_type", "input_case_number"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE queue ADD COLUMN {column} TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_status ON queue (status, available_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_seq ON queue (seq)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS queue_meta (key TEXT PRIMARY KEY, value REAL)")
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the thread lock and SQLite's write lock for the duration of a with-block."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _meta(self, key: str, default: float = 0.0) -> float:
+        row = self._conn.execute("SELECT value FROM queue_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value: float):
+        self._conn.execute("INSERT OR REPLACE INTO queue_meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- loading ----------------------------------------------------------
+    def add(self, cases: Iterable[Dict]) -> Dict:
+        """Queue case tuples. New cases are added, failed ones are queued again, the rest are kept."""
+        added = requeued = 0
+        now = time.time()
+        with self._transaction() as conn:
+            for case in cases:
+                key = _key(case)
+                spelling = (str(case["case_type"]).strip(), str(case["case_number"]).strip())
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO queue (case_type, case_number, filing_year, input_case_type, "
+                    "input_case_number, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, *spelling, now),
+                )
+                if cursor.rowcount:
+                    added += 1
+                    continue
+                cursor = conn.execute(
+                    "UPDATE queue SET status = 'pending', attempts = 0, available_at = 0, seq = NULL, "
+                    "input_case_type = ?, input_case_number = ?, updated = ? "
+                    "WHERE case_type = ? AND case_number = ? AND filing_year = ? AND status = 'failed'",
+                    (*spelling, now, *key),
+                )
+                requeued += cursor.rowcount
+        return {"added": added, "requeued": requeued}
+
+    def reset(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM queue")
+            conn.execute("DELETE FROM queue_meta")
+
+    # --- worker calls -----------------------------------------------------
+    def claim(self, owner: str, limit: int = 1,
+              lease_seconds: float = QUEUE_LEASE_SECONDS) -> Tuple[List[Dict], Optional[float]]:
+        """
+        Lease up to `limit` cases to `owner`. Each item holds the case as it was queued plus
+        its normalized "key", which renew() and complete() take.
+        Returns (items, wait): when items is empty, wait is how long to sleep before asking
+        again, or None once every case is done or failed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if self.rate > 0:
+                next_at = self._meta("next_claim_at")
+                if now < next_at:
+                    return [], next_at - now
+            rows = conn.execute("""
+                SELECT case_type, case_number, filing_year, status, owner, attempts,
+                       COALESCE(input_case_type, case_type), COALESCE(input_case_number, case_number) FROM queue
+                WHERE (status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY available_at, rowid LIMIT ?
+            """, (now, now, max(1, limit))).fetchall()
+            if not rows:
+                wait = conn.execute("""
+                    SELECT MIN(CASE status WHEN 'pending' THEN available_at ELSE lease_expires END)
+                    FROM queue WHERE status IN ('pending', 'leased')
+                """).fetchone()[0]
+                return [], None if wait is None else max(0.0, wait - now)
+            items = []
+            for case_type, case_number, filing_year, status, previous, attempts, input_type, input_number in rows:
+                if status == "leased":
+                    logging.warning(f"Queue: lease of {case_type}-{case_number}-{filing_year} held by "
+                                    f"{previous} expired, reclaiming it for {owner}")
+                    self._set_meta("reclaimed", self._meta("reclaimed") + 1)
+                conn.execute(
+                    "UPDATE queue SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated = ? WHERE case_type = ? AND case_number = ? AND filing_year = ?",
+                    (owner, now + lease_seconds, now, case_type, case_number, filing_year),
+                )
+                items.append({"case_type": input_type, "case_number": input_number, "filing_year": filing_year,
+                              "key": [case_type, case_number, filing_year], "attempt": attempts + 1})
+            if self.rate > 0:
+                self._set_meta("next_claim_at", max(now, self._meta("next_claim_at")) + len(items) / self.rate)
+        return items, 0.0
+
+    def renew(self, owner: str, keys: Iterable[CaseKey], lease_seconds: float = QUEUE_LEASE_SECONDS) -> int:
+        """Extend the leases `owner` still holds; returns how many were extended."""
+        keys = list(keys)
+        if not keys:
+            return 0
+        renewed = 0
+        expires = time.time() + lease_seconds
+        with self._transaction() as conn:
+            for key in keys:
+                renewed += conn.execute(
+                    "UPDATE queue SET lease_expires = ? WHERE case_type = ? AND case_number = ? AND filing_year = ? "
+                    "AND status = 'leased' AND owner = ?", (expires, *key, owner),
+                ).rowcount
+        return renewed
+
+    def complete(self, owner: str, key: CaseKey, result: Dict, ok: bool) -> bool:
+        """
+        Store the outcome of a leased case. Failures are queued again with backoff until
+        max_attempts. Returns False if `owner` no longer holds the lease; the result is dropped.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM queue WHERE case_type = ? AND case_number = ? AND filing_year = ? "
+                "AND status = 'leased' AND owner = ?", (*key, owner),
+            ).fetchone()
+            if row is None:
+                return False
+            attempts = row[0]
+            if ok or attempts >= self.max_attempts:
+                seq = int(self._meta("seq")) + 1
+                self._set_meta("seq", seq)
+                conn.execute(
+                    "UPDATE queue SET status = ?, owner = NULL, lease_expires = NULL, result = ?, seq = ?, updated = ? "
+                    "WHERE case_type = ? AND case_number = ? AND filing_year = ?",
+                    ("done" if ok else "failed", json.dumps(result, ensure_ascii=False), seq, now, *key),
+                )
+            else:
+                delay = backoff_delay(attempts - 1, QUEUE_BACKOFF_BASE_SECONDS, QUEUE_BACKOFF_MAX_SECONDS)
+                conn.execute(
+                    "UPDATE queue SET status = 'pending', owner = NULL, lease_expires = NULL, available_at = ?, "
+                    "result = ?, updated = ? WHERE case_type = ? AND case_number = ? AND filing_year = ?",
+                    (now + delay, json.dumps(result, ensure_ascii=False), now, *key),
+                )
+        return True
+
+    def release(self, owner: str) -> int:
+        """Hand back every lease `owner` holds without counting the attempt (clean shutdown)."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE queue SET status = 'pending', owner = NULL, lease_expires = NULL, "
+                "attempts = MAX(0, attempts - 1), updated = ? WHERE status = 'leased' AND owner = ?",
+                (time.time(), owner),
+            ).rowcount
+
+    # --- reading ----------------------------------------------------------
+    def finished(self, after_seq: int = 0, limit: int = 500) -> List[Tuple[int, str, Dict]]:
+        """(seq, status, result) of cases finished after `after_seq`, in finishing order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, status, result FROM queue WHERE seq > ? ORDER BY seq LIMIT ?", (after_seq, limit)
+            ).fetchall()
+        return [(seq, status, json.loads(result) if result else {}) for seq, status, result in rows]
+
+    def results(self) -> List[Dict]:
+        """Every finished result, in the order the cases were queued."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM queue WHERE status IN ('done', 'failed') ORDER BY rowid"
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows if row[0]]
+
+    def get_cursor(self, name: str) -> int:
+        with self._lock:
+            return int(self._meta(f"cursor:{name}"))
+
+    def set_cursor(self, name: str, seq: int):
+        with self._transaction():
+            self._set_meta(f"cursor:{name}", seq)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM queue GROUP BY status").fetchall())
+            owners = self._conn.execute(
+                "SELECT COUNT(DISTINCT owner) FROM queue WHERE status = 'leased' AND lease_expires >= ?", (time.time(),)
+            ).fetchone()[0]
+            reclaimed = int(self._meta("reclaimed"))
+        stats = {status: counts.get(status, 0) for status in ("pending", "leased", "done", "failed")}
+        return {**stats, "active_workers": owners, "reclaimed": reclaimed}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueueServer:
+    """
+    Serves a WorkQueue over HTTP/JSON so workers on other hosts can claim cases.
+    Listens on 127.0.0.1 unless another host is given; a non-loopback host needs a
+    token. The server speaks plain HTTP, so the token and results are readable on
+    the network: bind it only on a trusted network or behind a TLS proxy.
+    """
+
+    def __init__(self, queue: WorkQueue, host: str = "127.0.0.1", port: int = 0, token: str = QUEUE_TOKEN):
+        if not token and host not in LOOPBACK_HOSTS:
+            raise ValueError(f"Refusing to serve the queue on {host} without QUEUE_TOKEN")
+        self.queue = queue
+        self.token = token
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                logging.debug("queue server: " + fmt % args)
+
+            def _reply(self, status: int, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _authorized(self) -> bool:
+                supplied = self.headers.get("Authorization", "")
+                if server.token and not hmac.compare_digest(supplied.encode(), f"Bearer {server.token}".encode()):
+                    self._reply(401, {"error": "unauthorized"})
+                    return False
+                return True
+
+            def do_GET(self):
+                if not self._authorized():
+                    return
+                if self.path == "/stats":
+                    self._reply(200, server.queue.stats())
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if not self._authorized():
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                    owner = body["owner"]
+                    if self.path == "/claim":
+                        items, wait = server.queue.claim(owner, body.get("limit", 1),
+                                                         body.get("lease_seconds", QUEUE_LEASE_SECONDS))
+                        self._reply(200, {"items": items, "wait": wait})
+                    elif self.path == "/renew":
+                        keys = [tuple(key) for key in body["keys"]]
+                        self._reply(200, {"renewed": server.queue.renew(
+                            owner, keys, body.get("lease_seconds", QUEUE_LEASE_SECONDS))})
+                    elif self.path == "/complete":
+                        accepted = server.queue.complete(owner, tuple(body["key"]), body["result"], body["ok"])
+                        self._reply(200, {"accepted": accepted})
+                    elif self.path == "/release":
+                        self._reply(200, {"released": server.queue.release(owner)})
+                    else:
+                        self._reply(404, {"error": "not found"})
+                except (KeyError, TypeError, ValueError) as e:
+                    self._reply(400, {"error": f"bad request: {e}"})
+                except Exception as e:
+                    logging.error(f"Queue server error on {self.path}: {e}")
+                    self._reply(500, {"error": str(e)})
+
+        return Handler
+
+    def start(self) -> "QueueServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="queue-server", daemon=True)
+        self._thread.start()
+        logging.info(f"Queue server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RemoteQueue:
+    """Client for QueueServer with the worker-side methods of WorkQueue."""
+
+    def __init__(self, url: str, token: str = QUEUE_TOKEN, timeout: float = 30):
+        parts = urlsplit(url)
+        self.url = url
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._prefix = parts.path.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _call(self, method: str, path: str, body: Optional[Dict] = None) -> Dict:
+        payload = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        with self._lock:
+            # One retry on a fresh connection covers keep-alive connections the server closed.
+            for attempt in range(2):
+                if self._conn is None:
+                    self._conn = self._connection_class(self._netloc, timeout=self.timeout)
+                try:
+                    self._conn.request(method, self._prefix + path, body=payload, headers=headers)
+                    response = self._conn.getresponse()
+                    data = json.loads(response.read() or b"{}")
+                except (http.client.HTTPException, ConnectionError):
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+                    continue
+                if response.status != 200:
+                    raise RuntimeError(f"Queue server returned {response.status}: {data.get('error')}")
+                return data
+
+    def claim(self, owner: str, limit: int = 1,
+              lease_seconds: float = QUEUE_LEASE_SECONDS) -> Tuple[List[Dict], Optional[float]]:
+        data = self._call("POST", "/claim", {"owner": owner, "limit": limit, "lease_seconds": lease_seconds})
+        return data["items"], data["wait"]
+
+    def renew(self, owner: str, keys: Iterable[CaseKey], lease_seconds: float = QUEUE_LEASE_SECONDS) -> int:
+        keys = [list(key) for key in keys]
+        if not keys:
+            return 0
+        return self._call("POST", "/renew", {"owner": owner, "keys": keys, "lease_seconds": lease_seconds})["renewed"]
+
+    def complete(self, owner: str, key: CaseKey, result: Dict, ok: bool) -> bool:
+        data = self._call("POST", "/complete", {"owner": owner, "key": list(key), "result": result, "ok": ok})
+        return data["accepted"]
+
+    def release(self, owner: str) -> int:
+        return self._call("POST", "/release", {"owner": owner})["released"]
+
+    def stats(self) -> Dict:
+        return self._call("GET", "/stats")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def open_queue(target: str = QUEUE_DB_PATH):
+    """RemoteQueue for an http(s):// URL, otherwise a WorkQueue on that SQLite file."""
+    if target.startswith(("http://", "https://")):
+        return RemoteQueue(target)
+    return WorkQueue(target)